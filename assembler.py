@@ -6,172 +6,256 @@ Usage: python assembler.py <filename.asm>
 Output: Creates <filename.hack> with binary machine code
 """
 
+import re
 import sys
 import os
 from pathlib import Path
-from typing import Literal
+from typing import Literal, NamedTuple, Optional
 
 
+# One source line: optional whitespace, then an A-instruction, a label or a
+# C-instruction (dest=comp;jump), then an optional // comment. Blank and
+# comment-only lines match with every group empty; an empty symbol or
+# label, or a stray @ or parenthesis, does not match at all.
+LINE = re.compile(r'''
+    \s*
+    (?:
+        @(?P<symbol>[^/\s]+)
+      | \(\s*(?P<label>[^)\s]+)\s*\)
+      | (?:(?P<dest>[^=;/@()]*)=)?(?P<comp>[^;/@()]+?)(?:;(?P<jump>[^/]*?))?
+    )?
+    \s*(?://.*)?
+''', re.VERBOSE | re.DOTALL)
+
+
+class Command(NamedTuple):
+    kind: str               # 'A_COMMAND', 'C_COMMAND' or 'L_COMMAND'
+    dest: str               # '' when absent
+    comp: str
+    jump: str               # '' when absent
+    symbol: Optional[str]   # A-instruction value or label name
+    line_no: int            # 1-based line number in the source
+    source: str             # the source line as written
+
+
+def tokenize(lines):
+    """Yields a Command for every instruction and label in lines"""
+    for line_no, line in enumerate(lines, 1):
+        match = LINE.fullmatch(line)
+        if match is None:
+            raise ValueError(f"Line {line_no}: cannot parse {line.strip()!r}")
+        symbol, label, dest, comp, jump = match.groups()
+        if symbol is not None:
+            yield Command('A_COMMAND', '', '', '', symbol, line_no, line)
+        elif label is not None:
+            yield Command('L_COMMAND', '', '', '', label, line_no, line)
+        elif comp is not None:
+            yield Command('C_COMMAND', dest.strip() if dest else '', comp.strip(),
+                          jump.strip() if jump else '', None, line_no, line)
+
+
+PREDEFINED_SYMBOLS = {
+    'SP': 0,
+    'LCL': 1,
+    'ARG': 2,
+    'THIS': 3,
+    'THAT': 4,
+    'R0': 0, 'R1': 1, 'R2': 2, 'R3': 3, 'R4': 4, 'R5': 5, 'R6': 6, 'R7': 7, 'R8': 8, 'R9': 9, 'R10': 10, 'R11': 11, 'R12': 12, 'R13': 13, 'R14': 14, 'R15': 15,
+    'SCREEN': 0x4000,
+    'KBD': 0x6000
+}
+FIRST_VARIABLE = 16
+
+
+def build_symbol_table(commands):
+    """
+    First pass: label addresses and variable slots. A symbol is given a
+    variable slot when first referenced before being defined, even if it
+    turns out to be a label, so forward label references shift later
+    variables like they always have.
+    """
+    symbol_table = dict(PREDEFINED_SYMBOLS)
+    instruction_count = 0
+    last_var = FIRST_VARIABLE
+    for command in commands:
+        if command.kind == 'L_COMMAND':
+            symbol_table[command.symbol] = instruction_count
+            continue
+        instruction_count += 1
+        if command.kind == 'A_COMMAND':
+            value = command.symbol
+            if not value.isdigit() and value not in symbol_table:
+                symbol_table[value] = last_var
+                last_var += 1
+    return symbol_table
+
 
 class Parser:
     
     
     def __init__(self, input_file: str):
-        self.symbol_table = {
-            'SP': 0,
-            'LCL': 1,
-            'ARG': 2,
-            'THIS': 3,
-            'THAT': 4,
-            'R0': 0, 'R1': 1, 'R2': 2, 'R3': 3, 'R4': 4, 'R5': 5, 'R6': 6, 'R7': 7, 'R8': 8, 'R9': 9, 'R10': 10, 'R11': 11, 'R12': 12, 'R13': 13, 'R14': 14, 'R15': 15,
-            'SCREEN': 0x4000,
-            'KBD': 0x6000
-        }
+        self.commands = list(tokenize(input_file.split('\n')))
+        self.symbol_table = build_symbol_table(self.commands)
+        self.current = None
         self.current_command = None
-        self.line_index = 0
-        self.instruction_count = 0
-        self.lines = input_file.split('\n')
-        self.last_var = 16
-        while self.has_more_commands():
-            self.advance()
-            if self.command_type() == 'L_COMMAND':
-                label = self.current_command.split('//')[0].strip()
-                if label[1:-1] in self.symbol_table:
-                    pass
-                self.symbol_table[label[1:-1]] = self.instruction_count
-            elif self.command_type() == 'A_COMMAND':
-                value = self.current_command.split('//')[0].strip()
-                if not value[1:].isdigit() and value[1:] not in self.symbol_table:
-                    self.symbol_table[value[1:]] = self.last_var
-                    self.last_var += 1
+        self.index = 0
         self.line_index = 0
         self.instruction_count = 0
 
       
     def has_more_commands(self) -> bool:
-        return self.line_index < len(self.lines)
+        return self.index < len(self.commands)
     
     def advance(self) -> None:
-        self.current_command = self.lines[self.line_index]
-        while len(list(self.current_command.split('//')[0].strip())) == 0:
-            self.line_index += 1
-            self.current_command = self.lines[self.line_index]
-        if self.command_type() in ['A_COMMAND', 'C_COMMAND']:
+        self.current = command = self.commands[self.index]
+        self.index += 1
+        self.current_command = command.source
+        self.line_index = command.line_no
+        if command.kind != 'L_COMMAND':
             self.instruction_count += 1
-        self.line_index += 1
     
     def command_type(self) -> Literal['A_COMMAND', 'C_COMMAND', 'L_COMMAND']:
-        command = self.current_command.split('//')[0].replace(' ', '')
-        command_list = list(command)
-        if command_list[0] == '@':
-            return 'A_COMMAND'
-        elif command_list[0] == '(' and command_list[-1] == ')':
-            return 'L_COMMAND'
-        return 'C_COMMAND'
+        return self.current.kind
     
-    def symbol(self) -> str:
-        if self.command_type() == 'A_COMMAND':
-            if self.current_command[1:].isdigit():
-                return int(self.current_command[1:])
-            return int(self.symbol_table[self.current_command[1:]])
-        else:
-            return int(self.symbol_table[self.current_command[1:-1]])
+    def symbol(self) -> int:
+        value = self.current.symbol
+        if self.current.kind == 'A_COMMAND' and value.isdigit():
+            return int(value)
+        return int(self.symbol_table[value])
     
     def dest(self) -> str:
-        split_instr = self.current_command.split('//')[0].split('=')
-        if len(split_instr) == 1:
-            return ''
-        return split_instr[0].strip()
+        return self.current.dest
     
     def comp(self) -> str:
-        split_instr = self.current_command.split('//')[0].split('=')
-        if len(split_instr) == 1:
-            return split_instr[0].split(';')[0].strip()
-        else:
-            return split_instr[1].split(';')[0].strip()
-            
+        return self.current.comp
     
     def jump(self) -> str:
-        split_instr = self.current_command.split('//')[0].split(';')
-        if len(split_instr) == 1:
-            return ''
-        return split_instr[1].strip()
+        return self.current.jump
+
+
+DEST = {
+    'null': (0, 0, 0),
+    'M': (0, 0, 1),
+    'D': (0, 1, 0),
+    'MD': (0, 1, 1),
+    'A': (1, 0, 0),
+    'AM': (1, 0, 1),
+    'AD': (1, 1, 0),
+    'AMD': (1, 1, 1),
+}
+
+COMP = {
+    '0': (0, 1, 0, 1, 0, 1, 0),
+    '1': (0, 1, 1, 1, 1, 1, 1),
+    '-1': (0, 1, 1, 1, 0, 1, 0),
+    'D': (0, 0, 0, 1, 1, 0, 0),
+    'A': (0, 1, 1, 0, 0, 0, 0),
+    '!D': (0, 0, 0, 1, 1, 0, 1),
+    '!A': (0, 1, 1, 0, 0, 0, 1),
+    '-D': (0, 0, 0, 1, 1, 1, 1),
+    '-A': (0, 1, 1, 0, 0, 1, 1),
+    'D+1': (0, 0, 1, 1, 1, 1, 1),
+    'A+1': (0, 1, 1, 0, 1, 1, 1),
+    'D-1': (0, 0, 0, 1, 1, 1, 0),
+    'A-1': (0, 1, 1, 0, 0, 1, 0),
+    'D+A': (0, 0, 0, 0, 0, 1, 0),
+    'D-A': (0, 0, 1, 0, 0, 1, 1),
+    'A-D': (0, 0, 0, 0, 1, 1, 1),
+    'D&A': (0, 0, 0, 0, 0, 0, 0),
+    'D|A': (0, 0, 1, 0, 1, 0, 1),
+    'M': (1, 1, 1, 0, 0, 0, 0),
+    '!M': (1, 1, 1, 0, 0, 0, 1),
+    '-M': (1, 1, 1, 0, 0, 1, 1),
+    'M+1': (1, 1, 1, 0, 1, 1, 1),
+    'M-1': (1, 1, 1, 0, 0, 1, 0),
+    'D+M': (1, 0, 0, 0, 0, 1, 0),
+    'D-M': (1, 0, 1, 0, 0, 1, 1),
+    'M-D': (1, 0, 0, 0, 1, 1, 1),
+    'D&M': (1, 0, 0, 0, 0, 0, 0),
+    'D|M': (1, 0, 1, 0, 1, 0, 1),
+}
+
+JUMP = {
+    'null': (0, 0, 0),
+    'JGT': (0, 0, 1),
+    'JEQ': (0, 1, 0),
+    'JGE': (0, 1, 1),
+    'JLT': (1, 0, 0),
+    'JNE': (1, 0, 1),
+    'JLE': (1, 1, 0),
+    'JMP': (1, 1, 1),
+}
+
+# The same tables as bit strings for the assembler; an absent dest or jump
+# is '' in a Command
+DEST_BITS = {mnemonic: ''.join(map(str, bits)) for mnemonic, bits in DEST.items()}
+DEST_BITS[''] = DEST_BITS['null']
+COMP_BITS = {mnemonic: ''.join(map(str, bits)) for mnemonic, bits in COMP.items()}
+JUMP_BITS = {mnemonic: ''.join(map(str, bits)) for mnemonic, bits in JUMP.items()}
+JUMP_BITS[''] = JUMP_BITS['null']
+
 
 class Code:
     def dest(mnemonic: str) -> tuple[int, int, int]:
-        return {
-            'null': tuple((0,0,0)),
-            'M': tuple((0,0,1)),
-            'D': tuple((0,1,0)),
-            'MD': tuple((0,1,1)),
-            'A': tuple((1,0,0)),
-            'AM': tuple((1,0,1)),
-            'AD': tuple((1,1,0)),
-            'AMD': tuple((1,1,1))
-        }[mnemonic]
+        return DEST[mnemonic]
 
     def comp(mnemonic: str) -> tuple[int, int, int, int, int, int, int]:
-        return {
-            '0': tuple((0, 1, 0, 1, 0, 1, 0)),
-            '1': tuple((0, 1, 1, 1, 1, 1, 1)),
-            '-1': tuple((0, 1, 1, 1, 0, 1, 0)),
-            'D': tuple((0, 0, 0, 1, 1, 0, 0)),
-            'A': tuple((0, 1, 1, 0, 0, 0, 0)),
-            '!D': tuple((0, 0, 0, 1, 1, 0, 1)),
-            '!A': tuple((0, 1, 1, 0, 0, 0, 1)),
-            '-D': tuple((0, 0, 0, 1, 1, 1, 1)),
-            '-A': tuple((0, 1, 1, 0, 0, 1, 1)),
-            'D+1': tuple((0, 0, 1, 1, 1, 1, 1)),
-            'A+1': tuple((0, 1, 1, 0, 1, 1, 1)),
-            'D-1': tuple((0, 0, 0, 1, 1, 1, 0)),
-            'A-1': tuple((0, 1, 1, 0, 0, 1, 0)),
-            'D+A': tuple((0, 0, 0, 0, 0, 1, 0)),
-            'D-A': tuple((0, 0, 1, 0, 0, 1, 1)),
-            'A-D': tuple((0, 0, 0, 0, 1, 1, 1)),
-            'D&A': tuple((0, 0, 0, 0, 0, 0, 0)),
-            'D|A': tuple((0, 0, 1, 0, 1, 0, 1)),
-            'M': tuple((1, 1, 1, 0, 0, 0, 0)),
-            '!M': tuple((1, 1, 1, 0, 0, 0, 1)),
-            '-M': tuple((1, 1, 1, 0, 0, 1, 1)),
-            'M+1': tuple((1, 1, 1, 0, 1, 1, 1)),
-            'M-1': tuple((1, 1, 1, 0, 0, 1, 0)),
-            'D+M': tuple((1, 0, 0, 0, 0, 1, 0)),
-            'D-M': tuple((1, 0, 1, 0, 0, 1, 1)),
-            'M-D': tuple((1, 0, 0, 0, 1, 1, 1)),
-            'D&M': tuple((1, 0, 0, 0, 0, 0, 0)),
-            'D|M': tuple((1, 0, 1, 0, 1, 0, 1)),
-        }[mnemonic]
+        return COMP[mnemonic]
 
     def jump(mnemonic: str) -> tuple[int, int, int]:
-        return {
-            'null': tuple((0,0,0)),
-            'JGT': tuple((0,0,1)),
-            'JEQ': tuple((0,1,0)),
-            'JGE': tuple((0,1,1)),
-            'JLT': tuple((1,0,0)),
-            'JNE': tuple((1,0,1)),
-            'JLE': tuple((1,1,0)),
-            'JMP': tuple((1,1,1)),
-        }[mnemonic]
+        return JUMP[mnemonic]
+
+
+def encode(command: Command, symbol_table: dict) -> str:
+    """The 16-character binary line for an A- or C-instruction"""
+    if command.kind == 'A_COMMAND':
+        value = command.symbol
+        return '0' + format(int(value) if value.isdigit() else symbol_table[value], '015b')
+    try:
+        comp = COMP_BITS.get(command.comp) or COMP_BITS[command.comp.replace(' ', '')]
+        return '111' + comp + DEST_BITS[command.dest] + JUMP_BITS[command.jump]
+    except KeyError as e:
+        raise ValueError(f"Line {command.line_no}: unknown mnemonic {e.args[0]!r} in {command.source.strip()!r}") from None
+
+
+def encode_commands(commands, symbol_table: dict):
+    """Second pass: yields the binary line of every instruction"""
+    for command in commands:
+        if command.kind != 'L_COMMAND':
+            yield encode(command, symbol_table)
+
 
 class Assembler:
     
 
     def assemble_file(self, input_file: str) -> str:
-        """Assembles the given .asm file into a .hack file"""
-        parser = Parser(input_file)
-        output_binary = ""
-        while parser.has_more_commands():
-            parser.advance()
-            c_type = parser.command_type()
-            if c_type == 'A_COMMAND':
-                pass
-            elif c_type == 'C_COMMAND':
-                pass
-            elif c_type == 'L_COMMAND':
-                pass
-            else:
-                raise Exception(f"We should not get a type of {c_type}")
+        """Assembles the given .asm file into a .hack file, returns the .hack filename"""
+        output_file = self.get_output_filename(input_file)
+        with open(input_file, 'r') as source, open(output_file, 'w') as output:
+            try:
+                self.assemble_stream(source, output)
+            except Exception:
+                output.close()
+                os.remove(output_file)
+                raise
+        return output_file
+
+    def assemble_stream(self, source, output) -> int:
+        """
+        Assembles a seekable text file object into output, one line per word.
+        Both passes read the source a line at a time and words are written as
+        they are encoded, so memory grows with the symbol table, not with the
+        program. Returns the number of words written.
+        """
+        start = source.tell()
+        symbol_table = build_symbol_table(tokenize(source))
+        source.seek(start)
+        count = 0
+        write = output.write
+        for word in encode_commands(tokenize(source), symbol_table):
+            write(word + '\n')
+            count += 1
+        return count
         
     def get_output_filename(self, input_filename: str):
         """Generates the output filename by replacing .asm extension with .hack"""
@@ -184,31 +268,8 @@ class Assembler:
     def assemble(self, input_file: str) -> str:
         """Assembles the given assembly code string into binary machine code string"""
         parser = Parser(input_file)
-        output_binary = ""
-        while parser.has_more_commands():
-            parser.advance()
-            c_type = parser.command_type()
-            if c_type == 'A_COMMAND':
-                symbol = parser.symbol()
-                binary_value = format(symbol, '015b')
-                output_binary += '0' + binary_value + '\n'
-            elif c_type == 'C_COMMAND':
-                dest_mnemonic = parser.dest() if parser.dest() else 'null'
-                comp_mnemonic = parser.comp()
-                jump_mnemonic = parser.jump() if parser.jump() else 'null'
-                
-                a, c1, c2, c3, c4, c5, c6 = Code.comp(comp_mnemonic)
-                d1, d2, d3 = Code.dest(dest_mnemonic)
-                j1, j2, j3 = Code.jump(jump_mnemonic)
-                
-                binary_value = f'111{a}{c1}{c2}{c3}{c4}{c5}{c6}{d1}{d2}{d3}{j1}{j2}{j3}'
-                output_binary += binary_value + '\n'
-            elif c_type == 'L_COMMAND':
-                continue
-            else:
-                raise Exception(f"We should not get a type of {c_type}")
-        return output_binary.strip()
-                    
+        return '\n'.join(encode_commands(parser.commands, parser.symbol_table))
+
 
 
 def main():
@@ -231,7 +292,8 @@ def main():
     
     # Create assembler and process file
     assembler = Assembler()
-    assembler.assemble_file(input_file)
+    output_file = assembler.assemble_file(input_file)
+    print(f"Wrote {output_file}")
 
 
 if __name__ == "__main__":
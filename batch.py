@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Batch runner - runs many Hack programs over a process pool
+Usage: python batch.py <directory or manifest.jsonl> [options]
+Output: one JSON object per program on stdout, as each one finishes
+
+A directory runs every .asm and .hack file in it with the default limits.
+A manifest has one JSON object per line:
+
+  {"program": "Add.asm", "max_cycles": 100000, "until_pc": "END",
+   "expect": {"17": 5050}, "keys": [[1000, 65]]}
+
+Only "program" is required; paths are relative to the manifest. until_pc
+is an address or, for .asm programs, a label. Without it a program runs
+until it reaches its halt loop (@X / 0;JMP at X) when it has exactly one,
+or until max_cycles, which then counts as a timeout. max_cycles must be a
+positive integer. "expect" maps RAM addresses (or R0..R15/SCREEN/KBD) to
+the values they must hold at the end; "keys" is a scripted keyboard feed
+of [cycle, keycode] events.
+
+Each result carries the program name, status (pass, fail, timeout or
+error), cycles, seconds, cycles_per_sec, the final pc and any failed
+expectations.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from assembler import Assembler, Parser
+from gates import Computer
+from keyboard import KeyboardFeed
+
+DEFAULT_MAX_CYCLES = 10_000_000
+PROGRAM_SUFFIXES = ('.asm', '.hack')
+# 0;JMP
+UNCONDITIONAL_JUMP = 0xEA87
+
+
+def discover(path, max_cycles=DEFAULT_MAX_CYCLES):
+    """Returns the job list for a directory of programs or a manifest file"""
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if name.endswith(PROGRAM_SUFFIXES))
+        return [{'program': os.path.join(path, name), 'max_cycles': max_cycles} for name in names]
+    jobs = []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_no}: {e}") from None
+            if 'program' not in job:
+                raise ValueError(f"Line {line_no}: missing 'program'")
+            job['program'] = os.path.join(base, job['program'])
+            job.setdefault('max_cycles', max_cycles)
+            limit = job['max_cycles']
+            if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+                raise ValueError(f"Line {line_no}: max_cycles must be a positive integer, got {limit!r}")
+            jobs.append(job)
+    return jobs
+
+
+def halt_loops(rom):
+    """Addresses X holding the halt idiom @X / 0;JMP"""
+    return [pc for pc in range(len(rom) - 1) if rom[pc] == pc and rom[pc + 1] == UNCONDITIONAL_JUMP]
+
+
+def resolve_address(value, symbols):
+    if isinstance(value, int):
+        return value
+    if value.isdigit():
+        return int(value)
+    if value not in symbols:
+        raise ValueError(f"Unknown symbol {value!r}")
+    return symbols[value]
+
+
+def run_job(job):
+    """Assembles/loads, runs and checks one program. Never raises."""
+    result = {'program': job['program']}
+    try:
+        with open(job['program'], 'r') as f:
+            text = f.read()
+        computer = Computer('flat', job.get('engine', 'blocks'))
+        if job['program'].endswith('.asm'):
+            symbols = Parser(text).symbol_table
+            computer.load_hack(Assembler().assemble(text))
+        else:
+            # Only the predefined symbols
+            symbols = Parser('@0').symbol_table
+            computer.load_hack(text)
+        until_pc = job.get('until_pc')
+        if until_pc is not None:
+            until_pc = resolve_address(until_pc, symbols)
+        else:
+            loops = halt_loops(computer.rom.chip.words)
+            if len(loops) == 1:
+                until_pc = loops[0]
+        if job.get('keys'):
+            computer.keyboard = KeyboardFeed(job['keys'])
+        start = time.perf_counter()
+        run = computer.run(max_cycles=job['max_cycles'], until_pc=until_pc)
+        elapsed = time.perf_counter() - start
+        failures = []
+        for address, expected in job.get('expect', {}).items():
+            actual = computer.mem.chip.read_word(resolve_address(address, symbols))
+            if actual != expected & 0xFFFF:
+                failures.append({'address': address, 'expected': expected, 'actual': actual})
+        halted = until_pc is not None and run.pc == until_pc
+        if failures:
+            status = 'fail'
+        elif not halted and (until_pc is not None or run.cycles == job['max_cycles']):
+            # Nothing to stop at and the whole budget used is a timeout too
+            status = 'timeout'
+        else:
+            status = 'pass'
+        result.update(status=status, cycles=run.cycles, seconds=round(elapsed, 6),
+                      cycles_per_sec=round(run.cycles / elapsed) if elapsed else None,
+                      pc=run.pc, failures=failures)
+    except Exception as e:
+        result.update(status='error', error=f'{type(e).__name__}: {e}')
+    return result
+
+
+def run_batch(jobs, processes=None, ordered=False):
+    """
+    Yields one result per job as they complete (in job order with ordered).
+    Jobs are handed out one at a time so long programs do not hold up a
+    whole chunk of short ones.
+    """
+    if processes == 1:
+        yield from map(run_job, jobs)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.imap(run_job, jobs) if ordered else pool.imap_unordered(run_job, jobs)
+        yield from results
+
+
+def main():
+    """Main function to handle command line arguments"""
+    parser = argparse.ArgumentParser(description="Run Hack programs over a process pool")
+    parser.add_argument('path', help="directory of .asm/.hack files or a JSON lines manifest")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--max-cycles', type=int, default=DEFAULT_MAX_CYCLES,
+                        help="cycle limit for programs that do not set one")
+    parser.add_argument('--ordered', action='store_true', help="print results in job order")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Error: '{args.path}' does not exist", file=sys.stderr)
+        sys.exit(1)
+    jobs = discover(args.path, args.max_cycles)
+    start = time.perf_counter()
+    counts = {}
+    total_cycles = 0
+    for result in run_batch(jobs, args.jobs, args.ordered):
+        print(json.dumps(result), flush=True)
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        total_cycles += result.get('cycles', 0)
+    elapsed = time.perf_counter() - start
+    summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+    print(f"{len(jobs)} programs in {elapsed:.2f} s ({summary}), "
+          f"{total_cycles / elapsed if elapsed else 0:,.0f} cycles/s overall", file=sys.stderr)
+    sys.exit(0 if counts.get('pass', 0) == len(jobs) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the simulator and assembler
+Usage: python bench.py [name ...]
+Runs every benchmark when no name is given.
+"""
+
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import gates
+import assembler
+from assembler import Assembler
+
+# Sums n + (n-1) + ... + 1 into RAM[sum], then halts at END
+COUNTDOWN = '''@30000
+D=A
+@n
+M=D
+(LOOP)
+@n
+MD=M-1
+@sum
+M=D+M
+@n
+D=M
+@LOOP
+D;JGT
+(END)
+@END
+0;JMP'''
+COUNTDOWN_END = 12
+
+
+def generated_asm(lines):
+    """A synthetic program of about `lines` lines: labels, variables, constants, jumps and comments"""
+    blocks = max(lines // 9, 1)
+    out = []
+    for i in range(blocks):
+        out += [f'(L{i})', f'@var{i % 50}', 'D=M // load', f'@{(i * 7919) % 30000}', 'D=D+A',
+                f'@L{(i * 31) % blocks}', 'D;JGT', '', 'AM=M-1']
+    return '\n'.join(out)
+
+
+def load_asm(computer, asm):
+    """Assembles asm and loads it into the computer's ROM"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prog.hack')
+        with open(path, 'w') as f:
+            f.write(Assembler().assemble(asm))
+        computer.load_instructions(path)
+
+
+def measure(build):
+    """Returns (seconds, peak bytes allocated) for one call of build()"""
+    gc.collect()
+    start = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - start
+    del obj
+    tracemalloc.start()
+    obj = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return elapsed, peak
+
+
+def populated_ram16k():
+    """A RAM16K with every bank built: one write into each of its 256 RAM64s"""
+    ram = gates.RAM16K()
+    data = gates.int_to_stream16(1)
+    for address in range(0, 16384, 64):
+        ram.update_path(data, gates.int_to_stream16(address), 1)
+    return ram
+
+
+def bench_memory_backends():
+    """Construction time and memory of the gate-level and flat RAM16K/Computer"""
+    # RAM16K builds its banks on first write, so an empty one holds nothing;
+    # the populated row is the full Register tree
+    for name, build in (
+        ('FlatRAM16K', gates.FlatRAM16K),
+        ('RAM16K (empty)', gates.RAM16K),
+        ('RAM16K (populated)', populated_ram16k),
+        ("Computer('flat')", lambda: gates.Computer('flat')),
+        ("Computer('gates')", lambda: gates.Computer('gates')),
+    ):
+        elapsed, peak = measure(build)
+        print(f"{name:20} {elapsed * 1000:10.2f} ms {peak / 2**20:10.2f} MiB")
+
+
+def bench_ram_working_set():
+    """Build a RAM16K and write a small working set (300 words) into it"""
+    addresses = [gates.int_to_stream16(a) for a in list(range(256)) + list(range(0x3000, 0x3000 + 44))]
+    data = gates.int_to_stream16(0x5555)
+
+    def build(factory):
+        def run():
+            ram = factory()
+            for address in addresses:
+                ram.update(data, address, 1)
+            return ram
+        return run
+
+    for name, factory in (('FlatRAM16K', gates.FlatRAM16K), ('RAM16K', gates.RAM16K)):
+        elapsed, peak = measure(build(factory))
+        print(f"{name:20} {elapsed * 1000:10.2f} ms {peak / 2**20:10.2f} MiB")
+
+
+def bench_engines():
+    """Instructions per second of the gate-level CPU and the fast emulator"""
+    for engine, max_cycles in (('gates', 2000), ('fast', None), ('blocks', None)):
+        computer = gates.Computer('flat', engine)
+        load_asm(computer, COUNTDOWN)
+        start = time.perf_counter()
+        result = computer.run(max_cycles=max_cycles, until_pc=COUNTDOWN_END)
+        elapsed = time.perf_counter() - start
+        print(f"{engine:8} {result.cycles:10} cycles {elapsed:8.3f} s {result.cycles / elapsed:14,.0f} instr/s")
+
+
+def bench_load():
+    """Loading a full 16K-word .hack program into ROM"""
+    hack = '\n'.join(format((i * 40503) & 0xFFFF, '016b') for i in range(gates.ROM_WORDS))
+    for backend in ('flat', 'gates'):
+        computer = gates.Computer(backend)
+        report = computer.load_hack(hack)
+        print(f"{backend:8} {report.words:8} words {report.seconds * 1000:10.2f} ms")
+
+
+def bench_screen():
+    """Frames per second of unpacking the screen and encoding PPM/PNG"""
+    import screen
+    computer = gates.Computer('flat', 'fast')
+    for addr in range(gates.SCREEN, gates.SCREEN + gates.SCREEN_WORDS, 3):
+        computer.mem.chip.write_word(addr, (addr * 40503) & 0xFFFF)
+    frames = 200
+    for name, render in (
+        ('unpack', lambda: screen.unpack_bitmap(screen.screen_array(computer))),
+        ('ppm', lambda: screen.frame_ppm(screen.unpack_bitmap(screen.screen_array(computer)))),
+        ('png', lambda: screen.frame_png(screen.unpack_bitmap(screen.screen_array(computer)))),
+    ):
+        start = time.perf_counter()
+        for _ in range(frames):
+            render()
+        elapsed = time.perf_counter() - start
+        print(f"{name:8} {elapsed * 1000 / frames:8.3f} ms/frame {frames / elapsed:10,.0f} frames/s")
+
+
+def bench_snapshot():
+    """Saving, loading and comparing full machine snapshots"""
+    import snapshot
+    computer = gates.Computer('flat', 'blocks')
+    load_asm(computer, COUNTDOWN)
+    computer.run(max_cycles=100000)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'machine.snap')
+        for name, action in (
+            ('save', lambda: snapshot.save(computer, path)),
+            ('load', lambda: snapshot.load(path)),
+            ('restore', lambda: snapshot.load(path, computer)),
+            ('compare', lambda: snapshot.take(computer) == snapshot.load(path)),
+        ):
+            repeats = 100
+            start = time.perf_counter()
+            for _ in range(repeats):
+                action()
+            elapsed = time.perf_counter() - start
+            print(f"{name:8} {elapsed * 1000 / repeats:8.3f} ms")
+        print(f"{'size':8} {os.path.getsize(path):8} bytes")
+
+
+def bench_batch():
+    """Throughput of the batch runner on 1 process and on every core"""
+    import batch
+    with tempfile.TemporaryDirectory() as tmp:
+        programs = 4 * (os.cpu_count() or 1)
+        for i in range(programs):
+            with open(os.path.join(tmp, f'countdown{i}.asm'), 'w') as f:
+                f.write(COUNTDOWN.replace('@30000', f'@{20000 + i}'))
+        jobs = batch.discover(tmp)
+        for processes in sorted({1, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            cycles = sum(result['cycles'] for result in batch.run_batch(jobs, processes))
+            elapsed = time.perf_counter() - start
+            print(f"{processes:3} processes {programs:4} programs {elapsed:8.3f} s {cycles / elapsed:14,.0f} cycles/s")
+
+
+def bench_lockstep():
+    """Cycles per second of the blocks engine under sampled lockstep checking"""
+    import lockstep
+    for interval, window in ((1, 1), (100, 1), (1000, 10), (10000, 10)):
+        computer = gates.Computer('flat', 'blocks')
+        load_asm(computer, COUNTDOWN)
+        checker = lockstep.Lockstep(computer, interval, window)
+        max_cycles = min(200000, 2000 * interval)
+        start = time.perf_counter()
+        result = checker.run(max_cycles=max_cycles, until_pc=COUNTDOWN_END)
+        elapsed = time.perf_counter() - start
+        print(f"every {interval:6} window {window:3} {result.cycles:8} cycles {result.checked:7} checked "
+              f"{result.cycles / elapsed:14,.0f} cycles/s")
+
+
+def bench_netlist():
+    """Gate counts and speed of traced-and-compiled chips against gates.py"""
+    import netlist
+    a, b = gates.int_to_stream16(12345), gates.int_to_stream16(54321)
+    chips = (
+        ('add16', gates.add16, (netlist.bus('a'), netlist.bus('b')), (a, b)),
+        ('mux16', gates.mux16, (netlist.bus('a'), netlist.bus('b'), netlist.bit('sel')), (a, b, 1)),
+    )
+    for name, chip, spec, args in chips:
+        traced = netlist.trace(chip, *spec)
+        print(traced.report())
+        compiled = netlist.compile_netlist(traced)
+        time_chip(name, chip, compiled, args)
+    for control in (0b000010, 0b010011):
+        print(netlist.trace_alu()[control].report())
+    alu = netlist.compile_alu()
+    time_chip('ALU', gates.ALU, alu, (a, b, 0, 1, 0, 0, 1, 1))
+
+
+def time_chip(name, original, compiled, args, repeats=2000):
+    timings = []
+    for function in (original, compiled):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            function(*args)
+        timings.append((time.perf_counter() - start) / repeats)
+    print(f"{name:8} original {timings[0] * 1e6:8.2f} us  compiled {timings[1] * 1e6:8.2f} us  "
+          f"{timings[0] / timings[1]:6.1f}x")
+
+
+def bench_eventsim():
+    """Activity of event-driven ALU and PC-incrementer simulation on a real instruction stream"""
+    import eventsim
+    import netlist
+    controls = [netlist.bit(name) for name in ('zx', 'nx', 'zy', 'ny', 'f', 'no')]
+    for name, chip, spec, stream in (
+        ('ALU', gates.ALU_mux, [netlist.bus('x'), netlist.bus('y')] + controls,
+         lambda emulator: ((x, y, *control) for x, y, control in eventsim.alu_inputs(emulator, 20000))),
+        ('PC inc', gates.inc16, [netlist.bus('a')],
+         lambda emulator: ((pc,) for pc in eventsim.pc_inputs(emulator, 20000))),
+    ):
+        computer = gates.Computer('flat', 'fast')
+        load_asm(computer, COUNTDOWN)
+        inputs = list(stream(computer.emulator))
+        sim = eventsim.EventSimulator(netlist.trace(chip, *spec))
+        start = time.perf_counter()
+        for args in inputs:
+            sim.evaluate(*args)
+        event_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for args in inputs:
+            chip(*args)
+        chip_time = time.perf_counter() - start
+        print(sim.report())
+        print(f"{name:8} event-driven {event_time / len(inputs) * 1e6:8.2f} us/call  "
+              f"gates.py {chip_time / len(inputs) * 1e6:8.2f} us/call")
+
+
+def bench_adders():
+    """Gate count, logic depth and evaluation time of the add16 architectures"""
+    import netlist
+    a, b = gates.int_to_stream16(12345), gates.int_to_stream16(54321)
+    repeats = 1000
+    print(f"{'adder':12} {'NANDs':>6} {'live':>6} {'depth':>6} {'gates.py us':>12} {'compiled us':>12}")
+    for name, adder in gates.ADDERS.items():
+        traced = netlist.trace(adder, netlist.bus('a'), netlist.bus('b'), name='adder')
+        compiled = netlist.compile_netlist(traced)
+        timings = []
+        for function in (adder, compiled):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                function(a, b)
+            timings.append((time.perf_counter() - start) / repeats * 1e6)
+        print(f"{name:12} {traced.calls:6} {len(traced.live()):6} {traced.depth():6} "
+              f"{timings[0]:12.2f} {timings[1]:12.2f}")
+
+
+def bench_adders_exhaustive():
+    """Checks every adder against ripple carry on all 2**32 input pairs (minutes)"""
+    import netlist
+    ripple = netlist.trace(gates.add16, netlist.bus('a'), netlist.bus('b'), name='adder')
+    for name, adder in gates.ADDERS.items():
+        if name == 'ripple':
+            continue
+        start = time.perf_counter()
+        result = netlist.check_equivalent(ripple, netlist.trace(adder, netlist.bus('a'), netlist.bus('b'), name='adder'))
+        print(f"{name:12} {'equal' if result is None else f'differs at {result}'} "
+              f"{time.perf_counter() - start:8.1f} s")
+
+
+def bench_timing():
+    """Gate count and logic depth of chip variants, ranked"""
+    import netlist
+    import timing
+    bus, bit = netlist.bus, netlist.bit
+    adders = [timing.analyze_chip(adder, bus('a'), bus('b'), name=name) for name, adder in gates.ADDERS.items()]
+    print(timing.rank(adders))
+    print()
+    # ALU branches on its control bits, so it is compared on x+y; ALU_mux is
+    # also traced with symbolic control bits
+    control = (0, 0, 0, 0, 1, 0)
+    alus = [timing.analyze_chip(gates.ALU, bus('x'), bus('y'), *control, name='ALU x+y'),
+            timing.analyze_chip(gates.ALU_mux, bus('x'), bus('y'), *control, name='ALU_mux x+y'),
+            timing.analyze_chip(gates.ALU_mux, bus('x'), bus('y'), *(bit(c) for c in 'abcdef'), name='ALU_mux')]
+    print(timing.rank(alus))
+    print()
+    for chip, bits in ((gates.RAM8, 3), (gates.RAM64, 6)):
+        print(timing.analyze_chip(chip().update, bus('in'), bus('address', bits), bit('load'),
+                                  name=chip.__name__).report(5))
+        print()
+    print(timing.analyze_chip(gates.jump_logic, bit('i'), bus('j', 3), bit('zr'), bit('ng')).report(5))
+
+
+def bench_codec():
+    """Bit-vector conversions through the codec tables against per-bit loops"""
+    import codec
+
+    def loop_to_bits(a):
+        return [(a >> (15 - i)) & 1 for i in range(16)]
+
+    def loop_from_bits(bits):
+        word = 0
+        for bit in bits:
+            word = (word << 1) | bit
+        return word
+
+    values = list(range(0, 65536, 7))
+    streams = [gates.int_to_stream16(value) for value in values]
+    cases = (
+        ('int -> bits, loop', loop_to_bits, values),
+        ('int -> bits, table', gates.int_to_stream16, values),
+        ('int -> bits, shared', codec.to_bits, values),
+        ('bits -> int, loop', loop_from_bits, streams),
+        ('bits -> int, table', codec.from_bits, streams),
+    )
+    for name, function, inputs in cases:
+        start = time.perf_counter()
+        for item in inputs:
+            function(item)
+        elapsed = time.perf_counter() - start
+        print(f"{name:22} {elapsed / len(inputs) * 1e9:8.0f} ns")
+    # The tables are built at import, so measure that in a fresh interpreter
+    script = ("import time, tracemalloc; tracemalloc.start(); start = time.perf_counter(); import codec; "
+              "print(time.perf_counter() - start, tracemalloc.get_traced_memory()[1])")
+    elapsed, peak = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.split()
+    print(f"{'import codec':22} {float(elapsed) * 1e3:8.1f} ms {int(peak) / 2**20:6.1f} MiB")
+
+
+def bench_registers():
+    """Bytes per Register and per gate-level RAM, and Register update speed"""
+    for name, build, count in (('Register', gates.Register, 1000), ('RAM8', gates.RAM8, 100),
+                               ('RAM64', gates.RAM64, 10)):
+        gc.collect()
+        tracemalloc.start()
+        objects = [build() for _ in range(count)]
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del objects
+        print(f"{name:10} {used / count:10.0f} bytes")
+    register, data = gates.Register(), gates.int_to_stream16(0x1234)
+    repeats = 100000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        register.update(data, 1)
+        register.value()
+    print(f"update + value {(time.perf_counter() - start) / repeats * 1e9:8.0f} ns")
+
+
+class ReferenceParser:
+    """
+    The assembler's parser before the tokenizer: every accessor re-splits
+    and strips the current line. Kept as the baseline for bench_assembler.
+    """
+
+    def __init__(self, text):
+        self.symbol_table = dict(assembler.PREDEFINED_SYMBOLS)
+        self.current_command = None
+        self.line_index = 0
+        self.instruction_count = 0
+        self.lines = text.split('\n')
+        self.last_var = 16
+        while self.has_more_commands():
+            self.advance()
+            if self.command_type() == 'L_COMMAND':
+                label = self.current_command.split('//')[0].strip()
+                self.symbol_table[label[1:-1]] = self.instruction_count
+            elif self.command_type() == 'A_COMMAND':
+                value = self.current_command.split('//')[0].strip()
+                if not value[1:].isdigit() and value[1:] not in self.symbol_table:
+                    self.symbol_table[value[1:]] = self.last_var
+                    self.last_var += 1
+        self.line_index = 0
+        self.instruction_count = 0
+
+    def has_more_commands(self):
+        return self.line_index < len(self.lines)
+
+    def advance(self):
+        self.current_command = self.lines[self.line_index]
+        while len(list(self.current_command.split('//')[0].strip())) == 0:
+            self.line_index += 1
+            self.current_command = self.lines[self.line_index]
+        if self.command_type() in ['A_COMMAND', 'C_COMMAND']:
+            self.instruction_count += 1
+        self.line_index += 1
+
+    def command_type(self):
+        command_list = list(self.current_command.split('//')[0].replace(' ', ''))
+        if command_list[0] == '@':
+            return 'A_COMMAND'
+        elif command_list[0] == '(' and command_list[-1] == ')':
+            return 'L_COMMAND'
+        return 'C_COMMAND'
+
+    def symbol(self):
+        value = self.current_command.split('//')[0].strip()[1:]
+        return int(value) if value.isdigit() else int(self.symbol_table[value])
+
+    def dest(self):
+        split_instr = self.current_command.split('//')[0].split('=')
+        return '' if len(split_instr) == 1 else split_instr[0].strip()
+
+    def comp(self):
+        split_instr = self.current_command.split('//')[0].split('=')
+        return split_instr[-1].split(';')[0].strip()
+
+    def jump(self):
+        split_instr = self.current_command.split('//')[0].split(';')
+        return '' if len(split_instr) == 1 else split_instr[1].strip()
+
+
+def reference_assemble(text):
+    """The old Assembler.assemble: Code tables rebuilt per lookup, output grown with +="""
+    parser = ReferenceParser(text)
+    output_binary = ""
+    while parser.has_more_commands():
+        parser.advance()
+        c_type = parser.command_type()
+        if c_type == 'A_COMMAND':
+            output_binary += '0' + format(parser.symbol(), '015b') + '\n'
+        elif c_type == 'C_COMMAND':
+            dest_mnemonic = parser.dest() if parser.dest() else 'null'
+            jump_mnemonic = parser.jump() if parser.jump() else 'null'
+            a, c1, c2, c3, c4, c5, c6 = dict(assembler.COMP)[parser.comp()]
+            d1, d2, d3 = dict(assembler.DEST)[dest_mnemonic]
+            j1, j2, j3 = dict(assembler.JUMP)[jump_mnemonic]
+            output_binary += f'111{a}{c1}{c2}{c3}{c4}{c5}{c6}{d1}{d2}{d3}{j1}{j2}{j3}' + '\n'
+    return output_binary.strip()
+
+
+def bench_assembler():
+    """Assembler throughput in source lines per second, against the old parser"""
+    for lines in (10_000, 100_000):
+        asm = generated_asm(lines)
+        count = asm.count('\n') + 1
+        outputs = []
+        for name, assemble in (('before', reference_assemble), ('after', Assembler().assemble)):
+            start = time.perf_counter()
+            outputs.append(assemble(asm))
+            elapsed = time.perf_counter() - start
+            print(f"{count:8} lines {name:7} {elapsed:8.3f} s {count / elapsed:12,.0f} lines/s")
+        if outputs[0] != outputs[1]:
+            print("         outputs differ!")
+    # Streaming from and to files; peak memory follows the symbol table
+    # (a label every 9 lines here), not the program size
+    with tempfile.TemporaryDirectory() as tmp:
+        for lines in (10_000, 100_000):
+            path = os.path.join(tmp, f'prog{lines}.asm')
+            with open(path, 'w') as f:
+                f.write(generated_asm(lines))
+            start = time.perf_counter()
+            Assembler().assemble_file(path)
+            elapsed = time.perf_counter() - start
+            tracemalloc.start()
+            Assembler().assemble_file(path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{lines:8} lines {elapsed:8.3f} s {lines / elapsed:12,.0f} lines/s streamed, "
+                  f"peak {peak / 1024:,.0f} KiB")
+
+
+BENCHMARKS = {
+    'memory_backends': bench_memory_backends,
+    'ram_working_set': bench_ram_working_set,
+    'engines': bench_engines,
+    'load': bench_load,
+    'screen': bench_screen,
+    'snapshot': bench_snapshot,
+    'batch': bench_batch,
+    'lockstep': bench_lockstep,
+    'netlist': bench_netlist,
+    'eventsim': bench_eventsim,
+    'adders': bench_adders,
+    'timing': bench_timing,
+    'codec': bench_codec,
+    'registers': bench_registers,
+    'assembler': bench_assembler,
+}
+
+# Too slow for the default run, only run when named
+EXTRA_BENCHMARKS = {
+    'adders_exhaustive': bench_adders_exhaustive,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    available = {**BENCHMARKS, **EXTRA_BENCHMARKS}
+    for name in names:
+        if name not in available:
+            print(f"Unknown benchmark '{name}', choose from: {', '.join(available)}")
+            sys.exit(1)
+        print(f"== {name}")
+        available[name]()
+
+
+if __name__ == "__main__":
+    main()
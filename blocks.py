@@ -0,0 +1,167 @@
+'''
+Basic-block compiler for Hack programs.
+
+Starting from any PC, a block runs straight through the predecoded ROM up
+to and including the first instruction with jump bits (or MAX_BLOCK_LENGTH
+instructions). Each block is turned into Python source, compiled once and
+cached by its start address:
+
+  def block_4(a, d, ram, limit):
+    ...            # one or two lines per instruction
+    return a, d, next_pc, 1
+
+A block whose jump goes back to its own start loops internally, up to
+limit iterations, and returns how many it ran.
+
+Values loaded by @constant are propagated, so M accesses after an
+A-instruction index RAM with a literal address. BlockEmulator runs the
+blocks with the same semantics and budget rules as Emulator.run.
+'''
+from typing import Optional
+
+from gates import ALU_TABLE, alu_expression
+from emulator import (Emulator, RunResult, A_INSTRUCTION, ROM_MASK, RAM_MASK, DEST_A, DEST_D, DEST_M)
+
+MAX_BLOCK_LENGTH = 256
+UNLIMITED = 1 << 62
+
+# Control word of each ALU_TABLE function, to recover it from a Decoded op
+_CONTROL_WORDS = {op: control for control, op in enumerate(ALU_TABLE)}
+
+# Python condition on `out` for each jjj value (0 is no jump)
+JUMP_CONDITIONS = (
+  None,
+  '0 < out < 0x8000',            # JGT
+  'out == 0',                    # JEQ
+  'out < 0x8000',                # JGE
+  'out >= 0x8000',               # JLT
+  'out != 0',                    # JNE
+  'out == 0 or out >= 0x8000',   # JLE
+  'True',                        # JMP
+)
+
+def block_source(program, start: int) -> tuple[str, int]:
+  '''
+  Generates the source of the block starting at start.
+  Returns (source, number of instructions in the block).
+  '''
+  body = []
+  known_a = None  # value of A when it was set by an A-instruction in this block
+  reads_a = False  # whether the block reads the incoming A
+  pc = start
+  while True:
+    record = program[pc & ROM_MASK]
+    pc += 1
+    if record.kind == A_INSTRUCTION:
+      # No store: uses of A below and the return inline the constant
+      known_a = record.constant
+      jump = 0
+    else:
+      reads_a = reads_a or known_a is None
+      a_expr = 'a' if known_a is None else str(known_a)
+      m_expr = f'ram[a & {RAM_MASK}]' if known_a is None else f'ram[{known_a & RAM_MASK}]'
+      out = alu_expression(_CONTROL_WORDS[record.op], 'd', m_expr if record.uses_m else a_expr)
+      jump = record.jump >> 2
+      # One chained assignment; targets are stored left to right, so M is
+      # written at the old A before A itself is loaded
+      targets = []
+      if record.dest & DEST_M:
+        targets.append(m_expr)
+      if record.dest & DEST_D:
+        targets.append('d')
+      if record.dest & DEST_A:
+        if jump and known_a is None:
+          body.append('target = a')
+          a_expr = 'target'
+        targets.append('a')
+        known_a = None
+      if jump:
+        targets.append('out')
+      if targets:
+        body.append(f"{' = '.join(targets)} = {out}")
+    if jump or pc - start == MAX_BLOCK_LENGTH:
+      break
+  a_out = 'a' if known_a is None else known_a
+  lines = [f'def block_{start}(a, d, ram, limit):']
+  if jump and a_expr == str(start):
+    # The block branches back to its own start: loop here while the jump
+    # is taken, at most limit times
+    lines.append('  n = 0')
+    lines.append('  while True:')
+    lines.append('    n += 1')
+    lines.extend('    ' + line for line in body)
+    lines.append(f'    if {JUMP_CONDITIONS[jump]}:')
+    lines.append('      if n == limit:')
+    lines.append(f'        return {a_out}, d, {start}, n')
+    if reads_a and known_a is not None:
+      lines.append(f'      a = {known_a}')
+    lines.append('      continue')
+    lines.append(f'    return {a_out}, d, {pc}, n')
+  else:
+    lines.extend('  ' + line for line in body)
+    if jump:
+      lines.append(f'  if {JUMP_CONDITIONS[jump]}:')
+      lines.append(f'    return {a_out}, d, {a_expr}, 1')
+    lines.append(f'  return {a_out}, d, {pc}, 1')
+  return '\n'.join(lines) + '\n', pc - start
+
+def compile_block(program, start: int):
+  '''
+  Returns (function, length) for the block starting at start
+  '''
+  source, length = block_source(program, start)
+  namespace = {}
+  exec(source, namespace)
+  return namespace[f'block_{start}'], length
+
+class BlockEmulator(Emulator):
+  '''
+  Emulator that executes compiled basic blocks instead of single
+  instructions. Falls back to single instructions when the cycle budget or
+  until_pc would end the run inside a block.
+  '''
+  def __init__(self, rom=None, ram=None):
+    super().__init__(rom, ram)
+    self.blocks = {}
+
+  def decode_rom(self) -> None:
+    super().decode_rom()
+    self.blocks = {}
+
+  def block(self, pc: int):
+    entry = self.blocks.get(pc)
+    if entry is None:
+      entry = self.blocks[pc] = compile_block(self.program, pc)
+    return entry
+
+  def run(self, max_cycles: Optional[int] = None, until_pc: Optional[int] = None) -> RunResult:
+    if self.program is None:
+      self.decode_rom()
+    blocks, ram = self.blocks, self.ram
+    a, d, pc = self.a, self.d, self.pc
+    budget = -1 if max_cycles is None else max_cycles
+    stop = -1 if until_pc is None else until_pc
+    n = 0
+    while n != budget and pc != stop:
+      entry = blocks.get(pc)
+      if entry is None:
+        entry = self.block(pc)
+      function, length = entry
+      if (budget >= 0 and n + length > budget) or pc < stop < pc + length:
+        # The run ends inside this block: finish it one instruction at a time
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += n
+        tail = Emulator.run(self, None if budget < 0 else budget - n, until_pc)
+        return RunResult(n + tail.cycles, tail.pc, tail.a, tail.d)
+      # A looping block only re-enters at its own start, which is neither
+      # until_pc nor past it (both checked above), so only the budget
+      # limits how many times it may repeat
+      if budget >= 0:
+        limit = (budget - n) // length
+      else:
+        limit = UNLIMITED
+      a, d, pc, count = function(a, d, ram, limit)
+      n += count * length
+    self.a, self.d, self.pc = a, d, pc
+    self.cycles += n
+    return RunResult(n, pc, a, d)
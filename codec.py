@@ -0,0 +1,46 @@
+'''
+Precomputed bit-vector codec for the bus widths the chips use.
+
+BITSn[value] is the n-bit tuple for value, MSB first as in int_to_stream16,
+for n in 3 (RAM8 addresses), 8 and 16 (words). The tables are built once at
+import and hold one shared, immutable tuple per value, so a conversion is a
+single index; callers that need a list they can modify copy it
+(gates.int_to_stream16 does).
+
+VALUES maps every tuple of up to 8 bits back to its value, so from_bits()
+decodes up to 16 bits as a high and a low byte, two small dict lookups,
+and falls back to a shift loop for anything longer.
+'''
+WIDTHS = (3, 8, 16)
+
+BITS8 = tuple(tuple((value >> (7 - i)) & 1 for i in range(8)) for value in range(256))
+BITS3 = tuple(bits[5:] for bits in BITS8[:8])
+BITS16 = tuple(high + low for high in BITS8 for low in BITS8)
+
+TABLES = {3: BITS3, 8: BITS8, 16: BITS16}
+
+VALUES = {bits[8 - width:]: value for width in range(9) for value, bits in enumerate(BITS8[:1 << width])}
+
+def to_bits(value: int, width: int = 16) -> tuple:
+  '''
+  The shared width-bit tuple for the low width bits of value
+  '''
+  table = TABLES[width]
+  return table[value & (len(table) - 1)]
+
+def from_bits(bits) -> int:
+  '''
+  The value of a bit sequence, MSB first
+  '''
+  bits = tuple(bits)
+  try:
+    if len(bits) <= 8:
+      return VALUES[bits]
+    if len(bits) <= 16:
+      return VALUES[bits[:-8]] << 8 | VALUES[bits[-8:]]
+  except KeyError:
+    pass
+  value = 0
+  for bit in bits:
+    value = (value << 1) | bit
+  return value
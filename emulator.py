@@ -0,0 +1,145 @@
+'''
+Instruction-level execution engine for the Hack computer.
+
+Emulator keeps A, D and PC as ints and ROM/RAM as flat array('H') words,
+and executes whole instructions with the packed-word ALU dispatch table
+instead of clocking the gate-level CPU. It follows CPU.update exactly:
+
+  - M is RAM[A] with A as it was before the instruction,
+  - the ALU reads D and A (or M) before any register is loaded,
+  - memory writes and jumps use the old A, then A is loaded,
+  - ROM is addressed by the low 14 bits like ROM16K, memory by the low
+    15 bits like MemoryChip (RAM, screen and keyboard in one array).
+'''
+from array import array
+from typing import NamedTuple, Optional
+
+from gates import ALU_TABLE
+
+ROM_SIZE = 16384
+RAM_SIZE = 32768
+ROM_MASK = 0x3FFF
+RAM_MASK = 0x7FFF
+
+# JUMP_TABLE[(jjj << 2) | (zr << 1) | ng] is 1 when the jump is taken
+JUMP_TABLE = tuple(
+  int(bool((j & 4 and ng) or (j & 2 and zr) or (j & 1 and not zr and not ng)))
+  for j in range(8) for zr in (0, 1) for ng in (0, 1)
+)
+
+A_INSTRUCTION = 0
+C_INSTRUCTION = 1
+
+# dest mask bits
+DEST_A = 4
+DEST_D = 2
+DEST_M = 1
+
+class Decoded(NamedTuple):
+  '''
+  A ROM word decoded once: kind is A_INSTRUCTION or C_INSTRUCTION, op is
+  the ALU_TABLE function for the comp bits, uses_m selects M over A as the
+  ALU y input, dest is a DEST_* mask, jump is the jjj bits shifted into
+  place for JUMP_TABLE, constant is the value an A-instruction loads.
+  '''
+  kind: int
+  op: object
+  uses_m: int
+  dest: int
+  jump: int
+  constant: int
+
+_decoded = [None] * 65536
+
+def decode(word: int) -> Decoded:
+  '''
+  Decodes one instruction word; records are interned, so every ROM word
+  with the same value shares one record.
+  '''
+  record = _decoded[word]
+  if record is None:
+    if word < 0x8000:
+      record = Decoded(A_INSTRUCTION, None, 0, 0, 0, word)
+    else:
+      record = Decoded(C_INSTRUCTION, ALU_TABLE[(word >> 6) & 63], (word >> 12) & 1,
+                       (word >> 3) & 7, (word & 7) << 2, 0)
+    _decoded[word] = record
+  return record
+
+def predecode(rom) -> list[Decoded]:
+  '''
+  Decodes a whole ROM image into a table indexed by PC
+  '''
+  return [decode(word) for word in rom]
+
+class RunResult(NamedTuple):
+  cycles: int
+  pc: int
+  a: int
+  d: int
+
+class Emulator:
+  def __init__(self, rom: Optional[array] = None, ram: Optional[array] = None):
+    '''
+    rom, ram: array('H') word stores to execute from / work on, e.g. the
+    words of a Computer's flat ROM16K and MemoryChip so both share memory
+    '''
+    self.rom = rom if rom is not None else array('H', bytes(2 * ROM_SIZE))
+    self.ram = ram if ram is not None else array('H', bytes(2 * RAM_SIZE))
+    self.a = 0
+    self.d = 0
+    self.pc = 0
+    self.cycles = 0
+    # Predecoded ROM, built on the first run; call decode_rom() after
+    # changing ROM words
+    self.program = None
+
+  def decode_rom(self) -> None:
+    self.program = predecode(self.rom)
+
+  def reset(self) -> None:
+    self.pc = 0
+
+  def state(self) -> RunResult:
+    return RunResult(self.cycles, self.pc, self.a, self.d)
+
+  def step(self) -> None:
+    self.run(max_cycles=1)
+
+  def run(self, max_cycles: Optional[int] = None, until_pc: Optional[int] = None) -> RunResult:
+    '''
+    Executes instructions until max_cycles have run or the PC reaches
+    until_pc (checked before fetching). With neither set it runs forever,
+    like the gate-level Computer.run used to.
+    Returns the number of cycles executed by this call and the final state.
+    '''
+    if self.program is None:
+      self.decode_rom()
+    program, ram, jump_table = self.program, self.ram, JUMP_TABLE
+    a, d, pc = self.a, self.d, self.pc
+    limit = -1 if max_cycles is None else max_cycles
+    stop = -1 if until_pc is None else until_pc
+    n = 0
+    try:
+      while n != limit and pc != stop:
+        kind, op, uses_m, dest, jump, constant = program[pc & ROM_MASK]
+        n += 1
+        if not kind:
+          a = constant
+          pc += 1
+          continue
+        out, zr, ng = op(d, ram[a & RAM_MASK] if uses_m else a)
+        if dest & DEST_M:
+          ram[a & RAM_MASK] = out
+        if dest & DEST_D:
+          d = out
+        if jump_table[jump | (zr << 1) | ng]:
+          pc = a
+        else:
+          pc += 1
+        if dest & DEST_A:
+          a = out
+    finally:
+      self.a, self.d, self.pc = a, d, pc
+      self.cycles += n
+    return RunResult(n, pc, a, d)
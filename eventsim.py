@@ -0,0 +1,144 @@
+'''
+Event-driven incremental simulation of traced NAND netlists.
+
+EventSimulator keeps the value of every wire of a netlist (see
+netlist.trace) between evaluations. When new inputs arrive, only the
+gates downstream of the input bits that changed are re-evaluated, and a
+gate's fan-out is only scheduled if its output actually toggled. Gate
+numbers are already in topological order, so a heap ordered by index
+evaluates every scheduled gate once, after all of its inputs.
+
+activity() reports how many gate evaluations were done against what
+full re-evaluation would have cost, which shows how much work a real
+instruction stream lets the simulator skip:
+
+  sim = EventSimulator(trace(gates.ALU_mux, bus('x'), bus('y'), bit('zx'), ...))
+  for x, y, control in alu_inputs(emulator, 10000):
+    sim.evaluate(x, y, *control)
+  print(sim.report())
+'''
+import heapq
+
+from emulator import Emulator, C_INSTRUCTION, RAM_MASK, ROM_MASK
+from gates import word_to_stream16
+from netlist import Netlist, Wire
+
+class EventSimulator:
+  def __init__(self, netlist: Netlist):
+    self.netlist = netlist
+    nodes = netlist.nodes
+    self.nodes = nodes
+    self.live = netlist.live()
+    self.values = bytearray(len(nodes))
+    self.queued = bytearray(len(nodes))
+    self.fanout = [[] for _ in nodes]
+    for index in self.live:
+      a, b = nodes[index]
+      self.fanout[a].append(index)
+      if b != a:
+        self.fanout[b].append(index)
+    self.input_wires = [index for _, indices in netlist.inputs for index in indices]
+    self.bus_inputs = [input_.width is not None for input_, _ in netlist.inputs]
+    # Settle the circuit for all-zero inputs
+    values = self.values
+    for index in self.live:
+      a, b = nodes[index]
+      values[index] = 1 ^ (values[a] & values[b])
+    self.calls = 0
+    self.evaluated = 0
+    self.toggled = 0
+    self.inputs_changed = 0
+
+  def evaluate(self, *args):
+    '''
+    Same arguments, in the same order, as the netlist's symbolic inputs;
+    returns the chip's outputs
+    '''
+    bits = []
+    for arg, is_bus in zip(args, self.bus_inputs):
+      if is_bus:
+        bits.extend(arg)
+      else:
+        bits.append(arg)
+    values, queued, fanout, nodes = self.values, self.queued, self.fanout, self.nodes
+    pending = []
+    for wire, value in zip(self.input_wires, bits):
+      if values[wire] != value:
+        values[wire] = value
+        self.inputs_changed += 1
+        for gate in fanout[wire]:
+          if not queued[gate]:
+            queued[gate] = 1
+            heapq.heappush(pending, gate)
+    evaluated = toggled = 0
+    while pending:
+      index = heapq.heappop(pending)
+      queued[index] = 0
+      a, b = nodes[index]
+      value = 1 ^ (values[a] & values[b])
+      evaluated += 1
+      if value != values[index]:
+        values[index] = value
+        toggled += 1
+        for gate in fanout[index]:
+          if not queued[gate]:
+            queued[gate] = 1
+            heapq.heappush(pending, gate)
+    self.calls += 1
+    self.evaluated += evaluated
+    self.toggled += toggled
+    return self.read(self.netlist.output)
+
+  def read(self, value):
+    if isinstance(value, Wire):
+      return self.values[value.index]
+    if isinstance(value, list):
+      return [self.read(item) for item in value]
+    if isinstance(value, tuple):
+      return tuple(self.read(item) for item in value)
+    return value
+
+  def activity(self) -> dict:
+    full = self.calls * len(self.live)
+    return {
+      'calls': self.calls,
+      'gates': len(self.live),
+      'full evaluations': full,
+      'evaluated': self.evaluated,
+      'toggled': self.toggled,
+      'inputs changed': self.inputs_changed,
+      'skipped': 1 - self.evaluated / full if full else 0.0,
+    }
+
+  def report(self) -> str:
+    stats = self.activity()
+    calls = stats['calls'] or 1
+    return (f"{self.netlist.name}: {stats['calls']} evaluations of {stats['gates']} gates, "
+            f"{stats['evaluated'] / calls:.1f} gates evaluated and {stats['toggled'] / calls:.1f} "
+            f"toggled per call, {stats['inputs changed'] / calls:.1f} input bits changed per call, "
+            f"{100 * stats['skipped']:.1f}% of the work skipped")
+
+def alu_inputs(emulator: Emulator, cycles: int):
+  '''
+  Runs emulator for up to `cycles` instructions, yielding the ALU inputs
+  (x bits, y bits, control bits) of every C-instruction executed
+  '''
+  if emulator.program is None:
+    emulator.decode_rom()
+  rom, ram = emulator.rom, emulator.ram
+  for _ in range(cycles):
+    word = rom[emulator.pc & ROM_MASK]
+    if word >> 15 == C_INSTRUCTION:
+      y = ram[emulator.a & RAM_MASK] if (word >> 12) & 1 else emulator.a
+      control = [(word >> shift) & 1 for shift in range(11, 5, -1)]
+      yield word_to_stream16(emulator.d), word_to_stream16(y), control
+    emulator.step()
+
+def pc_inputs(emulator: Emulator, cycles: int):
+  '''
+  Runs emulator for up to `cycles` instructions, yielding the PC before
+  each one as a bit list (the input of the PC incrementer)
+  '''
+  for _ in range(cycles):
+    yield word_to_stream16(emulator.pc)
+    emulator.step()
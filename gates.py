@@ -1,3 +1,10 @@
+import sys
+import time
+from array import array
+from typing import NamedTuple
+
+from codec import BITS3, BITS8, BITS16, from_bits
+
 
 def nand(a: int, b: int) -> int:
   return 0 if (a and b) else 1
@@ -100,6 +107,134 @@ def add16(a: list[int], b: list[int]) -> list[int]:
     r8[0], r9[0], r10[0], r11[0], r12[0], r13[0], r14[0], r15[0], r16[0]
   ]
 
+# Alternative adder architectures. They work on buses of any width (MSB
+# first, like add16) and are built from the same NAND-based gates.
+# Internally bit i is weight 2**i: g/p are the generate and propagate
+# signals, and (G, P) pairs are combined with the prefix operator
+#   (G_hi, P_hi) o (G_lo, P_lo) = (G_hi | P_hi & G_lo, P_hi & P_lo)
+
+def and_tree(bits: list[int]) -> int:
+  while len(bits) > 1:
+    bits = [and_(bits[i], bits[i + 1]) if i + 1 < len(bits) else bits[i] for i in range(0, len(bits), 2)]
+  return bits[0]
+
+def or_tree(bits: list[int]) -> int:
+  while len(bits) > 1:
+    bits = [or_(bits[i], bits[i + 1]) if i + 1 < len(bits) else bits[i] for i in range(0, len(bits), 2)]
+  return bits[0]
+
+def lookahead(g: list[int], p: list[int], c0: int) -> list[int]:
+  '''
+  Carry-lookahead unit: the carries into positions 1..len(g), each as a
+  two-level AND/OR of the generate/propagate bits and c0
+  '''
+  carries = []
+  for k in range(len(g)):
+    terms = [and_tree([g[m]] + p[m + 1:k + 1]) for m in range(k + 1)]
+    terms.append(and_tree(p[:k + 1] + [c0]))
+    carries.append(or_tree(terms))
+  return carries
+
+def _sum_bits(p: list[int], carries: list[int]) -> list[int]:
+  # carries[i] is the carry into bit i; returns the MSB-first sum
+  return [xor(p[i], carries[i]) for i in range(len(p))][::-1]
+
+def add_ripple(a: list[int], b: list[int]) -> list[int]:
+  '''
+  Ripple-carry adder of any width, the same chain as add16
+  '''
+  out = [0] * len(a)
+  carry = 0
+  for i in range(len(a) - 1, -1, -1):
+    out[i], carry = full_adder(a[i], b[i], carry)
+  return out
+
+def add_cla(a: list[int], b: list[int], block: int = 4) -> list[int]:
+  '''
+  Two-level carry-lookahead adder: lookahead units inside blocks of
+  `block` bits, and one over the blocks' group generate/propagate
+  '''
+  a, b = a[::-1], b[::-1]
+  g = [and_(x, y) for x, y in zip(a, b)]
+  p = [xor(x, y) for x, y in zip(a, b)]
+  starts = range(0, len(a), block)
+  group_g, group_p = [], []
+  for start in starts:
+    bg, bp = g[start:start + block], p[start:start + block]
+    group_g.append(lookahead(bg, bp, 0)[-1])
+    group_p.append(and_tree(bp))
+  block_carries = [0] + lookahead(group_g, group_p, 0)[:-1]
+  carries = []
+  for start, carry_in in zip(starts, block_carries):
+    bg, bp = g[start:start + block], p[start:start + block]
+    carries += [carry_in] + lookahead(bg, bp, carry_in)[:-1]
+  return _sum_bits(p, carries)
+
+def _prefix_add(a: list[int], b: list[int], pairs) -> list[int]:
+  '''
+  Parallel-prefix adder: pairs yields, level by level, the (i, j) prefix
+  combinations G[i], P[i] = (G[i], P[i]) o (G[j], P[j])
+  '''
+  a, b = a[::-1], b[::-1]
+  G = [and_(x, y) for x, y in zip(a, b)]
+  p = [xor(x, y) for x, y in zip(a, b)]
+  P = p[:]
+  for level in pairs(len(a)):
+    new_G, new_P = G[:], P[:]
+    for i, j in level:
+      new_G[i] = or_(G[i], and_(P[i], G[j]))
+      new_P[i] = and_(P[i], P[j])
+    G, P = new_G, new_P
+  # G[i] is now the carry out of bits 0..i
+  return _sum_bits(p, [0] + G[:-1])
+
+def _kogge_stone_pairs(n: int):
+  distance = 1
+  while distance < n:
+    yield [(i, i - distance) for i in range(distance, n)]
+    distance *= 2
+
+def _brent_kung_pairs(n: int):
+  distance = 1
+  while distance < n:
+    yield [(i, i - distance) for i in range(2 * distance - 1, n, 2 * distance)]
+    distance *= 2
+  distance //= 2
+  while distance >= 1:
+    yield [(i, i - distance) for i in range(3 * distance - 1, n, 2 * distance)]
+    distance //= 2
+
+def add_kogge_stone(a: list[int], b: list[int]) -> list[int]:
+  '''
+  Kogge-Stone adder: log2(n) prefix levels, every position combined at
+  every level (minimum depth, most gates)
+  '''
+  return _prefix_add(a, b, _kogge_stone_pairs)
+
+def add_brent_kung(a: list[int], b: list[int]) -> list[int]:
+  '''
+  Brent-Kung adder: an up-sweep and a down-sweep tree, 2*log2(n) - 1
+  prefix levels with about 2n combinations
+  '''
+  return _prefix_add(a, b, _brent_kung_pairs)
+
+ADDERS = {
+  'ripple': add16,
+  'cla': add_cla,
+  'kogge_stone': add_kogge_stone,
+  'brent_kung': add_brent_kung,
+}
+
+def select_adder(name: str) -> None:
+  '''
+  Rebinds add16, which inc16 and ALU call, to one of ADDERS. Modules that
+  imported add16 by name keep the function they imported.
+  '''
+  global add16
+  if name not in ADDERS:
+    raise ValueError(f"Unknown adder {name!r}, choose from: {', '.join(ADDERS)}")
+  add16 = ADDERS[name]
+
 def inc16(a: int) -> int:
   return add16(a, int_to_stream16(1))
 
@@ -165,6 +300,21 @@ def ALU(x: list[int], y: list[int], zx: int, nx: int, zy: int, ny: int, f: int,
   
   return (out, zr, ng)
 
+def ALU_mux(x: list[int], y: list[int], zx: int, nx: int, zy: int, ny: int, f: int, no: int) -> tuple[list[int], int, int]:
+  '''
+  The same ALU as a pure gate circuit: each control bit selects through a
+  mux16, as in the HDL version, instead of a Python branch, so the control
+  bits can be signals too (see netlist.trace)
+  '''
+  zero = [0] * 16
+  ox = mux16(x, zero, zx)
+  ox = mux16(ox, not16(ox), nx)
+  oy = mux16(y, zero, zy)
+  oy = mux16(oy, not16(oy), ny)
+  out = mux16(and16(ox, oy), add16(ox, oy), f)
+  out = mux16(out, not16(out), no)
+  return (out, iszero16(out), out[0])
+
 def iszero16(a: list[int]) -> int:
   return not_(
     or_(
@@ -223,7 +373,114 @@ def iszero8(a: list[int]) -> int:
     a[0])
   )
 
+# Packed-word bus: a 16-bit bus held in a single int, bit 15 of the word is
+# element 0 of the equivalent bit list (MSB first, as in int_to_stream16).
+MASK16 = 0xFFFF
+
+def stream16_to_word(a: list[int]) -> int:
+  return from_bits(a)
+
+def word_to_stream16(a: int) -> list[int]:
+  return list(BITS16[a & MASK16])
+
+def and16_w(a: int, b: int) -> int:
+  return a & b
+
+def or16_w(a: int, b: int) -> int:
+  return a | b
+
+def not16_w(a: int) -> int:
+  return a ^ MASK16
+
+def mux16_w(a: int, b: int, sel: int) -> int:
+  return b if sel else a
+
+def add16_w(a: int, b: int) -> int:
+  return (a + b) & MASK16
+
+def inc16_w(a: int) -> int:
+  return (a + 1) & MASK16
+
+def iszero16_w(a: int) -> int:
+  return 0 if a else 1
+
+def ALU_w(x: int, y: int, zx: int, nx: int, zy: int, ny: int, f: int, no: int) -> tuple[int, int, int]:
+  '''
+  Packed-word ALU, same contract as ALU but x, y and out are 16-bit ints.
+  '''
+  if zx:
+    x = 0
+  if nx:
+    x ^= MASK16
+  if zy:
+    y = 0
+  if ny:
+    y ^= MASK16
+  if f:
+    out = (x + y) & MASK16
+  else:
+    out = x & y
+  if no:
+    out ^= MASK16
+  return out, 0 if out else 1, out >> 15
+
+def alu_control_word(zx: int, nx: int, zy: int, ny: int, f: int, no: int) -> int:
+  return (zx << 5) | (nx << 4) | (zy << 3) | (ny << 2) | (f << 1) | no
+
+# Simplified forms of the 18 comp functions used by the Hack ISA
+_HACK_ALU_EXPRESSIONS = {
+  0b101010: '0', 0b111111: '1', 0b111010: '0xFFFF',
+  0b001100: '{x}', 0b110000: '{y}',
+  0b001101: '({x} ^ 0xFFFF)', 0b110001: '({y} ^ 0xFFFF)',
+  0b001111: '(-{x} & 0xFFFF)', 0b110011: '(-{y} & 0xFFFF)',
+  0b011111: '(({x} + 1) & 0xFFFF)', 0b110111: '(({y} + 1) & 0xFFFF)',
+  0b001110: '(({x} - 1) & 0xFFFF)', 0b110010: '(({y} - 1) & 0xFFFF)',
+  0b000010: '(({x} + {y}) & 0xFFFF)', 0b010011: '(({x} - {y}) & 0xFFFF)',
+  0b000111: '(({y} - {x}) & 0xFFFF)', 0b000000: '({x} & {y})', 0b010101: '({x} | {y})',
+}
+
+def alu_expression(control: int, x: str = 'x', y: str = 'y') -> str:
+  '''
+  Python source for the packed-word ALU output under one 6-bit control
+  word (zx nx zy ny f no, zx being the MSB), with x and y substituted by
+  the given expressions. Zeroed inputs are folded to constants.
+  '''
+  simplified = _HACK_ALU_EXPRESSIONS.get(control)
+  if simplified is not None:
+    return simplified.format(x=x, y=y)
+  zx, nx, zy, ny, f, no = [(control >> (5 - i)) & 1 for i in range(6)]
+  if zx and zy:
+    return str(ALU_w(0, 0, zx, nx, zy, ny, f, no)[0])
+  ox = str(MASK16 if nx else 0) if zx else (f'({x} ^ 0xFFFF)' if nx else x)
+  oy = str(MASK16 if ny else 0) if zy else (f'({y} ^ 0xFFFF)' if ny else y)
+  out = f'(({ox} + {oy}) & 0xFFFF)' if f else f'({ox} & {oy})'
+  if no:
+    out = f'({out} ^ 0xFFFF)'
+  return out
+
+def _compile_alu_op(control: int):
+  '''
+  Builds a packed-word ALU function specialised for one control word,
+  so e.g. "D+1" compiles to a single masked add.
+  '''
+  name = f'_alu_{control:06b}'
+  out = alu_expression(control)
+  if control & 0b101000 == 0b101000:
+    # zx and zy: the output is a constant
+    out = int(out, 0)
+    source = f'def {name}(x, y):\n  return {out}, {0 if out else 1}, {out >> 15}\n'
+  else:
+    source = f'def {name}(x, y):\n  out = {out}\n  return out, 0 if out else 1, out >> 15\n'
+  namespace = {}
+  exec(source, namespace)
+  return namespace[name]
+
+# ALU_TABLE[alu_control_word(zx, nx, zy, ny, f, no)](x, y) == ALU_w(x, y, zx, nx, zy, ny, f, no)
+ALU_TABLE = tuple(_compile_alu_op(control) for control in range(64))
+
 class DFF:
+  __slots__ = ('out',)
+
   def __init__(self):
     self.out = 0
 
@@ -235,44 +492,48 @@ class DFF:
 
 
 class Register:
+  '''
+  Sixteen DFFs sharing a load line. The bits are kept in a single int
+  (element 0 of the bus is bit 15, as in int_to_stream16) rather than in
+  sixteen DFF objects, under 100 bytes per register instead of about 1.5 KB.
+  '''
+  __slots__ = ('word',)
+
   def __init__(self):
-    self.b0 = DFF()
-    self.b1 = DFF()
-    self.b2 = DFF()
-    self.b3 = DFF()
-    self.b4 = DFF()
-    self.b5 = DFF()
-    self.b6 = DFF()
-    self.b7 = DFF()
-    self.b8 = DFF()
-    self.b9 = DFF()
-    self.b10 = DFF()
-    self.b11 = DFF()
-    self.b12 = DFF()
-    self.b13 = DFF()
-    self.b14 = DFF()
-    self.b15 = DFF()
+    self.word = 0
  
-  def update(self, in_: list[int], load: int):
+  def update(self, in_: list[int], load: int) -> tuple:
     # Only update if load is enabled
-    return self.b0.update(in_[0], load),\
-      self.b1.update(in_[1], load),\
-      self.b2.update(in_[2], load),\
-      self.b3.update(in_[3], load),\
-      self.b4.update(in_[4], load),\
-      self.b5.update(in_[5], load),\
-      self.b6.update(in_[6], load),\
-      self.b7.update(in_[7], load),\
-      self.b8.update(in_[8], load),\
-      self.b9.update(in_[9], load),\
-      self.b10.update(in_[10], load),\
-      self.b11.update(in_[11], load),\
-      self.b12.update(in_[12], load),\
-      self.b13.update(in_[13], load),\
-      self.b14.update(in_[14], load),\
-      self.b15.update(in_[15], load)
+    if load:
+      self.word = from_bits(in_)
+    return BITS16[self.word]
+
+  def read(self) -> list[int]:
+    return list(BITS16[self.word])
+
+  def value(self) -> int:
+    '''
+    The stored word, without building a bit list
+    '''
+    return self.word
+
+# b0..b15 read single bits, b0 being the MSB like the DFFs they replace
+for _bit in range(16):
+  setattr(Register, f'b{_bit}', property(lambda self, shift=15 - _bit: (self.word >> shift) & 1))
+del _bit
+
+def select_index(bits: list[int]) -> int:
+  '''
+  Decodes select bits (MSB first) into the index of the chosen bank.
+  '''
+  index = 0
+  for bit in bits:
+    index = (index << 1) | bit
+  return index
 
 class RAM8:
+  bank_names = ('register0', 'register1', 'register2', 'register3', 'register4', 'register5', 'register6', 'register7')
+
   def __init__(self):
     self.register0 = Register()
     self.register1 = Register()
@@ -327,7 +588,18 @@ class RAM8:
     
     return mux16(temp5, temp6, addr_bits[0])
 
+  # Selected-path ports: the address decode picks the one register instead
+  # of updating all eight and muxing their outputs.
+  def update_path(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    register = getattr(self, self.bank_names[select_index(address[-3:])])
+    return list(register.update(in_, load))
+
+  def read(self, address: list[int]) -> list[int]:
+    return getattr(self, self.bank_names[select_index(address[-3:])]).read()
+
 class RAM64:
+  bank_names = ('ram8_0', 'ram8_1', 'ram8_2', 'ram8_3', 'ram8_4', 'ram8_5', 'ram8_6', 'ram8_7')
+
   def __init__(self):
     self.ram8_0 = RAM8()
     self.ram8_1 = RAM8()
@@ -374,16 +646,45 @@ class RAM64:
     
     return mux16(temp5, temp6, ram8_select_bits[0])
 
+  def update_path(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    return getattr(self, self.bank_names[select_index(address[-6:-3])]).update_path(in_, address, load)
+
+  def read(self, address: list[int]) -> list[int]:
+    return getattr(self, self.bank_names[select_index(address[-6:-3])]).read(address)
+
+def lazy_update(owner, name: str, factory, in_: list[int], address: list[int], load: int, port: str = 'update') -> list[int]:
+  '''
+  Updates the sub-bank owner.<name> through its update (or update_path)
+  port, building it with factory() on its first write. A bank that has
+  never been written reads as zero.
+  '''
+  bank = getattr(owner, name)
+  if bank is None:
+    if not load:
+      return [0] * 16
+    bank = factory()
+    setattr(owner, name, bank)
+  return getattr(bank, port)(in_, address, load)
+
+def lazy_read(owner, name: str, address: list[int]) -> list[int]:
+  bank = getattr(owner, name)
+  if bank is None:
+    return [0] * 16
+  return bank.read(address)
+
 class RAM512:
+  bank_names = ('ram64_0', 'ram64_1', 'ram64_2', 'ram64_3', 'ram64_4', 'ram64_5', 'ram64_6', 'ram64_7')
+
   def __init__(self):
-    self.ram64_0 = RAM64()
-    self.ram64_1 = RAM64()
-    self.ram64_2 = RAM64()
-    self.ram64_3 = RAM64()
-    self.ram64_4 = RAM64()
-    self.ram64_5 = RAM64()
-    self.ram64_6 = RAM64()
-    self.ram64_7 = RAM64()
+    # Sub-banks are built on first write, see lazy_update
+    self.ram64_0 = None
+    self.ram64_1 = None
+    self.ram64_2 = None
+    self.ram64_3 = None
+    self.ram64_4 = None
+    self.ram64_5 = None
+    self.ram64_6 = None
+    self.ram64_7 = None
   
   def update(self, in_: list[int], address: list[int], load: int) -> list[int]:
     # Use bits [8:6] to select which RAM64 unit (0-7)
@@ -401,14 +702,14 @@ class RAM512:
     sel7 = and_(and_(ram64_select_bits[0], ram64_select_bits[1]), ram64_select_bits[2])                    # 111
     
     # Update each RAM64 with load signal only if selected
-    out0 = self.ram64_0.update(in_, address, and_(sel0, load))
-    out1 = self.ram64_1.update(in_, address, and_(sel1, load))
-    out2 = self.ram64_2.update(in_, address, and_(sel2, load))
-    out3 = self.ram64_3.update(in_, address, and_(sel3, load))
-    out4 = self.ram64_4.update(in_, address, and_(sel4, load))
-    out5 = self.ram64_5.update(in_, address, and_(sel5, load))
-    out6 = self.ram64_6.update(in_, address, and_(sel6, load))
-    out7 = self.ram64_7.update(in_, address, and_(sel7, load))
+    out0 = lazy_update(self, 'ram64_0', RAM64, in_, address, and_(sel0, load))
+    out1 = lazy_update(self, 'ram64_1', RAM64, in_, address, and_(sel1, load))
+    out2 = lazy_update(self, 'ram64_2', RAM64, in_, address, and_(sel2, load))
+    out3 = lazy_update(self, 'ram64_3', RAM64, in_, address, and_(sel3, load))
+    out4 = lazy_update(self, 'ram64_4', RAM64, in_, address, and_(sel4, load))
+    out5 = lazy_update(self, 'ram64_5', RAM64, in_, address, and_(sel5, load))
+    out6 = lazy_update(self, 'ram64_6', RAM64, in_, address, and_(sel6, load))
+    out7 = lazy_update(self, 'ram64_7', RAM64, in_, address, and_(sel7, load))
     
     # Mux the outputs based on RAM64 selection bits
     temp1 = mux16(out0, out1, ram64_select_bits[2])
@@ -421,16 +722,25 @@ class RAM512:
     
     return mux16(temp5, temp6, ram64_select_bits[0])
 
+  def update_path(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    return lazy_update(self, self.bank_names[select_index(address[-9:-6])], RAM64, in_, address, load, 'update_path')
+
+  def read(self, address: list[int]) -> list[int]:
+    return lazy_read(self, self.bank_names[select_index(address[-9:-6])], address)
+
 class RAM4K:
+  bank_names = ('ram512_0', 'ram512_1', 'ram512_2', 'ram512_3', 'ram512_4', 'ram512_5', 'ram512_6', 'ram512_7')
+
   def __init__(self):
-    self.ram512_0 = RAM512()
-    self.ram512_1 = RAM512()
-    self.ram512_2 = RAM512()
-    self.ram512_3 = RAM512()
-    self.ram512_4 = RAM512()
-    self.ram512_5 = RAM512()
-    self.ram512_6 = RAM512()
-    self.ram512_7 = RAM512()
+    # Sub-banks are built on first write, see lazy_update
+    self.ram512_0 = None
+    self.ram512_1 = None
+    self.ram512_2 = None
+    self.ram512_3 = None
+    self.ram512_4 = None
+    self.ram512_5 = None
+    self.ram512_6 = None
+    self.ram512_7 = None
   
   def update(self, in_: list[int], address: list[int], load: int) -> list[int]:
     # Use bits [11:9] to select which RAM512 unit (0-7)
@@ -448,14 +758,14 @@ class RAM4K:
     sel7 = and_(and_(ram512_select_bits[0], ram512_select_bits[1]), ram512_select_bits[2])                    # 111
     
     # Update each RAM512 with load signal only if selected
-    out0 = self.ram512_0.update(in_, address, and_(sel0, load))
-    out1 = self.ram512_1.update(in_, address, and_(sel1, load))
-    out2 = self.ram512_2.update(in_, address, and_(sel2, load))
-    out3 = self.ram512_3.update(in_, address, and_(sel3, load))
-    out4 = self.ram512_4.update(in_, address, and_(sel4, load))
-    out5 = self.ram512_5.update(in_, address, and_(sel5, load))
-    out6 = self.ram512_6.update(in_, address, and_(sel6, load))
-    out7 = self.ram512_7.update(in_, address, and_(sel7, load))
+    out0 = lazy_update(self, 'ram512_0', RAM512, in_, address, and_(sel0, load))
+    out1 = lazy_update(self, 'ram512_1', RAM512, in_, address, and_(sel1, load))
+    out2 = lazy_update(self, 'ram512_2', RAM512, in_, address, and_(sel2, load))
+    out3 = lazy_update(self, 'ram512_3', RAM512, in_, address, and_(sel3, load))
+    out4 = lazy_update(self, 'ram512_4', RAM512, in_, address, and_(sel4, load))
+    out5 = lazy_update(self, 'ram512_5', RAM512, in_, address, and_(sel5, load))
+    out6 = lazy_update(self, 'ram512_6', RAM512, in_, address, and_(sel6, load))
+    out7 = lazy_update(self, 'ram512_7', RAM512, in_, address, and_(sel7, load))
     
     # Mux the outputs based on RAM512 selection bits
     temp1 = mux16(out0, out1, ram512_select_bits[2])
@@ -468,12 +778,21 @@ class RAM4K:
     
     return mux16(temp5, temp6, ram512_select_bits[0])
 
+  def update_path(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    return lazy_update(self, self.bank_names[select_index(address[-12:-9])], RAM512, in_, address, load, 'update_path')
+
+  def read(self, address: list[int]) -> list[int]:
+    return lazy_read(self, self.bank_names[select_index(address[-12:-9])], address)
+
 class RAM16K:
+  bank_names = ('ram4k_0', 'ram4k_1', 'ram4k_2', 'ram4k_3')
+
   def __init__(self):
-    self.ram4k_0 = RAM4K()
-    self.ram4k_1 = RAM4K()
-    self.ram4k_2 = RAM4K()
-    self.ram4k_3 = RAM4K()
+    # Sub-banks are built on first write, see lazy_update
+    self.ram4k_0 = None
+    self.ram4k_1 = None
+    self.ram4k_2 = None
+    self.ram4k_3 = None
   
   def update(self, in_: list[int], address: list[int], load: int) -> list[int]:
     # Use bits [13:12] to select which RAM4K unit (0-3)
@@ -487,10 +806,10 @@ class RAM16K:
     sel3 = and_(ram4k_select_bits[0], ram4k_select_bits[1])              # 11
     
     # Update each RAM4K with load signal only if selected
-    out0 = self.ram4k_0.update(in_, address, and_(sel0, load))
-    out1 = self.ram4k_1.update(in_, address, and_(sel1, load))
-    out2 = self.ram4k_2.update(in_, address, and_(sel2, load))
-    out3 = self.ram4k_3.update(in_, address, and_(sel3, load))
+    out0 = lazy_update(self, 'ram4k_0', RAM4K, in_, address, and_(sel0, load))
+    out1 = lazy_update(self, 'ram4k_1', RAM4K, in_, address, and_(sel1, load))
+    out2 = lazy_update(self, 'ram4k_2', RAM4K, in_, address, and_(sel2, load))
+    out3 = lazy_update(self, 'ram4k_3', RAM4K, in_, address, and_(sel3, load))
     
     # Mux the outputs based on RAM4K selection bits
     temp1 = mux16(out0, out1, ram4k_select_bits[1])
@@ -498,6 +817,122 @@ class RAM16K:
     
     return mux16(temp1, temp2, ram4k_select_bits[0])
 
+  def update_path(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    return lazy_update(self, self.bank_names[select_index(address[-14:-12])], RAM4K, in_, address, load, 'update_path')
+
+  def read(self, address: list[int]) -> list[int]:
+    return lazy_read(self, self.bank_names[select_index(address[-14:-12])], address)
+
+class RAM32K:
+  '''
+  The data memory address space: two RAM16K halves selected by address
+  bit 14. The upper half holds the screen map and the keyboard register.
+  '''
+  bank_names = ('ram16k_0', 'ram16k_1')
+
+  def __init__(self):
+    # Sub-banks are built on first write, see lazy_update
+    self.ram16k_0 = None
+    self.ram16k_1 = None
+
+  def update(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    # Bit 14 selects the RAM16K half, bits [13:0] the word within it
+    sel = address[-15]
+    out0 = lazy_update(self, 'ram16k_0', RAM16K, in_, address, and_(not_(sel), load))
+    out1 = lazy_update(self, 'ram16k_1', RAM16K, in_, address, and_(sel, load))
+    return mux16(out0, out1, sel)
+
+  def update_path(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    return lazy_update(self, self.bank_names[address[-15]], RAM16K, in_, address, load, 'update_path')
+
+  def read(self, address: list[int]) -> list[int]:
+    return lazy_read(self, self.bank_names[address[-15]], address)
+
+class FlatRAM:
+  '''
+  Array-backed drop-in for RAM8..RAM16K: the contents live in a single
+  array('H') instead of a tree of Register/DFF objects. update() keeps the
+  RAMn contract and decodes the same low address bits: size is a power of
+  two and the address is masked with size - 1.
+  '''
+  size = 0
+
+  def __init__(self):
+    self.words = array('H', bytes(2 * self.size))
+
+  def update(self, in_: list[int], address: list[int], load: int) -> list[int]:
+    addr = from_bits(address) & (self.size - 1)
+    if load:
+      self.words[addr] = from_bits(in_)
+    return list(BITS16[self.words[addr]])
+
+  # Every access is already selected-path, so both ports share update
+  update_path = update
+
+  def read(self, address: list[int]) -> list[int]:
+    return self.update(None, address, 0)
+
+  def read_word(self, addr: int) -> int:
+    return self.words[addr]
+
+  def write_word(self, addr: int, value: int) -> None:
+    self.words[addr] = value
+
+class FlatRAM8(FlatRAM):
+  size = 8
+
+class FlatRAM64(FlatRAM):
+  size = 64
+
+class FlatRAM512(FlatRAM):
+  size = 512
+
+class FlatRAM4K(FlatRAM):
+  size = 4096
+
+class FlatRAM16K(FlatRAM):
+  size = 16384
+
+class FlatRAM32K(FlatRAM):
+  size = 32768
+
+def make_ram16k(backend: str):
+  '''
+  backend: 'gates' for the Register/DFF tree, 'flat' for FlatRAM16K
+  '''
+  if backend == 'gates':
+    return RAM16K()
+  elif backend == 'flat':
+    return FlatRAM16K()
+  raise ValueError(f"Unknown memory backend {backend!r}")
+
+def make_ram32k(backend: str):
+  '''
+  backend: 'gates' for RAM32K, 'flat' for FlatRAM32K
+  '''
+  if backend == 'gates':
+    return RAM32K()
+  elif backend == 'flat':
+    return FlatRAM32K()
+  raise ValueError(f"Unknown memory backend {backend!r}")
+
+def jump_logic(i: int, j: list[int], zr: int, ng: int) -> int:
+  '''
+  The CPU's jump decision from the instruction type bit, the three jump
+  bits and the ALU's zr and ng flags
+  '''
+  # j1=1: jump if ng (negative)
+  # j2=1: jump if zr (zero)
+  # j3=1: jump if positive (not negative and not zero)
+  pos = and_(not_(ng), not_(zr))  # positive = not negative and not zero
+
+  jump_neg = and_(j[0], ng)       # j1 AND negative
+  jump_zero = and_(j[1], zr)      # j2 AND zero
+  jump_pos = and_(j[2], pos)      # j3 AND positive
+
+  # Jump if any jump condition is met AND it's a C-instruction
+  return and_(i, or_(jump_neg, or_(jump_zero, jump_pos)))
+
 class PC:
   def __init__(self):
     self.count = 0
@@ -521,9 +956,11 @@ class CPU:
   
   def update(self, inM: list[int], instruction: list[int], reset: int):
     '''
-    inM: 16 bit input from memory
+    inM: 16 bit input from memory, RAM[A] for the current A
     instruction: 16 bit input instruction
     reset: Set pc to 0 if set
+    Returns outM, writeM, addressM (A after this instruction) and the old pc.
+    A write to M goes to the A the instruction started with.
     '''
     # Parse instruction bits
     i = instruction[0]  # instruction type (0=A-instruction, 1=C-instruction)
@@ -532,6 +969,18 @@ class CPU:
     d = instruction[10:13]  # destination bits
     j = instruction[13:16]  # jump bits
     
+    # Current register values: the ALU, the memory write and the jump all
+    # see A and D as they were before this instruction
+    a_word = self.regA.value()
+    currentA = BITS16[a_word]
+    currentD = BITS16[self.regD.value()]
+    
+    # Select ALU input (A register vs Memory)
+    mux1Out = mux16(currentA, inM, a)
+    
+    # ALU operation (use current D register value)
+    self.ALUOutput, zr, ng = ALU(currentD, mux1Out, *c)
+    
     # Mux to select A register input (instruction vs ALU output)
     mux0Out = mux16(instruction, self.ALUOutput, i)
     
@@ -540,18 +989,6 @@ class CPU:
     regAOut = self.regA.update(mux0Out, loadA)
     addressM = regAOut
     
-    # Get current D register value (don't update yet)
-    currentD = [self.regD.b0.out, self.regD.b1.out, self.regD.b2.out, self.regD.b3.out,
-                self.regD.b4.out, self.regD.b5.out, self.regD.b6.out, self.regD.b7.out,
-                self.regD.b8.out, self.regD.b9.out, self.regD.b10.out, self.regD.b11.out,
-                self.regD.b12.out, self.regD.b13.out, self.regD.b14.out, self.regD.b15.out]
-    
-    # Select ALU input (A register vs Memory)
-    mux1Out = mux16(regAOut, inM, a)
-    
-    # ALU operation (use current D register value)
-    self.ALUOutput, zr, ng = ALU(currentD, mux1Out, *c)
-    
     # Now update D register with ALU output (only for C-instructions with d2=1)
     loadD = and_(i, d[1])  # Load D only if C-instruction AND d2=1
     regDOut = self.regD.update(self.ALUOutput, loadD)
@@ -559,28 +996,27 @@ class CPU:
     outM = self.ALUOutput
     writeM = and_(i, d[2])  # Write to memory only if C-instruction AND d3=1
     
-    # Jump logic
-    # j1=1: jump if ng (negative)
-    # j2=1: jump if zr (zero) 
-    # j3=1: jump if positive (not negative and not zero)
-    pos = and_(not_(ng), not_(zr))  # positive = not negative and not zero
-    
-    jump_neg = and_(j[0], ng)       # j1 AND negative
-    jump_zero = and_(j[1], zr)      # j2 AND zero  
-    jump_pos = and_(j[2], pos)      # j3 AND positive
-    
-    # Jump if any jump condition is met AND it's a C-instruction
-    jump = and_(i, or_(jump_neg, or_(jump_zero, jump_pos)))
+    jump = jump_logic(i, j, zr, ng)
     
     # PC control: increment normally, jump if condition met, reset if reset=1
     inc = 1  # Always increment unless jumping or resetting
-    pc = self.pc.update(regAOut, inc, jump, reset)
+    pc = self.pc.update(a_word, inc, jump, reset)
     
     return outM, writeM, addressM, pc
 
+# Hack memory map
+SCREEN = 0x4000
+SCREEN_WORDS = 8192
+KBD = 0x6000
+
 class MemoryChip:
-    def __init__(self):
-      self.chip = RAM16K()
+    '''
+    Data memory: RAM at 0x0000-0x3FFF, the screen map at SCREEN
+    (0x4000-0x5FFF, 32 words per row of 512 pixels) and the keyboard
+    register at KBD (0x6000), in one 15-bit address space
+    '''
+    def __init__(self, backend: str = 'gates'):
+      self.chip = make_ram32k(backend)
 
     def update(self, in_: list[int], address: list[int], load: int) -> list[int]:
         '''
@@ -590,56 +1026,291 @@ class MemoryChip:
         '''
         return self.chip.update(in_, address, load)
 
+    def read(self, address: list[int]) -> list[int]:
+        '''
+        Read-only port: address decode selects a single word, nothing is written
+        '''
+        return self.chip.read(address)
+
+    def contents(self) -> array:
+        '''
+        A copy of every word, in address order
+        '''
+        return chip_contents(self.chip)
+
+    def load(self, words: array) -> None:
+        '''
+        Replaces the whole memory with words, zero filling the rest
+        '''
+        if isinstance(self.chip, FlatRAM):
+            fill_words(self.chip.words, words)
+        else:
+            self.chip = RAM32K()
+            write_nonzero(self.chip, words)
+
+def chip_contents(chip) -> array:
+  if isinstance(chip, FlatRAM):
+    return array('H', chip.words)
+  # Unbuilt banks read as zero without building anything
+  size = 32768 if isinstance(chip, RAM32K) else 16384
+  return array('H', (stream16_to_word(chip.read(word_to_stream16(addr))) for addr in range(size)))
+
+def fill_words(target: array, words: array) -> None:
+  '''
+  Overwrites target in place (it may be shared with an emulator), zero
+  filling the rest; words may not be longer than target
+  '''
+  if len(words) > len(target):
+    raise ValueError(f"{len(words)} words do not fit in {len(target)}")
+  target[:len(words)] = words
+  target[len(words):] = array('H', bytes(2 * (len(target) - len(words))))
+
+def write_nonzero(chip, words: array) -> None:
+  # A fresh gate-level RAM builds no banks, so only nonzero words cost anything
+  for addr, word in enumerate(words):
+    if word:
+      chip.update_path(word_to_stream16(word), word_to_stream16(addr), 1)
+
+# The codec tables hold shared tuples; these return a list the caller owns
 def int_to_stream3(a: int) -> list[int]:
-  stream = [0 for _ in range(3)]
-  for i in range(3):
-    stream[2 - i] = 1 if a & 2**i > 0 else 0
-  return stream
+  return list(BITS3[a & 7])
 
 
 class ROM16K:
-  def __init__(self):
-    self.chip = RAM16K()
+  def __init__(self, backend: str = 'gates'):
+    self.chip = make_ram16k(backend)
   
   def update(self, address: list[int]) -> list[int]:
     '''
     address: 15 bit input address
     returns a 16 bit memory word
     '''
-    return self.chip.update([0 for _ in range(16)], address, 0)
+    return self.chip.read(address)
   
   def write(self, in_: list[int], address: list[int]) -> None:
-    self.chip.update(in_, address, 1)
+    self.chip.update_path(in_, address, 1)
+
+  def load(self, words: array) -> None:
+    '''
+    Replaces the whole ROM with words, zero filling the rest
+    '''
+    if isinstance(self.chip, FlatRAM):
+      fill_words(self.chip.words, words)
+    else:
+      self.chip = RAM16K()
+      write_nonzero(self.chip, words)
+
+  def contents(self) -> array:
+    '''
+    A copy of every ROM word
+    '''
+    return chip_contents(self.chip)
 class Computer:
-  def __init__(self):
-    self.rom = ROM16K()
-    self.mem = MemoryChip()
+  def __init__(self, backend: str = 'gates', engine: str = 'gates'):
+    '''
+    backend: storage for ROM and RAM, 'gates' or 'flat' (see make_ram16k)
+    engine: 'gates' clocks the gate-level CPU, 'fast' runs the
+    instruction-level emulator over the flat ROM/RAM words and 'blocks'
+    runs compiled basic blocks over them
+    '''
+    if engine not in ('gates', 'fast', 'blocks'):
+      raise ValueError(f"Unknown engine {engine!r}")
+    if engine != 'gates' and backend != 'flat':
+      raise ValueError(f"The {engine} engine needs the 'flat' backend")
+    self.rom = ROM16K(backend)
+    self.mem = MemoryChip(backend)
     self.cpu = CPU()
+    self.engine = engine
+    self.cycles = 0
+    # Optional keyboard.KeyboardFeed applied by run()
+    self.keyboard = None
+    if engine == 'fast':
+      # emulator imports gates, so it can only be imported once gates is loaded
+      from emulator import Emulator
+      self.emulator = Emulator(self.rom.chip.words, self.mem.chip.words)
+    elif engine == 'blocks':
+      from blocks import BlockEmulator
+      self.emulator = BlockEmulator(self.rom.chip.words, self.mem.chip.words)
 
-  def run(self):
-    outM, writeM, addressM, pc = self.cpu.update(int_to_stream16(0), int_to_stream16(0), 1)
-    inM = int_to_stream16(0)
+  def reset(self) -> None:
+    if self.engine != 'gates':
+      self.emulator.reset()
+    else:
+      # Only the PC; A, D and memory keep their values on every engine
+      self.cpu.pc.count = 0
+
+  def state(self):
+    '''
+    Returns (cycles, pc, a, d) as a RunResult
+    '''
+    from emulator import RunResult
+    if self.engine != 'gates':
+      return self.emulator.state()
+    return RunResult(self.cycles, self.cpu.pc.count, self.cpu.regA.value(), self.cpu.regD.value())
+
+  def set_state(self, cycles: int, pc: int, a: int, d: int) -> None:
+    '''
+    Sets the cycle count and registers, e.g. to resume from a snapshot
+    '''
+    if self.engine != 'gates':
+      emulator = self.emulator
+      emulator.cycles, emulator.pc, emulator.a, emulator.d = cycles, pc, a, d
+      return
+    self.cycles = cycles
+    self.cpu.pc.count = pc
+    self.cpu.regA.update(int_to_stream16(a), 1)
+    self.cpu.regD.update(int_to_stream16(d), 1)
+
+  def step(self) -> None:
+    '''
+    One gate-level clock cycle: fetch, read M at the current A, execute,
+    then write M back to that same address
+    '''
+    address = BITS16[self.cpu.regA.value()]
+    # The ROM only reads the address, so the shared tuple needs no copy
+    instruction = self.rom.update(BITS16[self.cpu.pc.count & MASK16])
+    inM = self.mem.read(address)
+    outM, writeM, addressM, pc = self.cpu.update(inM, instruction, 0)
+    if writeM:
+      self.mem.update(outM, address, 1)
+    self.cycles += 1
+
+  def run(self, max_cycles: int = None, until_pc: int = None, profiler=None):
+    '''
+    Runs until max_cycles have executed or the PC reaches until_pc; with
+    neither set it runs forever. Returns a RunResult with the cycles run
+    by this call and the final pc, a and d.
+    profiler: optional profiler.Profiler to count every instruction
+    (not available on the gate-level engine)
+    With a keyboard feed attached, the run is split at the cycles of
+    pending events and each keycode is written to KBD in between.
+    '''
+    feed = self.keyboard
+    if feed is None:
+      return self._run(max_cycles, until_pc, profiler)
+    total = 0
     while True:
-      instruction = self.rom.update(pc)
-      outM, writeM, addressM, pc = self.cpu.update(inM, instruction, 0)
-      inM = self.mem.update(outM, addressM, writeM)
+      now = self.state().cycles
+      code = feed.due(now)
+      if code is not None:
+        self.mem.update(int_to_stream16(code), int_to_stream16(KBD), 1)
+      budget = None if max_cycles is None else max_cycles - total
+      next_cycle = feed.next_cycle()
+      if next_cycle is not None and (budget is None or next_cycle - now < budget):
+        segment = next_cycle - now
+      else:
+        segment = budget
+      result = self._run(segment, until_pc, profiler)
+      total += result.cycles
+      if segment == budget or result.pc == until_pc:
+        return result._replace(cycles=total)
+
+  def _run(self, max_cycles: int = None, until_pc: int = None, profiler=None):
+    if profiler is not None:
+      if self.engine == 'gates':
+        raise ValueError("Profiling needs the 'fast' or 'blocks' engine")
+      return profiler.run(self.emulator, max_cycles, until_pc)
+    if self.engine != 'gates':
+      return self.emulator.run(max_cycles, until_pc)
+    start = self.cycles
+    while self.cycles - start != max_cycles and self.cpu.pc.count != until_pc:
+      self.step()
+    return self.state()._replace(cycles=self.cycles - start)
   
-  def load_instructions(self, filename: str):
-    addr = 0
-    with open(filename, 'r') as f:
-      for line in f.read().split('\n'):
-        self.rom.write(list(map(lambda x: int(x), list(line))), int_to_stream16(addr))
-        addr += 1
+  def load_instructions(self, filename: str) -> 'LoadReport':
+    '''
+    Loads a program file into ROM. .hack files, and any file holding only
+    0, 1 and whitespace, are read as text; other files must have a binary
+    suffix (BINARY_SUFFIXES) and are read as a packed image (see
+    image_to_words).
+    '''
+    start = time.perf_counter()
+    with open(filename, 'rb') as f:
+      data = f.read()
+    if filename.endswith('.hack') or not data.translate(None, HACK_TEXT_BYTES):
+      words = parse_hack(data.decode('ascii', errors='replace'))
+    elif filename.endswith(BINARY_SUFFIXES):
+      words = image_to_words(data)
+    else:
+      raise ValueError(f"{filename}: not .hack text, and binary images need a "
+                       f"{' or '.join(BINARY_SUFFIXES)} suffix")
+    return self._load_words(words, start)
+
+  def load_hack(self, text: str) -> 'LoadReport':
+    '''
+    Loads .hack text (one 16-character binary word per line) into ROM
+    '''
+    start = time.perf_counter()
+    return self._load_words(parse_hack(text), start)
+
+  def load_image(self, image) -> 'LoadReport':
+    '''
+    Loads an in-memory image into ROM: bytes-like objects are packed
+    binary images, array('H') or any other sequence holds the words
+    '''
+    start = time.perf_counter()
+    return self._load_words(image_to_words(image), start)
+
+  def _load_words(self, words: array, start: float) -> 'LoadReport':
+    self.rom.load(words)
+    if self.engine != 'gates':
+      self.emulator.decode_rom()
+    return LoadReport(len(words), time.perf_counter() - start)
+
+class LoadReport(NamedTuple):
+  words: int
+  seconds: float
+
+ROM_WORDS = 16384
+# Program files: the bytes of .hack text, and the suffixes of packed images
+HACK_TEXT_BYTES = b'01 \t\r\n'
+BINARY_SUFFIXES = ('.bin',)
+
+def parse_hack(text: str) -> array:
+  '''
+  Parses .hack text into words, checking every line is 16 binary digits
+  and the program fits in ROM. Blank lines are skipped.
+  '''
+  words = array('H')
+  for line_no, line in enumerate(text.split('\n'), 1):
+    line = line.strip()
+    if not line:
+      continue
+    if len(line) != 16 or line.strip('01'):
+      raise ValueError(f"Line {line_no}: expected 16 binary digits, got {line!r}")
+    words.append(int(line, 2))
+  if len(words) > ROM_WORDS:
+    raise ValueError(f"Program has {len(words)} words, ROM holds {ROM_WORDS}")
+  return words
+
+def image_to_words(image) -> array:
+  '''
+  Converts a program image to words. bytes, bytearray and memoryview are
+  packed images of little-endian 16-bit words; array('H') and other
+  sequences of ints are taken word for word.
+  '''
+  if isinstance(image, (bytes, bytearray, memoryview)):
+    data = bytes(image)
+    if len(data) % 2:
+      raise ValueError(f"Binary image has an odd length of {len(data)} bytes")
+    words = array('H')
+    words.frombytes(data)
+    if sys.byteorder == 'big':
+      words.byteswap()
+  elif isinstance(image, array) and image.typecode == 'H':
+    words = array('H', image)
+  else:
+    try:
+      words = array('H', image)
+    except OverflowError:
+      raise ValueError("Program words must fit in 16 bits")
+  if len(words) > ROM_WORDS:
+    raise ValueError(f"Program has {len(words)} words, ROM holds {ROM_WORDS}")
+  return words
 
 def int_to_stream8(a: int) -> list[int]:
-  stream = [0 for _ in range(8)]
-  for i in range(8):
-    stream[7 - i] = 1 if a & 2**i > 0 else 0
-  return stream
+  return list(BITS8[a & 0xFF])
 
 def int_to_stream16(a: int) -> list[int]:
-  stream = [0 for _ in range(16)]
-  for i in range(16):
-    stream[15 - i] = 1 if a & 2**i > 0 else 0
-  return stream
+  return list(BITS16[a & MASK16])
 
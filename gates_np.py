@@ -0,0 +1,124 @@
+'''
+Batched evaluation of the combinational chips over NumPy arrays.
+
+A batch of N 16-bit words is unpacked into 16 bit planes (MSB first, the
+same order as the bit lists in gates.py); each plane is a uint8 array of
+N zeros and ones. Every chip below is composed from nand() exactly like
+its counterpart in gates.py, but each gate evaluates all N vectors at
+once.
+'''
+import numpy as np
+
+ONE = np.uint8(1)
+
+def nand(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  return ONE ^ (a & b)
+
+def not_(a: np.ndarray) -> np.ndarray:
+  return nand(a, a)
+
+def and_(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  return not_(nand(a, b))
+
+def or_(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  return nand(not_(a), not_(b))
+
+def xor(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  return and_(nand(a, b), or_(a, b))
+
+def mux(a: np.ndarray, b: np.ndarray, sel: np.ndarray) -> np.ndarray:
+  return or_(and_(a, not_(sel)), and_(b, sel))
+
+def half_adder(a: np.ndarray, b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+  return xor(a, b), and_(a, b)
+
+def full_adder(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+  r1 = half_adder(a, b)
+  r2 = half_adder(r1[0], c)
+  return r2[0], or_(r1[1], r2[1])
+
+def and16(a: list[np.ndarray], b: list[np.ndarray]) -> list[np.ndarray]:
+  return [and_(a[i], b[i]) for i in range(16)]
+
+def or16(a: list[np.ndarray], b: list[np.ndarray]) -> list[np.ndarray]:
+  return [or_(a[i], b[i]) for i in range(16)]
+
+def not16(a: list[np.ndarray]) -> list[np.ndarray]:
+  return [not_(a[i]) for i in range(16)]
+
+def mux16(a: list[np.ndarray], b: list[np.ndarray], sel: np.ndarray) -> list[np.ndarray]:
+  nsel = not_(sel)
+  return or16([and_(nsel, a[i]) for i in range(16)], [and_(sel, b[i]) for i in range(16)])
+
+def add16(a: list[np.ndarray], b: list[np.ndarray]) -> list[np.ndarray]:
+  out = [None] * 16
+  carry = np.zeros_like(a[15])
+  for i in range(15, -1, -1):
+    out[i], carry = full_adder(a[i], b[i], carry)
+  return out
+
+def iszero16(a: list[np.ndarray]) -> np.ndarray:
+  acc = or_(a[15], a[14])
+  for i in range(13, -1, -1):
+    acc = or_(acc, a[i])
+  return not_(acc)
+
+def ALU(x: list[np.ndarray], y: list[np.ndarray], zx, nx, zy, ny, f, no) -> tuple[list[np.ndarray], np.ndarray, np.ndarray]:
+  '''
+  Gate-level ALU over bit planes. Every control input is itself a plane,
+  so each of the N vectors can use a different control word: both sides
+  of each if in gates.ALU are computed and the control bit selects.
+  '''
+  zero = [np.zeros_like(x[0])] * 16
+  ox = mux16(x, zero, zx)
+  ox = mux16(ox, not16(ox), nx)
+  oy = mux16(y, zero, zy)
+  oy = mux16(oy, not16(oy), ny)
+  out = mux16(and16(ox, oy), add16(ox, oy), f)
+  out = mux16(out, not16(out), no)
+  return out, iszero16(out), out[0]
+
+def unpack16(words) -> list[np.ndarray]:
+  words = np.asarray(words, dtype=np.uint16)
+  return [((words >> (15 - i)) & 1).astype(np.uint8) for i in range(16)]
+
+def pack16(planes: list[np.ndarray]) -> np.ndarray:
+  words = np.zeros(planes[0].shape, dtype=np.uint16)
+  for i in range(16):
+    words |= planes[i].astype(np.uint16) << np.uint16(15 - i)
+  return words
+
+def _control_planes(controls, n: int) -> list[np.ndarray]:
+  controls = np.asarray(controls, dtype=np.uint8)
+  if controls.ndim == 1:
+    controls = np.broadcast_to(controls, (n, controls.shape[0]))
+  if controls.shape != (n, 6):
+    raise ValueError(f"Expected {n} control tuples of 6 bits, got shape {controls.shape}")
+  return [np.ascontiguousarray(controls[:, i]) for i in range(6)]
+
+def add16_batch(a, b) -> np.ndarray:
+  '''
+  a, b: arrays of N 16-bit words
+  returns the N 16-bit sums
+  '''
+  return pack16(add16(unpack16(a), unpack16(b)))
+
+def mux16_batch(a, b, sel) -> np.ndarray:
+  '''
+  a, b: arrays of N 16-bit words
+  sel: N select bits (or a single bit for the whole batch)
+  '''
+  a = np.asarray(a, dtype=np.uint16)
+  sel = np.broadcast_to(np.asarray(sel, dtype=np.uint8), a.shape)
+  return pack16(mux16(unpack16(a), unpack16(b), sel))
+
+def ALU_batch(x, y, controls) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+  '''
+  x, y: arrays of N 16-bit words
+  controls: N (zx, nx, zy, ny, f, no) tuples, shape (N, 6), or a single
+  tuple applied to the whole batch
+  returns (out, zr, ng) as arrays of N words / N bits
+  '''
+  x = np.asarray(x, dtype=np.uint16)
+  out, zr, ng = ALU(unpack16(x), unpack16(y), *_control_planes(controls, x.shape[0]))
+  return pack16(out), zr, ng
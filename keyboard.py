@@ -0,0 +1,92 @@
+'''
+Scripted keyboard input for headless runs.
+
+A KeyboardFeed holds (cycle, keycode) events sorted by cycle. Attached to a
+Computer (computer.keyboard = KeyboardFeed(...)), Computer.run writes each
+keycode to the KBD register once the machine has executed `cycle`
+instructions, so the instruction at that cycle is the first to see it.
+Runs are split at event cycles instead of checking the feed every cycle,
+so execution between events goes through the normal engine loop.
+
+A key stays pressed until the next event; release it with keycode 0.
+
+Event files have one "cycle keycode" pair per line, # starts a comment.
+The keycode is a number, a single character, or one of the Hack key
+names in KEYCODES (newline, backspace, left, ..., f12).
+'''
+from typing import Optional
+
+KEYCODES = {
+  'newline': 128, 'backspace': 129, 'left': 130, 'up': 131, 'right': 132,
+  'down': 133, 'home': 134, 'end': 135, 'pageup': 136, 'pagedown': 137,
+  'insert': 138, 'delete': 139, 'esc': 140, 'space': 32,
+}
+KEYCODES.update({f'f{n}': 140 + n for n in range(1, 13)})
+
+def parse_keycode(token: str) -> int:
+  if token.lower() in KEYCODES:
+    return KEYCODES[token.lower()]
+  if token.isdigit():
+    return int(token)
+  if len(token) == 1:
+    return ord(token)
+  raise ValueError(f"Unknown key {token!r}")
+
+def parse_events(text: str) -> list[tuple[int, int]]:
+  '''
+  Parses event file text into (cycle, keycode) pairs
+  '''
+  events = []
+  for line_no, line in enumerate(text.splitlines(), 1):
+    line = line.split('#')[0].strip()
+    if not line:
+      continue
+    fields = line.split()
+    if len(fields) != 2 or not fields[0].isdigit():
+      raise ValueError(f"Line {line_no}: expected 'cycle keycode', got {line!r}")
+    try:
+      events.append((int(fields[0]), parse_keycode(fields[1])))
+    except ValueError as e:
+      raise ValueError(f"Line {line_no}: {e}") from None
+  return events
+
+class KeyboardFeed:
+  def __init__(self, events):
+    '''
+    events: iterable of (cycle, keycode); events at the same cycle apply
+    in the order given, so the last one wins
+    '''
+    self.events = sorted(((int(cycle), int(code)) for cycle, code in events), key=lambda event: event[0])
+    for cycle, code in self.events:
+      if cycle < 0 or not 0 <= code <= 0xFFFF:
+        raise ValueError(f"Bad keyboard event ({cycle}, {code})")
+    self.position = 0
+
+  @classmethod
+  def from_file(cls, path: str) -> 'KeyboardFeed':
+    with open(path, 'r') as f:
+      return cls(parse_events(f.read()))
+
+  def next_cycle(self) -> Optional[int]:
+    '''
+    Cycle of the next pending event, None when the feed is exhausted
+    '''
+    if self.position < len(self.events):
+      return self.events[self.position][0]
+    return None
+
+  def due(self, cycle: int) -> Optional[int]:
+    '''
+    Consumes every event at or before cycle and returns the keycode the
+    KBD register should hold, or None if no event was due
+    '''
+    code = None
+    events, position = self.events, self.position
+    while position < len(events) and events[position][0] <= cycle:
+      code = events[position][1]
+      position += 1
+    self.position = position
+    return code
+
+  def rewind(self) -> None:
+    self.position = 0
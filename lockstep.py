@@ -0,0 +1,127 @@
+'''
+Sampled lockstep cross-check of a fast engine against the gate-level CPU.
+
+Lockstep wraps a Computer running the 'fast' or 'blocks' engine. The
+program runs at full speed, and at each sample point the reference, a
+gate-level Computer that shares the ROM, is loaded with the engine's
+registers and memory. Then both execute `window` cycles one instruction at
+a time. After every instruction A, D, PC and all of memory are compared
+(memory with one array compare), so a wrong register value, jump or
+memory write is caught at the instruction that caused it.
+
+Samples are `interval` cycles apart, or a random distance averaging
+`interval` with sampling='random'. interval == window checks every cycle;
+larger intervals trade coverage for speed, e.g. interval=10000 with
+window=10 keeps the cost of the gate-level CPU to 0.1% of the cycles.
+'''
+import random
+from typing import NamedTuple, Optional
+
+from gates import Computer, KBD
+
+class Divergence(NamedTuple):
+  cycle: int  # machine cycle of the instruction that diverged
+  pc: int     # its ROM address
+  registers: list[tuple[str, int, int]]  # (name, reference value, engine value)
+  memory: list[tuple[int, int, int]]     # (address, reference value, engine value)
+
+  def describe(self) -> str:
+    lines = [f'Divergence at cycle {self.cycle}, pc {self.pc}:']
+    lines += [f'  {name}: gates {expected}, engine {actual}' for name, expected, actual in self.registers]
+    lines += [f'  RAM[{address}]: gates {expected}, engine {actual}' for address, expected, actual in self.memory]
+    return '\n'.join(lines)
+
+class LockstepResult(NamedTuple):
+  cycles: int     # cycles executed by the engine
+  checked: int    # of those, cycles also run on the gate-level CPU
+  samples: int    # number of check windows
+  divergence: Optional[Divergence]
+
+class Lockstep:
+  def __init__(self, computer: Computer, interval: int = 1000, window: int = 1,
+               sampling: str = 'fixed', seed: Optional[int] = None, max_reported: int = 10):
+    '''
+    computer: a Computer on the 'fast' or 'blocks' engine with its program
+    loaded
+    '''
+    if computer.engine == 'gates':
+      raise ValueError("Lockstep checks the 'fast' or 'blocks' engine against the gate-level CPU")
+    if window < 1 or interval < window:
+      raise ValueError("Need 1 <= window <= interval")
+    if sampling not in ('fixed', 'random'):
+      raise ValueError(f"Unknown sampling {sampling!r}")
+    self.computer = computer
+    self.interval = interval
+    self.window = window
+    self.sampling = sampling
+    self.rng = random.Random(seed)
+    self.max_reported = max_reported
+    # The reference executes from the same ROM; its memory is reloaded
+    # from the engine at every sample
+    self.reference = Computer('flat', 'gates')
+    self.reference.rom.chip = computer.rom.chip
+
+  def gap(self) -> int:
+    '''
+    Cycles to run at full speed before the next check window
+    '''
+    stretch = self.interval - self.window
+    if self.sampling == 'random':
+      return self.rng.randint(0, 2 * stretch)
+    return stretch
+
+  def sync(self) -> None:
+    state = self.computer.state()
+    self.reference.set_state(state.cycles, state.pc, state.a, state.d)
+    self.reference.mem.chip.words[:] = self.computer.mem.chip.words
+
+  def compare(self, cycle: int, pc: int) -> Optional[Divergence]:
+    expected, actual = self.reference.state(), self.computer.state()
+    registers = [(name, getattr(expected, name), getattr(actual, name))
+                 for name in ('a', 'd', 'pc') if getattr(expected, name) != getattr(actual, name)]
+    reference_words, words = self.reference.mem.chip.words, self.computer.mem.chip.words
+    memory = []
+    if reference_words != words:
+      for address, (old, new) in enumerate(zip(reference_words, words)):
+        if old != new:
+          memory.append((address, old, new))
+          if len(memory) == self.max_reported:
+            break
+    if registers or memory:
+      return Divergence(cycle, pc, registers, memory)
+    return None
+
+  def run(self, max_cycles: Optional[int] = None, until_pc: Optional[int] = None) -> LockstepResult:
+    '''
+    Same stopping rules as Computer.run; also stops at the first divergence
+    '''
+    computer, reference = self.computer, self.reference
+    n = checked = samples = 0
+    while True:
+      stretch = self.gap()
+      if max_cycles is not None:
+        stretch = min(stretch, max_cycles - n)
+      result = computer.run(stretch, until_pc)
+      n += result.cycles
+      if n == max_cycles or result.pc == until_pc:
+        break
+      self.sync()
+      samples += 1
+      for _ in range(self.window):
+        state = computer.state()
+        if n == max_cycles or state.pc == until_pc:
+          break
+        feed = computer.keyboard
+        if feed is not None:
+          # Apply due key events to both machines before the instruction
+          code = feed.due(state.cycles)
+          if code is not None:
+            computer.mem.chip.words[KBD] = reference.mem.chip.words[KBD] = code
+        reference.step()
+        computer.run(max_cycles=1)
+        n += 1
+        checked += 1
+        divergence = self.compare(state.cycles, state.pc)
+        if divergence is not None:
+          return LockstepResult(n, checked, samples, divergence)
+    return LockstepResult(n, checked, samples, None)
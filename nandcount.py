@@ -0,0 +1,139 @@
+'''
+Opt-in NAND-evaluation counters for the gate-level chips.
+
+Everything in gates.py bottoms out in nand(). NandCounter.enable() swaps
+gates.nand and every chip in CHIP_FUNCTIONS and CHIP_METHODS for counting
+wrappers, and disable() puts the original functions back. Nothing is
+patched otherwise, so the cost is zero when counting is off.
+
+For each chip the counter records how many times it was called, the NAND
+evaluations inside it, including its sub-chips, and the ones it did
+itself (self). A recursive call to the same chip is only counted once.
+Computer.step is wrapped too, so report() also gives NANDs per CPU cycle.
+
+  with NandCounter() as counter:
+    computer.run(max_cycles=10)
+  print(counter.report())
+
+Only calls made through the gates module are seen. Modules that did
+`from gates import add16` before counting started keep the plain
+functions.
+'''
+import functools
+
+import gates
+
+# Module-level chips and (class, method) chips that are wrapped
+CHIP_FUNCTIONS = (
+  'not_', 'and_', 'or_', 'xor', 'mux', 'demux', 'and3_to_1', 'or3_to_1',
+  'and3', 'and8', 'and16', 'or16', 'not16', 'mux16', 'half_adder', 'full_adder',
+  'add16', 'inc16', 'iszero8', 'iszero16', 'ALU', 'jump_logic',
+)
+CHIP_METHODS = (
+  ('Register', 'update'),
+  ('RAM8', 'update'), ('RAM8', 'update_path'), ('RAM8', 'read'),
+  ('RAM64', 'update'), ('RAM64', 'update_path'), ('RAM64', 'read'),
+  ('RAM512', 'update'), ('RAM512', 'update_path'), ('RAM512', 'read'),
+  ('RAM4K', 'update'), ('RAM4K', 'update_path'), ('RAM4K', 'read'),
+  ('RAM16K', 'update'), ('RAM16K', 'update_path'), ('RAM16K', 'read'),
+  ('RAM32K', 'update'), ('RAM32K', 'update_path'), ('RAM32K', 'read'),
+  ('CPU', 'update'),
+  ('Computer', 'step'),
+)
+CYCLE = 'Computer.step'
+
+class NandCounter:
+  def __init__(self):
+    self.total = 0
+    self.calls = {}
+    self.inclusive = {}
+    self.self_counts = {}
+    self._originals = None
+
+  def reset(self) -> None:
+    # Cleared in place: the wrappers hold on to these dicts
+    self.total = 0
+    self.calls.clear()
+    self.inclusive.clear()
+    self.self_counts.clear()
+
+  def enable(self) -> None:
+    if self._originals is not None:
+      return
+    stack = ['(top level)']
+    active = {}
+    self_counts = self.self_counts
+    original_nand = gates.nand
+    counter = self
+
+    def nand(a, b):
+      counter.total += 1
+      owner = stack[-1]
+      self_counts[owner] = self_counts.get(owner, 0) + 1
+      return original_nand(a, b)
+
+    def wrap(name, function):
+      @functools.wraps(function)
+      def chip(*args, **kwargs):
+        counter.calls[name] = counter.calls.get(name, 0) + 1
+        outermost = not active.get(name)
+        active[name] = active.get(name, 0) + 1
+        stack.append(name)
+        start = counter.total
+        try:
+          return function(*args, **kwargs)
+        finally:
+          stack.pop()
+          active[name] -= 1
+          if outermost:
+            counter.inclusive[name] = counter.inclusive.get(name, 0) + counter.total - start
+      return chip
+
+    # (owner, attribute, original) for disable()
+    originals = [(gates, 'nand', original_nand)]
+    gates.nand = nand
+    for name in CHIP_FUNCTIONS:
+      function = getattr(gates, name)
+      originals.append((gates, name, function))
+      setattr(gates, name, wrap(name, function))
+    for class_name, method in CHIP_METHODS:
+      cls = getattr(gates, class_name)
+      function = cls.__dict__[method]
+      originals.append((cls, method, function))
+      setattr(cls, method, wrap(f'{class_name}.{method}', function))
+    self._originals = originals
+
+  def disable(self) -> None:
+    if self._originals is None:
+      return
+    for owner, name, function in reversed(self._originals):
+      setattr(owner, name, function)
+    self._originals = None
+
+  def __enter__(self) -> 'NandCounter':
+    self.enable()
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.disable()
+
+  def per_call(self, name: str) -> float:
+    calls = self.calls.get(name, 0)
+    return self.inclusive.get(name, 0) / calls if calls else 0.0
+
+  def per_cycle(self) -> float:
+    '''
+    NAND evaluations per gate-level Computer.step
+    '''
+    return self.per_call(CYCLE)
+
+  def report(self, top: int = 20) -> str:
+    chips = sorted(self.calls, key=lambda name: self.inclusive.get(name, 0), reverse=True)[:top]
+    out = [f'{self.total} NAND evaluations']
+    if self.calls.get(CYCLE):
+      out.append(f'{self.calls[CYCLE]} cycles, {self.per_cycle():,.0f} NANDs per cycle')
+    out += ['', f"{'chip':22} {'calls':>10} {'NANDs':>12} {'per call':>10} {'self':>12}"]
+    for name in chips:
+      out.append(f'{name:22} {self.calls[name]:10} {self.inclusive.get(name, 0):12} '
+                 f'{self.per_call(name):10.1f} {self.self_counts.get(name, 0):12}')
+    return '\n'.join(out)
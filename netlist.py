@@ -0,0 +1,344 @@
+'''
+Trace-and-optimize compiler for the NAND-level chips in gates.py.
+
+trace() runs a chip with symbolic inputs while gates.nand is swapped for
+a recording version, capturing the chip as a NAND DAG. The DAG is
+simplified as it is built:
+
+  - constant folding: nand(0, x) = 1, nand(1, x) = not x, constant inputs
+    fold away entirely
+  - common-subexpression elimination: each distinct nand(a, b) is built
+    once (a and b are ordered, nand commutes)
+  - double negation: not(not(x)) = x, and nand(x, not x) = 1
+
+compile_netlist() then drops gates no output depends on and emits a
+straight-line Python function, one line per NAND, returning the same
+structure (lists, tuples, bits) as the original chip:
+
+  add16 = compile_netlist(trace(gates.add16, bus('a'), bus('b')))
+
+Python-level control flow cannot be traced, so arguments a chip branches
+on (the ALU control bits) are passed as constants and the chip is traced
+once per value; compile_alu() does this for all 64 control words.
+
+Chips built from registers (RAM8 up to RAM32K) trace too: each DFF
+becomes a state wire q and its update the mux(q, in, load) a Bit would
+build, which is recorded in Netlist.registers. The larger RAMs build
+their banks on first write (gates.lazy_update); while tracing every bank
+is built, so a traced RAM512 holds all 512 registers. Such netlists have state and cannot be
+compiled, but timing.analyze() covers their register-to-register paths.
+'''
+import gates
+
+class Wire:
+  '''
+  A traced signal: input or NAND output number `index`
+  '''
+  __slots__ = ('index',)
+
+  def __init__(self, index: int):
+    self.index = index
+
+  def __bool__(self):
+    raise TypeError("Control flow depends on a traced input; pass that argument as a constant")
+
+  # DFF.update tests `load == 1`, which would silently be False
+  def __eq__(self, other):
+    raise TypeError("Comparing a traced input; pass that argument as a constant")
+
+  __hash__ = object.__hash__
+
+  def __repr__(self) -> str:
+    return f'Wire({self.index})'
+
+class Input:
+  '''
+  A symbolic chip argument: a bus of width bits, or a single bit when
+  width is None
+  '''
+  def __init__(self, name: str, width=None):
+    self.name = name
+    self.width = width
+
+def bus(name: str, width: int = 16) -> Input:
+  return Input(name, width)
+
+def bit(name: str) -> Input:
+  return Input(name)
+
+class Netlist:
+  def __init__(self, name: str):
+    self.name = name
+    self.inputs = []      # (Input, [wire indices])
+    self.nodes = []       # None for an input wire, (a, b) for a NAND
+    self.negation = {}    # wire -> the wire it negates, for NAND(x, x)
+    self.cse = {}         # (a, b) -> wire
+    self.calls = 0        # nand() calls while tracing
+    self.gates = 0        # calls left after folding, before CSE
+    self.output = None    # the chip's result with Wire/int leaves
+    self.states = []      # state wire of each DFF, in the order first updated
+    self.registers = {}   # state wire -> next value of its DFF
+    self._dffs = {}       # (id(DFF or Register), bit) -> [cell, state wire, stored value]
+
+  def new_input(self) -> Wire:
+    self.nodes.append(None)
+    return Wire(len(self.nodes) - 1)
+
+  def gate(self, a: int, b: int) -> Wire:
+    self.gates += 1
+    key = (a, b) if a <= b else (b, a)
+    index = self.cse.get(key)
+    if index is None:
+      self.nodes.append(key)
+      index = self.cse[key] = len(self.nodes) - 1
+      if a == b:
+        self.negation[index] = a
+    return Wire(index)
+
+  def negate(self, a: int):
+    if a in self.negation:
+      return Wire(self.negation[a])
+    return self.gate(a, a)
+
+  def nand(self, a, b):
+    self.calls += 1
+    a_wire, b_wire = isinstance(a, Wire), isinstance(b, Wire)
+    if not (a_wire and b_wire):
+      if not a_wire and not b_wire:
+        return 0 if (a and b) else 1
+      if not a_wire:
+        a, b = b, a
+      # a is a wire, b a constant
+      return self.negate(a.index) if b else 1
+    a, b = a.index, b.index
+    if a == b or self.negation.get(a) == b or self.negation.get(b) == a:
+      return self.negate(a) if a == b else 1
+    return self.gate(a, b)
+
+  def dff(self, cell, in_, load, bit: int = 0):
+    '''
+    Traced DFF.update: the stored bit starts as a state wire q, and each
+    update computes mux(stored, in_, load), as a Bit would, and stores it
+    as the DFF's next state. Register bits are DFFs (cell, bit).
+    '''
+    entry = self._dffs.get((id(cell), bit))
+    if entry is None:
+      state = self.new_input()
+      entry = self._dffs[(id(cell), bit)] = [cell, state.index, state]
+      self.states.append(state.index)
+    entry[2] = gates.mux(entry[2], in_, load)
+    self.registers[entry[1]] = entry[2]
+    return entry[2]
+
+  def register(self, cell, in_, load) -> tuple:
+    '''
+    Traced Register.update: sixteen DFFs sharing load
+    '''
+    return tuple(self.dff(cell, in_[i], load, i) for i in range(16))
+
+  def live(self) -> list[int]:
+    '''
+    Indices of the NAND nodes the outputs depend on, in evaluation order
+    '''
+    seen = set()
+    stack = [wire.index for wire in _leaves(self.output) if isinstance(wire, Wire)]
+    while stack:
+      index = stack.pop()
+      if index in seen:
+        continue
+      seen.add(index)
+      node = self.nodes[index]
+      if node is not None:
+        stack.extend(node)
+    return sorted(index for index in seen if self.nodes[index] is not None)
+
+  def depth(self) -> int:
+    '''
+    Longest input-to-output path, in NANDs
+    '''
+    levels = [0] * len(self.nodes)
+    for index in self.live():
+      a, b = self.nodes[index]
+      levels[index] = 1 + max(levels[a], levels[b])
+    return max((levels[wire.index] for wire in _leaves(self.output) if isinstance(wire, Wire)), default=0)
+
+  def stats(self) -> dict:
+    return {
+      'traced': self.calls,
+      'after folding': self.gates,
+      'after CSE': len(self.cse),
+      'live': len(self.live()),
+    }
+
+  def report(self) -> str:
+    stats = self.stats()
+    live = stats['live']
+    reduction = 100 * (1 - live / stats['traced']) if stats['traced'] else 0
+    return (f"{self.name}: {stats['traced']} NANDs traced, {stats['after folding']} after constant "
+            f"folding, {stats['after CSE']} after CSE and double negation, {live} live "
+            f"({reduction:.1f}% fewer)")
+
+def _leaves(value):
+  if isinstance(value, (list, tuple)):
+    for item in value:
+      yield from _leaves(item)
+  else:
+    yield value
+
+def _build_bank(owner, name: str, factory, in_, address, load, port: str = 'update'):
+  # gates.lazy_update without the unwritten-bank shortcut, which tests load
+  bank = getattr(owner, name)
+  if bank is None:
+    bank = factory()
+    setattr(owner, name, bank)
+  return getattr(bank, port)(in_, address, load)
+
+def trace(chip, *args, name=None) -> Netlist:
+  '''
+  Traces chip(*args); Input arguments become symbolic wires, anything else
+  is passed through as a constant
+  '''
+  netlist = Netlist(name or chip.__name__)
+  traced_args = []
+  for arg in args:
+    if isinstance(arg, Input):
+      if arg.width is None:
+        wires = [netlist.new_input()]
+        traced_args.append(wires[0])
+      else:
+        wires = [netlist.new_input() for _ in range(arg.width)]
+        traced_args.append(list(wires))
+      netlist.inputs.append((arg, [wire.index for wire in wires]))
+    else:
+      traced_args.append(arg)
+  original, original_dff, original_register = gates.nand, gates.DFF.update, gates.Register.update
+  original_lazy_update = gates.lazy_update
+  gates.nand = netlist.nand
+  gates.lazy_update = _build_bank
+  gates.DFF.update = lambda cell, in_, load: netlist.dff(cell, in_, load)
+  gates.Register.update = lambda cell, in_, load: netlist.register(cell, in_, load)
+  try:
+    netlist.output = chip(*traced_args)
+  finally:
+    gates.nand = original
+    gates.DFF.update = original_dff
+    gates.Register.update = original_register
+    gates.lazy_update = original_lazy_update
+  return netlist
+
+def source(netlist: Netlist, one: str = '1') -> str:
+  '''
+  Straight-line Python for the live gates of netlist. With one set to a
+  parameter name, the function takes that all-ones mask as an extra last
+  argument and evaluates many input vectors at once, one per bit of its
+  int arguments (see check_equivalent).
+  '''
+  if netlist.states:
+    raise ValueError(f"{netlist.name} has state (DFFs) and cannot be compiled")
+  params = []
+  lines = []
+  for input_, indices in netlist.inputs:
+    params.append(input_.name)
+    if input_.width is None:
+      lines.append(f'  w{indices[0]} = {input_.name}')
+    else:
+      lines.append(f"  {', '.join(f'w{index}' for index in indices)}, = {input_.name}")
+  for index in netlist.live():
+    a, b = netlist.nodes[index]
+    if a == b:
+      lines.append(f'  w{index} = {one} ^ w{a}')
+    else:
+      lines.append(f'  w{index} = {one} ^ (w{a} & w{b})')
+
+  def emit(value) -> str:
+    if isinstance(value, Wire):
+      return f'w{value.index}'
+    if isinstance(value, list):
+      return '[' + ', '.join(emit(item) for item in value) + ']'
+    if isinstance(value, tuple):
+      return '(' + ''.join(emit(item) + ', ' for item in value) + ')'
+    return one if value else '0'
+
+  if one != '1':
+    params.append(one)
+  lines.append(f'  return {emit(netlist.output)}')
+  return f"def {netlist.name}({', '.join(params)}):\n" + '\n'.join(lines) + '\n'
+
+def compile_netlist(netlist: Netlist, one: str = '1'):
+  namespace = {}
+  exec(source(netlist, one), namespace)
+  return namespace[netlist.name]
+
+def compile_chip(chip, *args, name=None):
+  '''
+  trace() and compile_netlist() in one step
+  '''
+  return compile_netlist(trace(chip, *args, name=name))
+
+def trace_alu() -> list[Netlist]:
+  '''
+  One ALU netlist per control word, indexed like gates.ALU_TABLE
+  '''
+  netlists = []
+  for control in range(64):
+    bits = [(control >> shift) & 1 for shift in range(5, -1, -1)]
+    netlists.append(trace(gates.ALU, bus('x'), bus('y'), *bits, name=f'alu_{control:06b}'))
+  return netlists
+
+def compile_alu():
+  '''
+  A drop-in for gates.ALU that dispatches on the control bits to
+  straight-line evaluators compiled for each control word
+  '''
+  table = tuple(compile_netlist(netlist) for netlist in trace_alu())
+
+  def ALU(x, y, zx, nx, zy, ny, f, no):
+    return table[gates.alu_control_word(zx, nx, zy, ny, f, no)](x, y)
+  return ALU
+
+def _flat_inputs(netlist: Netlist) -> list[tuple[str, int]]:
+  return [(input_.name, input_.width) for input_, _ in netlist.inputs]
+
+def check_equivalent(first: Netlist, second: Netlist, lane_bits: int = 16, outer_values=None):
+  '''
+  Exhaustively checks that two netlists with the same inputs compute the
+  same outputs. The last lane_bits input bits are enumerated in parallel,
+  one input vector per bit of a 2**lane_bits-bit int, and the remaining
+  bits in an outer loop over every value (or only those in outer_values).
+  Returns None, or the first differing input as a list of bits (inputs in
+  order, MSB first within a bus).
+  '''
+  shape = _flat_inputs(first)
+  if shape != _flat_inputs(second):
+    raise ValueError("Netlists have different inputs")
+  total = sum(width or 1 for _, width in shape)
+  lane_bits = min(lane_bits, total)
+  lanes = 1 << lane_bits
+  ones = (1 << lanes) - 1
+  # Lane pattern of enumerated bit k: set in every lane whose index has bit k
+  patterns = []
+  for k in range(lane_bits):
+    block = ((1 << (1 << k)) - 1) << (1 << k)
+    pattern = 0
+    for start in range(0, lanes, 2 << k):
+      pattern |= block << start
+    patterns.append(pattern)
+  evaluate = [compile_netlist(netlist, 'ones') for netlist in (first, second)]
+  outer_bits = total - lane_bits
+  for outer in range(1 << outer_bits) if outer_values is None else outer_values:
+    # Bits in input order: outer bits first, then the enumerated ones
+    flat = [ones if (outer >> (outer_bits - 1 - i)) & 1 else 0 for i in range(outer_bits)]
+    flat += patterns[::-1]
+    args, position = [], 0
+    for _, width in shape:
+      args.append(flat[position:position + width] if width is not None else flat[position])
+      position += width or 1
+    results = [list(_leaves(function(*args, ones))) for function in evaluate]
+    if results[0] != results[1]:
+      diff = 0
+      for x, y in zip(*results):
+        diff |= x ^ y
+      lane = (diff & -diff).bit_length() - 1
+      return [(outer >> (outer_bits - 1 - i)) & 1 for i in range(outer_bits)] + \
+             [(lane >> (lane_bits - 1 - k)) & 1 for k in range(lane_bits)]
+  return None
@@ -0,0 +1,141 @@
+'''
+Per-PC hot-spot profiler for Hack programs.
+
+Profiler.run executes an Emulator (or subclass) one instruction at a time,
+counting executions per ROM address, taken/not-taken outcomes per jump and
+every taken jump edge. The plain engines never look at a profiler, so
+there is no cost unless one is passed to Computer.run(profiler=...).
+
+report() lists the hottest instructions and loops; given the program's
+.asm source it shows the source lines and enclosing labels.
+'''
+from array import array
+from typing import Optional
+
+from assembler import Parser
+from emulator import Emulator, RunResult, JUMP_TABLE, ROM_MASK, RAM_MASK, ROM_SIZE, DEST_A, DEST_D, DEST_M
+
+class Profiler:
+  def __init__(self):
+    self.counts = array('Q', bytes(8 * ROM_SIZE))
+    self.taken = array('Q', bytes(8 * ROM_SIZE))
+    self.not_taken = array('Q', bytes(8 * ROM_SIZE))
+    self.edges = {}  # (jump pc, target pc) -> times taken
+
+  def run(self, emulator: Emulator, max_cycles: Optional[int] = None, until_pc: Optional[int] = None) -> RunResult:
+    '''
+    Same contract as Emulator.run, with every instruction counted
+    '''
+    if emulator.program is None:
+      emulator.decode_rom()
+    program, ram, jump_table = emulator.program, emulator.ram, JUMP_TABLE
+    counts, taken, not_taken, edges = self.counts, self.taken, self.not_taken, self.edges
+    a, d, pc = emulator.a, emulator.d, emulator.pc
+    limit = -1 if max_cycles is None else max_cycles
+    stop = -1 if until_pc is None else until_pc
+    n = 0
+    try:
+      while n != limit and pc != stop:
+        index = pc & ROM_MASK
+        kind, op, uses_m, dest, jump, constant = program[index]
+        counts[index] += 1
+        n += 1
+        if not kind:
+          a = constant
+          pc += 1
+          continue
+        out, zr, ng = op(d, ram[a & RAM_MASK] if uses_m else a)
+        if dest & DEST_M:
+          ram[a & RAM_MASK] = out
+        if dest & DEST_D:
+          d = out
+        if jump_table[jump | (zr << 1) | ng]:
+          taken[index] += 1
+          edge = (index, a & ROM_MASK)
+          edges[edge] = edges.get(edge, 0) + 1
+          pc = a
+        else:
+          if jump:
+            not_taken[index] += 1
+          pc += 1
+        if dest & DEST_A:
+          a = out
+    finally:
+      emulator.a, emulator.d, emulator.pc = a, d, pc
+      emulator.cycles += n
+    return RunResult(n, pc, a, d)
+
+  def hot_spots(self, top: int = 10) -> list[tuple[int, int]]:
+    '''
+    Returns the top (pc, executions) pairs, hottest first
+    '''
+    executed = [(count, pc) for pc, count in enumerate(self.counts) if count]
+    executed.sort(reverse=True)
+    return [(pc, count) for count, pc in executed[:top]]
+
+  def hot_loops(self, top: int = 10) -> list[tuple[int, int, int, int]]:
+    '''
+    Loops are taken backward jumps. Returns the top
+    (head pc, jump pc, iterations, cycles spent in head..jump) tuples,
+    ordered by cycles.
+    '''
+    loops = []
+    for (source, target), iterations in self.edges.items():
+      if target <= source:
+        cycles = sum(self.counts[target:source + 1])
+        loops.append((cycles, target, source, iterations))
+    loops.sort(reverse=True)
+    return [(target, source, iterations, cycles) for cycles, target, source, iterations in loops[:top]]
+
+  def report(self, asm: Optional[str] = None, top: int = 10) -> str:
+    lines_by_pc, labels = source_map(asm) if asm is not None else ([], {})
+
+    def describe(pc: int) -> str:
+      text = f'{pc:5}'
+      label = enclosing_label(labels, pc)
+      if label:
+        text += f' {label}'
+      if pc < len(lines_by_pc):
+        line_no, source = lines_by_pc[pc]
+        text += f' (line {line_no}: {source})'
+      return text
+
+    total = sum(self.counts)
+    out = [f'{total} instructions executed', '', 'Hottest instructions:']
+    for pc, count in self.hot_spots(top):
+      branch = ''
+      if self.taken[pc] or self.not_taken[pc]:
+        branch = f'  taken {self.taken[pc]} / not taken {self.not_taken[pc]}'
+      out.append(f'  {count:12} {count * 100 / total:6.2f}%  pc {describe(pc)}{branch}')
+    out += ['', 'Hottest loops:']
+    for head, jump, iterations, cycles in self.hot_loops(top):
+      out.append(f'  {cycles:12} {cycles * 100 / total:6.2f}%  {iterations} iterations, '
+                 f'head {describe(head)}, jump {describe(jump)}')
+    return '\n'.join(out)
+
+def source_map(asm: str) -> tuple[list[tuple[int, str]], dict[int, str]]:
+  '''
+  Maps a program's .asm source to its ROM layout.
+  Returns ([(line number, source text) per pc], {pc: label}).
+  '''
+  parser = Parser(asm)
+  lines_by_pc = []
+  labels = {}
+  for command in parser.commands:
+    if command.kind == 'L_COMMAND':
+      labels[parser.symbol_table[command.symbol]] = command.symbol
+    else:
+      lines_by_pc.append((command.line_no, command.source.split('//')[0].strip()))
+  return lines_by_pc, labels
+
+def enclosing_label(labels: dict[int, str], pc: int) -> Optional[str]:
+  '''
+  The nearest label at or before pc, with an offset when pc is past it
+  '''
+  best = None
+  for address in labels:
+    if address <= pc and (best is None or address > best):
+      best = address
+  if best is None:
+    return None
+  return labels[best] if best == pc else f'{labels[best]}+{pc - best}'
@@ -0,0 +1,90 @@
+'''
+Screen access and headless frame dumps.
+
+The screen is the 8192-word memory map at SCREEN (0x4000-0x5FFF): row r
+of the 512x256 display is the 32 words at SCREEN + 32 * r, and pixel c of
+that row is bit c % 16 of word c // 16 (bit 0 is the leftmost pixel,
+1 is black).
+
+With the flat backend, screen_words() and screen_array() are views of the
+MemoryChip words, so reading a frame copies nothing and always shows the
+current contents. unpack_bitmap() turns the words into a (256, 512) uint8
+array in a few NumPy calls, and dump_frame() writes it as PPM or PNG.
+'''
+import struct
+import zlib
+from array import array
+
+import numpy as np
+
+from gates import FlatRAM, SCREEN, SCREEN_WORDS, stream16_to_word, word_to_stream16
+
+WIDTH = 512
+HEIGHT = 256
+ROW_WORDS = WIDTH // 16
+
+def screen_words(computer) -> memoryview:
+  '''
+  The screen words of computer's data memory. Zero-copy for the flat
+  backend; the gate-level RAM is read word by word into a new array.
+  '''
+  chip = computer.mem.chip
+  if isinstance(chip, FlatRAM):
+    return memoryview(chip.words)[SCREEN:SCREEN + SCREEN_WORDS]
+  return memoryview(array('H', (stream16_to_word(chip.read(word_to_stream16(SCREEN + offset)))
+                                for offset in range(SCREEN_WORDS))))
+
+def screen_array(computer) -> np.ndarray:
+  '''
+  The screen words as a uint16 array sharing memory with screen_words()
+  '''
+  return np.frombuffer(screen_words(computer), dtype=np.uint16)
+
+def unpack_bitmap(words) -> np.ndarray:
+  '''
+  Unpacks 8192 screen words into a (HEIGHT, WIDTH) uint8 array of
+  zeros and ones
+  '''
+  words = np.asarray(words, dtype=np.uint16).reshape(HEIGHT, ROW_WORDS)
+  # Little-endian bytes put bit 0 of each word first, which is the order
+  # unpackbits(bitorder='little') emits pixels in
+  return np.unpackbits(words.astype('<u2').view(np.uint8), axis=1, bitorder='little')
+
+def frame_ppm(bitmap: np.ndarray) -> bytes:
+  '''
+  Binary PPM (P6) image of a bitmap, black on white
+  '''
+  gray = np.where(bitmap, np.uint8(0), np.uint8(255))
+  rgb = np.repeat(gray, 3, axis=1)
+  return b'P6\n%d %d\n255\n' % (bitmap.shape[1], bitmap.shape[0]) + rgb.tobytes()
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+  return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+def frame_png(bitmap: np.ndarray) -> bytes:
+  '''
+  1-bit grayscale PNG of a bitmap, black on white
+  '''
+  height, width = bitmap.shape
+  # PNG gray 0 is black, so set pixels are inverted; each row starts with
+  # filter type 0
+  rows = np.packbits(bitmap == 0, axis=1)
+  scanlines = np.hstack([np.zeros((height, 1), dtype=np.uint8), rows])
+  return (b'\x89PNG\r\n\x1a\n'
+          + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0))
+          + _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes()))
+          + _png_chunk(b'IEND', b''))
+
+def dump_frame(computer, path: str) -> None:
+  '''
+  Writes the current screen to path, as PNG or PPM depending on its suffix
+  '''
+  lower = path.lower()
+  if lower.endswith('.png'):
+    encode = frame_png
+  elif lower.endswith('.ppm'):
+    encode = frame_ppm
+  else:
+    raise ValueError(f"Unknown frame format for {path!r}, expected .png or .ppm")
+  with open(path, 'wb') as f:
+    f.write(encode(unpack_bitmap(screen_words(computer))))
@@ -0,0 +1,156 @@
+'''
+Machine snapshots: save a Computer's full state to a file and resume it.
+
+File layout (all little-endian), version 1:
+
+  offset 0   64-byte header: magic b'HACKSNAP', version, cycles, pc, a, d,
+             ROM and RAM word counts and the CRC32 of the words
+  offset 64  ROM words
+  then       RAM words
+
+The words sit at fixed offsets with no compression, so a file can be
+memory-mapped and read in place; load() maps it and copies the two word
+blocks out in one memcpy each. Snapshot equality compares the registers
+and then the word arrays with a single memcmp each.
+'''
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+from emulator import RAM_SIZE
+from gates import ROM_WORDS
+
+MAGIC = b'HACKSNAP'
+VERSION = 1
+# magic, version, cycles, pc, a, d, ROM words, RAM words, CRC32 of the words
+HEADER = struct.Struct('<8sHQIHHIII26x')
+
+class Snapshot:
+  __slots__ = ('cycles', 'pc', 'a', 'd', 'rom', 'ram')
+
+  def __init__(self, cycles: int, pc: int, a: int, d: int, rom: array, ram: array):
+    self.cycles = cycles
+    self.pc = pc
+    self.a = a
+    self.d = d
+    self.rom = rom
+    self.ram = ram
+
+  def __eq__(self, other) -> bool:
+    if not isinstance(other, Snapshot):
+      return NotImplemented
+    return (self.cycles == other.cycles and self.pc == other.pc and self.a == other.a
+            and self.d == other.d and self.rom == other.rom and self.ram == other.ram)
+
+  def __repr__(self) -> str:
+    return f'Snapshot(cycles={self.cycles}, pc={self.pc}, a={self.a}, d={self.d})'
+
+  def diff(self, other: 'Snapshot', limit: int = 10) -> list[str]:
+    '''
+    Describes how other differs from this snapshot: registers first, then
+    up to limit differing ROM and RAM words. Empty when they are equal.
+    '''
+    changes = [f'{name}: {getattr(self, name)} -> {getattr(other, name)}'
+               for name in ('cycles', 'pc', 'a', 'd') if getattr(self, name) != getattr(other, name)]
+    for name in ('rom', 'ram'):
+      mine, theirs = getattr(self, name), getattr(other, name)
+      if mine == theirs:
+        continue
+      if len(mine) != len(theirs):
+        changes.append(f'{name}: {len(mine)} words -> {len(theirs)} words')
+        continue
+      found = 0
+      for addr, (old, new) in enumerate(zip(mine, theirs)):
+        if old != new:
+          changes.append(f'{name}[{addr}]: {old} -> {new}')
+          found += 1
+          if found == limit:
+            break
+    return changes
+
+  def to_bytes(self) -> bytes:
+    payload = _to_little_endian(self.rom) + _to_little_endian(self.ram)
+    header = HEADER.pack(MAGIC, VERSION, self.cycles, self.pc, self.a, self.d,
+                         len(self.rom), len(self.ram), zlib.crc32(payload))
+    return header + payload
+
+  @classmethod
+  def from_buffer(cls, buffer, verify: bool = True) -> 'Snapshot':
+    '''
+    Reads a snapshot from bytes, an mmap or any other buffer
+    '''
+    view = memoryview(buffer)
+    if len(view) < HEADER.size:
+      raise ValueError("Snapshot is truncated")
+    magic, version, cycles, pc, a, d, rom_words, ram_words, crc = HEADER.unpack_from(view)
+    if magic != MAGIC:
+      raise ValueError("Not a Hack machine snapshot")
+    if version != VERSION:
+      raise ValueError(f"Unsupported snapshot version {version}, expected {VERSION}")
+    if rom_words > ROM_WORDS or ram_words > RAM_SIZE:
+      raise ValueError(f"Snapshot has {rom_words} ROM and {ram_words} RAM words, "
+                       f"the machine holds {ROM_WORDS} and {RAM_SIZE}")
+    end = HEADER.size + 2 * (rom_words + ram_words)
+    if len(view) < end:
+      raise ValueError("Snapshot is truncated")
+    payload = view[HEADER.size:end]
+    if verify and zlib.crc32(payload) != crc:
+      raise ValueError("Snapshot checksum mismatch")
+    rom = _from_little_endian(payload[:2 * rom_words])
+    ram = _from_little_endian(payload[2 * rom_words:])
+    return cls(cycles, pc, a, d, rom, ram)
+
+def _to_little_endian(words: array) -> bytes:
+  if sys.byteorder == 'big':
+    words = array('H', words)
+    words.byteswap()
+  return words.tobytes()
+
+def _from_little_endian(data) -> array:
+  words = array('H')
+  words.frombytes(data)
+  if sys.byteorder == 'big':
+    words.byteswap()
+  return words
+
+def take(computer) -> Snapshot:
+  '''
+  Copies the current state of computer
+  '''
+  state = computer.state()
+  return Snapshot(state.cycles, state.pc, state.a, state.d,
+                  computer.rom.contents(), computer.mem.contents())
+
+def restore(computer, snapshot: Snapshot) -> None:
+  '''
+  Puts computer back into the state of snapshot. The ROM is only reloaded
+  (and the engine's predecoded program rebuilt) when it differs.
+  '''
+  if computer.rom.contents() != snapshot.rom:
+    computer.rom.load(snapshot.rom)
+    if computer.engine != 'gates':
+      computer.emulator.decode_rom()
+  computer.mem.load(snapshot.ram)
+  computer.set_state(snapshot.cycles, snapshot.pc, snapshot.a, snapshot.d)
+
+def save(computer, path: str) -> Snapshot:
+  '''
+  Writes computer's state to path and returns the snapshot taken
+  '''
+  snapshot = take(computer)
+  with open(path, 'wb') as f:
+    f.write(snapshot.to_bytes())
+  return snapshot
+
+def load(path: str, computer=None, verify: bool = True) -> Snapshot:
+  '''
+  Reads the snapshot at path through a memory map; with computer, also
+  restores it
+  '''
+  with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+    snapshot = Snapshot.from_buffer(mapped, verify)
+  if computer is not None:
+    restore(computer, snapshot)
+  return snapshot
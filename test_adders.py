@@ -0,0 +1,63 @@
+import random
+import unittest
+import gates
+from gates import int_to_stream16, ADDERS, select_adder, add_ripple
+from netlist import trace, bus, check_equivalent
+
+
+def adder_netlist(adder, width=16):
+    return trace(adder, bus('a', width), bus('b', width), name='adder')
+
+
+class TestAdders(unittest.TestCase):
+
+    def test_exhaustive_8_bit(self):
+        ripple = adder_netlist(add_ripple, 8)
+        for name, adder in ADDERS.items():
+            if name != 'ripple':
+                self.assertIsNone(check_equivalent(ripple, adder_netlist(adder, 8)), name)
+
+    def test_16_bit_all_a_for_sampled_b(self):
+        # Every a for 16 values of b, 2**20 additions per adder
+        rng = random.Random(20)
+        sample = [0, 1, 0x7FFF, 0x8000, 0xFFFF] + [rng.getrandbits(16) for _ in range(11)]
+        ripple = adder_netlist(gates.add16)
+        for name, adder in ADDERS.items():
+            self.assertIsNone(check_equivalent(ripple, adder_netlist(adder), outer_values=sample), name)
+
+    def test_odd_widths(self):
+        for width in (1, 3, 5, 7):
+            ripple = adder_netlist(add_ripple, width)
+            for name, adder in ADDERS.items():
+                if name != 'ripple':
+                    self.assertIsNone(check_equivalent(ripple, adder_netlist(adder, width)), (name, width))
+
+    def test_counterexample(self):
+        def broken(a, b):
+            return add_ripple(a, [gates.and_(a[0], b[0])] + b[1:])
+        result = check_equivalent(adder_netlist(add_ripple, 4), adder_netlist(broken, 4))
+        self.assertEqual(result, [0, 0, 0, 0, 1, 0, 0, 0])
+
+    def test_depth_ordering(self):
+        depths = {name: adder_netlist(adder).depth() for name, adder in ADDERS.items()}
+        self.assertLess(depths['kogge_stone'], depths['brent_kung'])
+        self.assertLess(depths['brent_kung'], depths['ripple'])
+        self.assertLess(depths['cla'], depths['ripple'])
+
+    def test_select_adder(self):
+        x, y = int_to_stream16(30000), int_to_stream16(12345)
+        expected = gates.ALU(x, y, 0, 0, 0, 0, 1, 0)
+        try:
+            for name in ADDERS:
+                select_adder(name)
+                self.assertIs(gates.add16, ADDERS[name])
+                self.assertEqual(gates.ALU(x, y, 0, 0, 0, 0, 1, 0), expected)
+                self.assertEqual(gates.inc16(x), int_to_stream16(30001))
+        finally:
+            select_adder('ripple')
+        with self.assertRaises(ValueError):
+            select_adder('carry_skip')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
 
+import io
+import os
+import tempfile
+import tracemalloc
 import unittest
-from assembler import Assembler, Parser
+from assembler import Assembler, Parser, Code, tokenize
 
 
 class TestParser(unittest.TestCase):
@@ -238,6 +242,51 @@ class TestParser(unittest.TestCase):
         parser.advance()
         self.assertEqual(parser.command_type(), 'C_COMMAND')
 
+class TestTokenizer(unittest.TestCase):
+
+    def test_records(self):
+        commands = list(tokenize(["  @i // i", "", "(LOOP)", "\tAM = M-1 ; JNE", "D;JGT", "// only a comment"]))
+        self.assertEqual([(c.kind, c.dest, c.comp, c.jump, c.symbol, c.line_no) for c in commands], [
+            ('A_COMMAND', '', '', '', 'i', 1),
+            ('L_COMMAND', '', '', '', 'LOOP', 3),
+            ('C_COMMAND', 'AM', 'M-1', 'JNE', None, 4),
+            ('C_COMMAND', '', 'D', 'JGT', None, 5),
+        ])
+        self.assertEqual(commands[2].source, "\tAM = M-1 ; JNE")
+
+    def test_forward_label_takes_variable_slot(self):
+        parser = Parser("@LATER\n@x\n(LATER)\n@y")
+        self.assertEqual(parser.symbol_table['LATER'], 2)
+        self.assertEqual(parser.symbol_table['x'], 17)
+        self.assertEqual(parser.symbol_table['y'], 18)
+
+    def test_trailing_blank_lines(self):
+        self.assertEqual(Assembler().assemble("@5\nD=A\n\n\n"), "0000000000000101\n1110110000010000")
+
+    def test_inline_whitespace_and_comments(self):
+        self.assertEqual(Assembler().assemble("  @7 // seven\n D = D + A ;JMP"),
+                         "0000000000000111\n1110000010010111")
+
+    def test_unknown_mnemonic(self):
+        with self.assertRaises(ValueError) as context:
+            Assembler().assemble("@1\nD=D*A")
+        self.assertIn("Line 2", str(context.exception))
+
+    def test_empty_symbol_and_label(self):
+        for source in ("@", "@ // nothing", "()", "D=M\n( )"):
+            with self.assertRaises(ValueError) as context:
+                Parser(source)
+            self.assertIn("cannot parse", str(context.exception))
+        with self.assertRaises(ValueError) as context:
+            Assembler().assemble("@1\n@")
+        self.assertIn("Line 2: cannot parse", str(context.exception))
+
+    def test_code_tables(self):
+        self.assertEqual(Code.comp('D|M'), (1, 0, 1, 0, 1, 0, 1))
+        self.assertEqual(Code.dest('AMD'), (1, 1, 1))
+        self.assertEqual(Code.jump('null'), (0, 0, 0))
+
+
 class TestAssembler(unittest.TestCase):
   
     def test_filenames(self):
@@ -355,5 +404,48 @@ M=M+1 // i=i+1
         hack = asm.assemble(prog)
         self.assertEqual(hack, expected_hack)
 
+class TestStreamingAssembler(unittest.TestCase):
+
+    PROGRAM = "// sum\n@i\nM=1\n(LOOP)\n@i\nD=M\n@END\nD;JGT\n@LOOP\n0;JMP\n(END)\n@END\n0;JMP\n\n"
+
+    def test_matches_assemble(self):
+        output = io.StringIO()
+        count = Assembler().assemble_stream(io.StringIO(self.PROGRAM), output)
+        expected = Assembler().assemble(self.PROGRAM)
+        self.assertEqual(output.getvalue(), expected + '\n')
+        self.assertEqual(count, len(expected.split('\n')))
+
+    def test_assemble_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'Prog.asm')
+            with open(path, 'w') as f:
+                f.write(self.PROGRAM)
+            output_file = Assembler().assemble_file(path)
+            self.assertEqual(output_file, os.path.join(tmp, 'Prog.hack'))
+            with open(output_file) as f:
+                self.assertEqual(f.read(), Assembler().assemble(self.PROGRAM) + '\n')
+
+    def test_error_leaves_no_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'Bad.asm')
+            with open(path, 'w') as f:
+                f.write("@1\nD=D*A\n")
+            with self.assertRaises(ValueError):
+                Assembler().assemble_file(path)
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'Bad.hack')))
+
+    def test_memory_independent_of_length(self):
+        peaks = []
+        for repeats in (500, 5000):
+            source = io.StringIO("@x\nD=M // load\n@123\nM=D+M\n(L)\n@L\n0;JMP\n" * repeats)
+            output = open(os.devnull, 'w')
+            tracemalloc.start()
+            Assembler().assemble_stream(source, output)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            output.close()
+        self.assertLess(peaks[1], 2 * peaks[0])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+from assembler import Assembler
+from batch import discover, halt_loops, run_job, run_batch
+from test_emulator import ADD_100, STACK
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        with open(os.path.join(self.dir, 'add.asm'), 'w') as f:
+            f.write(ADD_100 + '\n\n')
+        with open(os.path.join(self.dir, 'stack.hack'), 'w') as f:
+            f.write(Assembler().assemble(STACK))
+        with open(os.path.join(self.dir, 'notes.txt'), 'w') as f:
+            f.write('not a program')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_manifest(self, jobs):
+        path = os.path.join(self.dir, 'manifest.jsonl')
+        with open(path, 'w') as f:
+            f.write('# programs\n' + '\n'.join(json.dumps(job) for job in jobs) + '\n')
+        return path
+
+    def test_discover_directory(self):
+        jobs = discover(self.dir, max_cycles=500)
+        self.assertEqual([os.path.basename(job['program']) for job in jobs], ['add.asm', 'stack.hack'])
+        self.assertTrue(all(job['max_cycles'] == 500 for job in jobs))
+
+    def test_halt_loops(self):
+        self.assertEqual(halt_loops([5, 0xEC10, 2, 0xEA87, 4, 0xEA87]), [2, 4])
+
+    def test_pass_fail_and_timeout(self):
+        add = os.path.join(self.dir, 'add.asm')
+        passed = run_job({'program': add, 'max_cycles': 10000, 'expect': {'17': 5050}})
+        self.assertEqual(passed['status'], 'pass')
+        self.assertEqual(passed['pc'], 18)
+        self.assertGreater(passed['cycles_per_sec'], 0)
+        failed = run_job({'program': add, 'max_cycles': 10000, 'until_pc': 'END', 'expect': {'sum': 1}})
+        self.assertEqual(failed['status'], 'fail')
+        self.assertEqual(failed['failures'], [{'address': 'sum', 'expected': 1, 'actual': 5050}])
+        self.assertEqual(run_job({'program': add, 'max_cycles': 50})['status'], 'timeout')
+
+    def test_no_halt_point_uses_budget(self):
+        path = os.path.join(self.dir, 'spin.asm')
+        with open(path, 'w') as f:
+            f.write('(LOOP)\n@LOOP\nD;JMP')
+        result = run_job({'program': path, 'max_cycles': 1000})
+        self.assertEqual((result['status'], result['cycles']), ('timeout', 1000))
+
+    def test_errors_are_reported(self):
+        result = run_job({'program': os.path.join(self.dir, 'missing.asm'), 'max_cycles': 10})
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('FileNotFoundError', result['error'])
+
+    def test_keys(self):
+        path = os.path.join(self.dir, 'key.asm')
+        with open(path, 'w') as f:
+            f.write('(WAIT)\n@KBD\nD=M\n@WAIT\nD;JEQ\n@R0\nM=D\n(END)\n@END\n0;JMP')
+        result = run_job({'program': path, 'max_cycles': 1000, 'keys': [[50, 65]], 'expect': {'R0': 65}})
+        self.assertEqual(result['status'], 'pass')
+
+    def test_manifest_over_pool(self):
+        manifest = self.write_manifest([
+            {'program': 'add.asm', 'expect': {'17': 5050}},
+            {'program': 'stack.hack', 'max_cycles': 100, 'until_pc': 9, 'expect': {'R0': 260}},
+        ])
+        jobs = discover(manifest)
+        results = list(run_batch(jobs, processes=2, ordered=True))
+        self.assertEqual([result['status'] for result in results], ['pass', 'pass'])
+        untimed = lambda result: {k: v for k, v in result.items() if k not in ('seconds', 'cycles_per_sec')}
+        self.assertEqual([untimed(result) for result in results],
+                         [untimed(result) for result in run_batch(jobs, processes=1)])
+
+    def test_bad_manifest(self):
+        with self.assertRaises(ValueError):
+            discover(self.write_manifest([{'max_cycles': 5}]))
+        for limit in (None, 0, 'many'):
+            with self.assertRaises(ValueError):
+                discover(self.write_manifest([{'program': 'add.asm', 'max_cycles': limit}]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import random
+import unittest
+from array import array
+from gates import Computer
+from emulator import Emulator, predecode, RAM_SIZE
+from blocks import BlockEmulator, block_source, compile_block, MAX_BLOCK_LENGTH
+from test_emulator import load_program, ADD_100, STACK
+
+
+def random_rom(rng, size=64):
+    rom = array('H', bytes(2 * 16384))
+    for addr in range(size):
+        word = rng.getrandbits(16)
+        if word & 0x8000:
+            if rng.random() < 0.6:
+                word &= 0xFFF8  # no jump
+        elif rng.random() < 0.8:
+            word &= 0x3F
+        rom[addr] = word
+    return rom
+
+
+class TestBlockCompiler(unittest.TestCase):
+
+    def test_block_ends_at_first_jump(self):
+        # @5 D=A @3 D;JGT @0 0;JMP
+        program = predecode(array('H', [5, 0xEC10, 3, 0xE301, 0, 0xEA87]))
+        source, length = block_source(program, 0)
+        self.assertEqual(length, 4)
+        self.assertIn('return 3, d, 3, 1', source)
+        self.assertIn('return 3, d, 4, 1', source)
+
+    def test_block_length_is_capped(self):
+        program = predecode(array('H', [1] * (MAX_BLOCK_LENGTH + 10)))
+        self.assertEqual(block_source(program, 0)[1], MAX_BLOCK_LENGTH)
+
+    def test_self_loop_respects_limit(self):
+        # (LOOP) @LOOP 0;JMP
+        program = predecode(array('H', [0, 0xEA87]))
+        function, length = compile_block(program, 0)
+        self.assertEqual(length, 2)
+        self.assertEqual(function(7, 0, array('H', [0]), 5), (0, 0, 0, 5))
+
+    def test_memory_write_uses_old_a(self):
+        # @SP AM=M-1 0;JMP with RAM[0] = 261
+        program = predecode(array('H', [0, 0xFCA8, 0xEA87]))
+        function, _ = compile_block(program, 0)
+        ram = array('H', [261] + [0] * 300)
+        a, d, pc, _ = function(0, 0, ram, 1)
+        self.assertEqual((a, pc, ram[0]), (260, 260, 260))
+
+
+class TestBlockEmulator(unittest.TestCase):
+
+    def test_add_100(self):
+        computer = Computer('flat', 'blocks')
+        load_program(computer, ADD_100)
+        result = computer.run(max_cycles=100000, until_pc=18)
+        self.assertEqual(result.pc, 18)
+        self.assertEqual(computer.mem.chip.read_word(17), 5050)
+
+    def test_stack_pop(self):
+        computer = Computer('flat', 'blocks')
+        computer.mem.chip.write_word(260, 1234)
+        load_program(computer, STACK)
+        computer.run(max_cycles=1000, until_pc=9)
+        self.assertEqual(computer.mem.chip.read_word(0), 260)
+        self.assertEqual(computer.mem.chip.read_word(5), 1234)
+
+    def test_matches_emulator_on_random_programs(self):
+        rng = random.Random(99)
+        for _ in range(30):
+            rom = random_rom(rng)
+            ram = array('H', [rng.getrandbits(16) for _ in range(64)]) + array('H', bytes(2 * (RAM_SIZE - 64)))
+            reference = Emulator(array('H', rom), array('H', ram))
+            blocks = BlockEmulator(array('H', rom), array('H', ram))
+            for _ in range(5):
+                budget = rng.randrange(1, 400)
+                self.assertEqual(blocks.run(max_cycles=budget), reference.run(max_cycles=budget))
+                self.assertEqual(blocks.state(), reference.state())
+                self.assertEqual(blocks.ram, reference.ram)
+
+    def test_until_pc_inside_and_at_start_of_blocks(self):
+        rng = random.Random(5)
+        for _ in range(30):
+            rom = random_rom(rng)
+            reference = Emulator(array('H', rom))
+            blocks = BlockEmulator(array('H', rom))
+            stop = rng.randrange(64)
+            self.assertEqual(blocks.run(max_cycles=500, until_pc=stop),
+                             reference.run(max_cycles=500, until_pc=stop))
+            self.assertEqual(blocks.ram, reference.ram)
+
+    def test_loop_block_stops_at_until_pc(self):
+        # (LOOP) @LOOP 0;JMP, stop at the loop head after the first pass
+        emu = BlockEmulator(array('H', [0, 0xEA87] + [0] * 16382))
+        emu.run(max_cycles=1)
+        result = emu.run(until_pc=0)
+        self.assertEqual(result.cycles, 1)
+        self.assertEqual(emu.pc, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
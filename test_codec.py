@@ -0,0 +1,60 @@
+import unittest
+import codec
+from gates import int_to_stream3, int_to_stream8, int_to_stream16, stream16_to_word, word_to_stream16
+
+
+def reference_bits(value, width):
+    return tuple((value >> (width - 1 - i)) & 1 for i in range(width))
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_tables(self):
+        for width in codec.WIDTHS:
+            table = codec.TABLES[width]
+            self.assertEqual(len(table), 1 << width)
+            for value in (0, 1, 2, 5, (1 << width) - 2, (1 << width) - 1):
+                self.assertEqual(table[value], reference_bits(value, width))
+        self.assertEqual([codec.from_bits(bits) for bits in codec.BITS16], list(range(65536)))
+
+    def test_round_trip(self):
+        for width in codec.WIDTHS:
+            for value in range(0, 1 << width, 97):
+                self.assertEqual(codec.from_bits(codec.to_bits(value, width)), value)
+                self.assertEqual(codec.from_bits(list(codec.to_bits(value, width))), value)
+
+    def test_masking(self):
+        self.assertEqual(codec.to_bits(0x12345), codec.BITS16[0x2345])
+        self.assertEqual(codec.to_bits(-1, 3), (1, 1, 1))
+        self.assertEqual(int_to_stream16(-1), [1] * 16)
+        self.assertEqual(int_to_stream3(9), [0, 0, 1])
+
+    def test_other_widths(self):
+        self.assertEqual(codec.from_bits([1, 0]), 2)
+        self.assertEqual(codec.from_bits([1] * 20), (1 << 20) - 1)
+        self.assertEqual(codec.from_bits([]), 0)
+        for width in (1, 5, 9, 12, 15):
+            for value in range(0, 1 << width, 37):
+                self.assertEqual(codec.from_bits(reference_bits(value, width)), value)
+        self.assertEqual(codec.from_bits([True, False, True]), 5)
+
+    def test_byte_sized_values(self):
+        self.assertEqual(len(codec.VALUES), sum(1 << width for width in range(9)))
+        self.assertTrue(all(len(bits) <= 8 for bits in codec.VALUES))
+
+    def test_shared_tuples(self):
+        self.assertIs(codec.to_bits(1234), codec.to_bits(1234))
+        self.assertIsInstance(codec.to_bits(1234), tuple)
+
+    def test_wrappers_return_fresh_lists(self):
+        first = int_to_stream16(7)
+        first[0] = 1
+        self.assertEqual(int_to_stream16(7), [0] * 13 + [1, 1, 1])
+        for convert in (int_to_stream3, int_to_stream8, int_to_stream16, word_to_stream16):
+            self.assertIsInstance(convert(5), list)
+        self.assertEqual(int_to_stream8(0x81), [1, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(stream16_to_word(word_to_stream16(0xBEEF)), 0xBEEF)
+
+
+if __name__ == '__main__':
+    unittest.main()
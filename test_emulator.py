@@ -0,0 +1,182 @@
+import os
+import random
+import tempfile
+import unittest
+from array import array
+from assembler import Assembler
+from gates import Computer
+from emulator import (Emulator, RunResult, JUMP_TABLE, decode, predecode, A_INSTRUCTION,
+                      C_INSTRUCTION, DEST_A, DEST_D, DEST_M)
+from gates import ALU_TABLE
+
+
+ADD_100 = '''// Adds 1 + ... + 100
+@i
+M=1 // i=1
+@sum
+M=0 // sum=0
+(LOOP)
+@i
+D=M // D=i
+@100
+D=D-A // D=i-100
+@END
+D;JGT // if (i-100)>0 goto END
+@i
+D=M // D=i
+@sum
+M=D+M // sum=sum+i
+@i
+M=M+1 // i=i+1
+@LOOP
+0;JMP // goto LOOP
+(END)
+@END
+0;JMP // infinite loop'''
+
+STACK = '''@261
+D=A
+@SP
+M=D
+@SP
+AM=M-1
+D=M
+@R5
+M=D
+(END)
+@END
+0;JMP'''
+
+
+def load_program(computer, asm):
+    hack = Assembler().assemble(asm)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prog.hack')
+        with open(path, 'w') as f:
+            f.write(hack)
+        computer.load_instructions(path)
+    return len(hack.split('\n'))
+
+
+class TestEmulator(unittest.TestCase):
+
+    def test_jump_table(self):
+        # null, JGT, JEQ, JGE, JLT, JNE, JLE, JMP for (zr, ng) = (0, 0) i.e. positive
+        self.assertEqual([JUMP_TABLE[j << 2] for j in range(8)], [0, 1, 0, 1, 0, 1, 0, 1])
+        # zero result
+        self.assertEqual([JUMP_TABLE[(j << 2) | 2] for j in range(8)], [0, 0, 1, 1, 0, 0, 1, 1])
+        # negative result
+        self.assertEqual([JUMP_TABLE[(j << 2) | 1] for j in range(8)], [0, 0, 0, 0, 1, 1, 1, 1])
+
+    def test_a_and_c_instructions(self):
+        emu = Emulator()
+        emu.rom[0:4] = array('H', [5, 0b1110110000010000, 100, 0b1110001100001000])  # @5 D=A @100 M=D
+        result = emu.run(max_cycles=4)
+        self.assertEqual(result, RunResult(4, 4, 100, 5))
+        self.assertEqual(emu.ram[100], 5)
+
+    def test_until_pc(self):
+        emu = Emulator()
+        result = emu.run(until_pc=7)
+        self.assertEqual(result.cycles, 7)
+        self.assertEqual(emu.pc, 7)
+        self.assertEqual(emu.run(max_cycles=3).cycles, 3)
+        self.assertEqual(emu.cycles, 10)
+
+    def test_add_100_fast(self):
+        computer = Computer('flat', 'fast')
+        load_program(computer, ADD_100)
+        result = computer.run(max_cycles=10000, until_pc=18)
+        self.assertEqual(result.pc, 18)
+        self.assertEqual(computer.mem.chip.read_word(17), 5050)
+
+    def test_stack_pop_writes_and_reads_the_right_words(self):
+        for engine in ('gates', 'fast'):
+            computer = Computer('flat', engine)
+            computer.mem.chip.write_word(260, 1234)
+            load_program(computer, STACK)
+            computer.run(until_pc=9)
+            self.assertEqual(computer.mem.chip.read_word(0), 260)
+            self.assertEqual(computer.mem.chip.read_word(5), 1234)
+
+    def test_reset_matches_across_engines(self):
+        states = []
+        for engine in ('gates', 'fast', 'blocks'):
+            computer = Computer('flat', engine)
+            load_program(computer, STACK)
+            computer.run(max_cycles=7)
+            computer.reset()
+            states.append((computer.state(), list(computer.mem.chip.words[:8])))
+        self.assertEqual(states[0][0].pc, 0)
+        self.assertEqual(states[0][0].a, 260)  # AM=M-1 left A at 260
+        self.assertEqual(states[1], states[0])
+        self.assertEqual(states[2], states[0])
+
+    def test_bad_engine(self):
+        with self.assertRaises(ValueError):
+            Computer('gates', 'fast')
+        with self.assertRaises(ValueError):
+            Computer('flat', 'bogus')
+
+
+class TestPredecode(unittest.TestCase):
+
+    def test_decode_a_instruction(self):
+        record = decode(12345)
+        self.assertEqual(record.kind, A_INSTRUCTION)
+        self.assertEqual(record.constant, 12345)
+
+    def test_decode_c_instruction(self):
+        record = decode(0b1111110010011011)  # MD=M-1;JGE
+        self.assertEqual(record.kind, C_INSTRUCTION)
+        self.assertIs(record.op, ALU_TABLE[0b110010])
+        self.assertEqual(record.uses_m, 1)
+        self.assertEqual(record.dest, DEST_D | DEST_M)
+        self.assertEqual(record.jump, 0b011 << 2)
+        self.assertEqual(decode(0b1110110000100000).dest, DEST_A)
+
+    def test_records_are_interned(self):
+        self.assertIs(decode(0xEC10), decode(0xEC10))
+        table = predecode(array('H', [7, 0xEC10, 7]))
+        self.assertEqual(len(table), 3)
+        self.assertIs(table[0], table[2])
+
+    def test_decode_rom_after_rom_change(self):
+        emu = Emulator()
+        emu.run(max_cycles=1)
+        emu.rom[1] = 42
+        emu.decode_rom()
+        emu.run(max_cycles=1)
+        self.assertEqual(emu.a, 42)
+
+
+class TestEmulatorMatchesCPU(unittest.TestCase):
+    """Random instruction streams, compared cycle by cycle with the gate-level CPU"""
+
+    def test_random_programs(self):
+        rng = random.Random(2024)
+        for _ in range(4):
+            gate = Computer('flat', 'gates')
+            emu = Emulator()
+            for addr in range(64):
+                word = rng.getrandbits(16)
+                if word & 0x8000:
+                    if rng.random() < 0.7:
+                        word &= 0xFFF8  # no jump
+                elif rng.random() < 0.8:
+                    word &= 0x3F  # keep most addresses in the initialised window
+                gate.rom.chip.write_word(addr, word)
+                emu.rom[addr] = word
+            for addr in range(64):
+                value = rng.getrandbits(16)
+                gate.mem.chip.write_word(addr, value)
+                emu.ram[addr] = value
+            for _ in range(150):
+                gate.step()
+                emu.step()
+                self.assertEqual(emu.state(), gate.state())
+            self.assertEqual(emu.ram, gate.mem.chip.words)
+
+
+if __name__ == "__main__":
+    unittest.main()
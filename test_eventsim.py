@@ -0,0 +1,64 @@
+import random
+import unittest
+import gates
+from gates import Computer, int_to_stream16
+from netlist import trace, bus, bit
+from eventsim import EventSimulator, alu_inputs, pc_inputs
+from test_emulator import load_program, ADD_100
+
+ALU_INPUTS = (bus('x'), bus('y'), bit('zx'), bit('nx'), bit('zy'), bit('ny'), bit('f'), bit('no'))
+
+
+class TestEventSimulator(unittest.TestCase):
+
+    def test_alu_mux_matches_alu(self):
+        rng = random.Random(19)
+        for _ in range(300):
+            x, y = int_to_stream16(rng.getrandbits(16)), int_to_stream16(rng.getrandbits(16))
+            control = [rng.getrandbits(1) for _ in range(6)]
+            self.assertEqual(gates.ALU_mux(x, y, *control), gates.ALU(x, y, *control))
+
+    def test_matches_chip_on_random_inputs(self):
+        sim = EventSimulator(trace(gates.ALU_mux, *ALU_INPUTS))
+        rng = random.Random(3)
+        for _ in range(300):
+            x, y = int_to_stream16(rng.getrandbits(16)), int_to_stream16(rng.getrandbits(16))
+            control = [rng.getrandbits(1) for _ in range(6)]
+            self.assertEqual(sim.evaluate(x, y, *control), gates.ALU(x, y, *control))
+
+    def test_unchanged_inputs_cost_nothing(self):
+        sim = EventSimulator(trace(gates.add16, bus('a'), bus('b')))
+        a, b = int_to_stream16(1000), int_to_stream16(2345)
+        self.assertEqual(sim.evaluate(a, b), gates.add16(a, b))
+        evaluated = sim.evaluated
+        self.assertEqual(sim.evaluate(a, b), gates.add16(a, b))
+        self.assertEqual(sim.evaluated, evaluated)
+        self.assertEqual(sim.activity()['calls'], 2)
+
+    def test_single_bit_change_is_local(self):
+        sim = EventSimulator(trace(gates.inc16, bus('a')))
+        sim.evaluate(int_to_stream16(6))
+        before = sim.evaluated
+        self.assertEqual(sim.evaluate(int_to_stream16(7)), int_to_stream16(8))
+        self.assertLess(sim.evaluated - before, len(sim.live) // 4)
+
+    def test_instruction_streams(self):
+        computer = Computer('flat', 'fast')
+        load_program(computer, ADD_100)
+        alu = EventSimulator(trace(gates.ALU_mux, *ALU_INPUTS))
+        for x, y, control in alu_inputs(computer.emulator, 400):
+            self.assertEqual(alu.evaluate(x, y, *control), gates.ALU(x, y, *control))
+        stats = alu.activity()
+        self.assertGreater(stats['calls'], 100)
+        self.assertGreater(stats['skipped'], 0)
+        self.assertIn('% of the work skipped', alu.report())
+
+        computer.reset()
+        inc = EventSimulator(trace(gates.inc16, bus('a')))
+        for pc in pc_inputs(computer.emulator, 400):
+            inc.evaluate(pc)
+        self.assertGreater(inc.activity()['skipped'], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
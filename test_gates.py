@@ -1,8 +1,15 @@
 import unittest
 from gates import (nand, not_, and_, or_, xor, mux, expand_1_to_16, and16, or16, not16, mux16, 
                    Register, RAM8, RAM64, half_adder, full_adder, add16, demux, int_to_stream3, 
-                   int_to_stream16, iszero16, DFF, ALU, CPU, PC)
+                   int_to_stream16, iszero16, DFF, ALU, CPU, PC, inc16, stream16_to_word,
+                   word_to_stream16, and16_w, or16_w, not16_w, mux16_w, add16_w, inc16_w,
+                   iszero16_w, ALU_w, ALU_TABLE, alu_control_word, FlatRAM8, FlatRAM64,
+                   FlatRAM16K, FlatRAM32K, make_ram16k, make_ram32k, MemoryChip, ROM16K, RAM512, RAM16K, RAM32K, select_index,
+                   Computer, parse_hack, image_to_words, LoadReport)
+from array import array
 import os
+import tempfile
+import random
 
 class TestGates(unittest.TestCase):
     def test_nand(self):
@@ -94,6 +101,17 @@ class TestRegister(unittest.TestCase):
         expected = tuple([0] * 16)
         self.assertEqual(result, expected)
 
+    def test_register_value(self):
+        reg = Register()
+        reg.update(int_to_stream16(0x8001), 1)
+        self.assertEqual(reg.value(), 0x8001)
+        self.assertEqual(reg.read(), int_to_stream16(0x8001))
+        self.assertEqual((reg.b0, reg.b1, reg.b14, reg.b15), (1, 0, 0, 1))
+        reg.update(int_to_stream16(5), 0)
+        self.assertEqual(reg.value(), 0x8001)
+        with self.assertRaises(AttributeError):
+            reg.extra = 1
+
     def test_register_update_with_load(self):
         reg = Register()
         test_input = [1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0]
@@ -640,5 +658,271 @@ class TestCPU(unittest.TestCase):
         self.assertEqual(writeM, 0)
 
 
+class TestPackedWords(unittest.TestCase):
+    """Cross-check the packed-word chips against the NAND-built ones"""
+
+    def setUp(self):
+        self.rng = random.Random(1234)
+        self.vectors = [(self.rng.getrandbits(16), self.rng.getrandbits(16)) for _ in range(200)]
+        self.vectors += [(0, 0), (0xFFFF, 1), (0x7FFF, 1), (0x8000, 0x8000), (0xFFFF, 0xFFFF)]
+
+    def test_adapters_round_trip(self):
+        for a, _ in self.vectors:
+            self.assertEqual(word_to_stream16(a), int_to_stream16(a))
+            self.assertEqual(stream16_to_word(int_to_stream16(a)), a)
+
+    def test_bitwise_chips(self):
+        for a, b in self.vectors:
+            sa, sb = int_to_stream16(a), int_to_stream16(b)
+            self.assertEqual(word_to_stream16(and16_w(a, b)), and16(sa, sb))
+            self.assertEqual(word_to_stream16(or16_w(a, b)), or16(sa, sb))
+            self.assertEqual(word_to_stream16(not16_w(a)), not16(sa))
+            for sel in (0, 1):
+                self.assertEqual(word_to_stream16(mux16_w(a, b, sel)), mux16(sa, sb, sel))
+            self.assertEqual(iszero16_w(a), iszero16(sa))
+
+    def test_arithmetic_chips(self):
+        for a, b in self.vectors:
+            sa, sb = int_to_stream16(a), int_to_stream16(b)
+            self.assertEqual(word_to_stream16(add16_w(a, b)), add16(sa, sb))
+            self.assertEqual(word_to_stream16(inc16_w(a)), inc16(sa))
+
+    def test_alu_all_control_words(self):
+        for a, b in self.vectors[:40]:
+            sa, sb = int_to_stream16(a), int_to_stream16(b)
+            for control in range(64):
+                bits = int_to_stream16(control)[10:]
+                out, zr, ng = ALU_w(a, b, *bits)
+                expected_out, expected_zr, expected_ng = ALU(sa, sb, *bits)
+                self.assertEqual(word_to_stream16(out), expected_out)
+                self.assertEqual((zr, ng), (expected_zr, expected_ng))
+
+
+class TestALUTable(unittest.TestCase):
+    def test_control_word(self):
+        self.assertEqual(alu_control_word(0, 0, 0, 0, 0, 0), 0)
+        self.assertEqual(alu_control_word(1, 0, 1, 0, 1, 0), 0b101010)
+        self.assertEqual(alu_control_word(0, 1, 1, 1, 1, 1), 0b011111)
+
+    def test_table_matches_alu_for_all_control_words(self):
+        rng = random.Random(7)
+        vectors = [(rng.getrandbits(16), rng.getrandbits(16)) for _ in range(100)]
+        vectors += [(0, 0), (0xFFFF, 0xFFFF), (0x8000, 0x7FFF), (1, 0xFFFF)]
+        self.assertEqual(len(ALU_TABLE), 64)
+        for control in range(64):
+            bits = int_to_stream16(control)[10:]
+            for x, y in vectors:
+                self.assertEqual(ALU_TABLE[control](x, y), ALU_w(x, y, *bits))
+            for x, y in vectors[-8:]:
+                out, zr, ng = ALU_TABLE[control](x, y)
+                expected_out, expected_zr, expected_ng = ALU(int_to_stream16(x), int_to_stream16(y), *bits)
+                self.assertEqual((word_to_stream16(out), zr, ng), (expected_out, expected_zr, expected_ng))
+
+
+class TestFlatRAM(unittest.TestCase):
+    def test_flat_ram_matches_gate_ram(self):
+        rng = random.Random(3)
+        for gate_ram, flat_ram in ((RAM8(), FlatRAM8()), (RAM64(), FlatRAM64())):
+            for _ in range(100):
+                data = int_to_stream16(rng.getrandbits(16))
+                address = int_to_stream16(rng.getrandbits(16))
+                load = rng.getrandbits(1)
+                self.assertEqual(list(flat_ram.update(data, address, load)),
+                                 list(gate_ram.update(data, address, load)))
+
+    def test_flat_ram16k_store_and_read(self):
+        ram = FlatRAM16K()
+        data = int_to_stream16(0xBEEF)
+        self.assertEqual(ram.update(data, int_to_stream16(16383), 1), data)
+        self.assertEqual(ram.update([0]*16, int_to_stream16(16383), 0), data)
+        self.assertEqual(ram.read_word(16383), 0xBEEF)
+        ram.write_word(5, 42)
+        self.assertEqual(ram.update([0]*16, int_to_stream16(5), 0), int_to_stream16(42))
+
+    def test_backend_flag(self):
+        self.assertIsInstance(MemoryChip('flat').chip, FlatRAM32K)
+        self.assertIsInstance(MemoryChip('gates').chip, RAM32K)
+        self.assertIsInstance(ROM16K('flat').chip, FlatRAM16K)
+        with self.assertRaises(ValueError):
+            make_ram16k('bogus')
+        with self.assertRaises(ValueError):
+            make_ram32k('bogus')
+
+    def test_ram32k_halves_match_flat(self):
+        gate_ram, flat_ram = RAM32K(), FlatRAM32K()
+        for addr, value in ((5, 11), (0x4005, 22), (0x6000, 33), (0x7FFF, 44)):
+            for port in ('update', 'update_path'):
+                getattr(gate_ram, port)(int_to_stream16(value), int_to_stream16(addr), 1)
+            flat_ram.update(int_to_stream16(value), int_to_stream16(addr), 1)
+        for addr in (5, 0x4005, 0x6000, 0x7FFF, 0x0005 | 0x2000):
+            self.assertEqual(gate_ram.read(int_to_stream16(addr)), flat_ram.read(int_to_stream16(addr)))
+        self.assertIsNone(RAM32K().ram16k_1)
+
+    def test_flat_rom_write_and_read(self):
+        rom = ROM16K('flat')
+        rom.write(int_to_stream16(0xE308), int_to_stream16(7))
+        self.assertEqual(rom.update(int_to_stream16(7)), int_to_stream16(0xE308))
+
+
+class TestLazyRAM(unittest.TestCase):
+    def test_construction_builds_no_banks(self):
+        ram = RAM16K()
+        self.assertEqual([ram.ram4k_0, ram.ram4k_1, ram.ram4k_2, ram.ram4k_3], [None] * 4)
+
+    def test_unwritten_banks_read_zero(self):
+        ram = RAM16K()
+        self.assertEqual(list(ram.update([1]*16, int_to_stream16(12345), 0)), [0]*16)
+        self.assertIsNone(ram.ram4k_3)
+
+    def test_write_builds_only_the_addressed_path(self):
+        ram = RAM16K()
+        data = int_to_stream16(0x1234)
+        address = int_to_stream16(0x3000 + 0x200 + 0x40 + 5)  # ram4k_3.ram512_1.ram64_1
+        self.assertEqual(list(ram.update(data, address, 1)), data)
+        self.assertIsNone(ram.ram4k_0)
+        self.assertIsNotNone(ram.ram4k_3)
+        self.assertIsNotNone(ram.ram4k_3.ram512_1)
+        self.assertIsNone(ram.ram4k_3.ram512_0)
+        self.assertIsNotNone(ram.ram4k_3.ram512_1.ram64_1)
+        self.assertIsNone(ram.ram4k_3.ram512_1.ram64_0)
+        self.assertEqual(list(ram.update([0]*16, address, 0)), data)
+        self.assertEqual(list(ram.update([0]*16, int_to_stream16(0x3000 + 0x200 + 0x40 + 4), 0)), [0]*16)
+
+    def test_lazy_ram512_matches_written_values(self):
+        ram = RAM512()
+        rng = random.Random(11)
+        written = {}
+        for _ in range(30):
+            addr = rng.randrange(512)
+            value = rng.getrandbits(16)
+            ram.update(int_to_stream16(value), int_to_stream16(addr), 1)
+            written[addr] = value
+        for addr in range(0, 512, 3):
+            expected = int_to_stream16(written.get(addr, 0))
+            self.assertEqual(list(ram.update([0]*16, int_to_stream16(addr), 0)), expected)
+
+
+class TestSelectedPath(unittest.TestCase):
+    def test_select_index(self):
+        self.assertEqual(select_index([0, 0, 0]), 0)
+        self.assertEqual(select_index([1, 0, 1]), 5)
+        self.assertEqual(select_index([1, 1]), 3)
+
+    def test_update_path_matches_full_tree(self):
+        rng = random.Random(5)
+        for cls in (RAM8, RAM64, RAM512):
+            full, path = cls(), cls()
+            for _ in range(60):
+                data = int_to_stream16(rng.getrandbits(16))
+                address = int_to_stream16(rng.getrandbits(9))
+                load = rng.getrandbits(1)
+                self.assertEqual(list(path.update_path(data, address, load)),
+                                 list(full.update(data, address, load)))
+                self.assertEqual(path.read(address), list(full.update([0]*16, address, 0)))
+
+    def test_ram16k_read_port(self):
+        ram = RAM16K()
+        address = int_to_stream16(9000)
+        self.assertEqual(ram.read(address), [0]*16)
+        self.assertEqual([ram.ram4k_0, ram.ram4k_1, ram.ram4k_2, ram.ram4k_3], [None] * 4)
+        data = int_to_stream16(0xCAFE)
+        self.assertEqual(ram.update_path(data, address, 1), data)
+        self.assertEqual(ram.read(address), data)
+        self.assertEqual(list(ram.update([0]*16, address, 0)), data)
+        self.assertEqual(ram.read(int_to_stream16(9001)), [0]*16)
+
+    def test_memory_chip_read_port(self):
+        for backend in ('gates', 'flat'):
+            mem = MemoryChip(backend)
+            address = int_to_stream16(300)
+            mem.update(int_to_stream16(77), address, 1)
+            self.assertEqual(mem.read(address), int_to_stream16(77))
+
+    def test_rom_write_uses_selected_path(self):
+        rom = ROM16K()
+        rom.write(int_to_stream16(0xFC10), int_to_stream16(100))
+        self.assertEqual(rom.update(int_to_stream16(100)), int_to_stream16(0xFC10))
+        self.assertEqual(rom.update(int_to_stream16(101)), [0]*16)
+
+
+class TestLoader(unittest.TestCase):
+    HACK = "0000000000000101\n1110110000010000\n0000000000000111\n"
+    WORDS = [5, 0xEC10, 7]
+
+    def test_parse_hack(self):
+        self.assertEqual(parse_hack(self.HACK), array('H', self.WORDS))
+        self.assertEqual(parse_hack(self.HACK.replace('\n', '\r\n')), array('H', self.WORDS))
+
+    def test_parse_hack_validates_width(self):
+        with self.assertRaises(ValueError) as cm:
+            parse_hack("0000000000000101\n111011000001000\n")
+        self.assertIn('Line 2', str(cm.exception))
+        with self.assertRaises(ValueError):
+            parse_hack("000000000000010a")
+
+    def test_program_must_fit_in_rom(self):
+        with self.assertRaises(ValueError):
+            parse_hack("0000000000000000\n" * 16385)
+        with self.assertRaises(ValueError):
+            image_to_words([0] * 16385)
+
+    def test_image_to_words(self):
+        self.assertEqual(image_to_words(bytes([5, 0, 0x10, 0xEC, 7, 0])), array('H', self.WORDS))
+        self.assertEqual(image_to_words(array('H', self.WORDS)), array('H', self.WORDS))
+        self.assertEqual(image_to_words(self.WORDS), array('H', self.WORDS))
+        with self.assertRaises(ValueError):
+            image_to_words(b'\x00\x01\x02')
+        with self.assertRaises(ValueError):
+            image_to_words([0x10000])
+
+    def test_load_formats_fill_rom(self):
+        for backend in ('gates', 'flat'):
+            computer = Computer(backend)
+            report = computer.load_hack(self.HACK)
+            self.assertIsInstance(report, LoadReport)
+            self.assertEqual(report.words, 3)
+            for addr, word in enumerate(self.WORDS + [0]):
+                self.assertEqual(computer.rom.update(int_to_stream16(addr)), int_to_stream16(word))
+
+    def test_load_replaces_previous_program(self):
+        computer = Computer('flat')
+        computer.load_image([1, 2, 3, 4])
+        computer.load_image(array('H', [9]))
+        self.assertEqual(list(computer.rom.chip.words[:4]), [9, 0, 0, 0])
+
+    def test_load_instructions_files(self):
+        computer = Computer('flat', 'fast')
+        with tempfile.TemporaryDirectory() as tmp:
+            hack_path = os.path.join(tmp, 'prog.hack')
+            with open(hack_path, 'w') as f:
+                f.write(self.HACK)
+            self.assertEqual(computer.load_instructions(hack_path).words, 3)
+            bin_path = os.path.join(tmp, 'prog.bin')
+            with open(bin_path, 'wb') as f:
+                f.write(array('H', self.WORDS[::-1]).tobytes())
+            self.assertEqual(computer.load_instructions(bin_path).words, 3)
+        self.assertEqual(list(computer.rom.chip.words[:3]), self.WORDS[::-1])
+        self.assertEqual(computer.emulator.program[0].constant, 7)
+
+    def test_load_instructions_text_without_hack_suffix(self):
+        computer = Computer('flat', 'fast')
+        with tempfile.TemporaryDirectory() as tmp:
+            text_path = os.path.join(tmp, 'prog.txt')
+            with open(text_path, 'w') as f:
+                f.write(self.HACK)
+            self.assertEqual(computer.load_instructions(text_path).words, 3)
+            self.assertEqual(list(computer.rom.chip.words[:3]), self.WORDS)
+            other_path = os.path.join(tmp, 'prog.dat')
+            with open(other_path, 'wb') as f:
+                f.write(array('H', self.WORDS).tobytes())
+            with self.assertRaises(ValueError):
+                computer.load_instructions(other_path)
+            bad_path = os.path.join(tmp, 'bad.hack')
+            with open(bad_path, 'w') as f:
+                f.write('hello\n')
+            with self.assertRaises(ValueError):
+                computer.load_instructions(bad_path)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import random
+from gates import ALU, ALU_w, add16, mux16, int_to_stream16
+
+try:
+    import numpy as np
+    import gates_np
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestBatchedChips(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(42)
+        self.x = np.array([rng.getrandbits(16) for _ in range(300)] + [0, 0xFFFF, 0x8000, 0x7FFF], dtype=np.uint16)
+        self.y = np.array([rng.getrandbits(16) for _ in range(300)] + [0, 1, 0x8000, 1], dtype=np.uint16)
+
+    def test_pack_unpack_round_trip(self):
+        planes = gates_np.unpack16(self.x)
+        self.assertEqual(len(planes), 16)
+        self.assertEqual([int(p[0]) for p in planes], int_to_stream16(int(self.x[0])))
+        np.testing.assert_array_equal(gates_np.pack16(planes), self.x)
+
+    def test_add16_batch_matches_gates(self):
+        out = gates_np.add16_batch(self.x, self.y)
+        for i in range(0, len(self.x), 7):
+            a, b = int(self.x[i]), int(self.y[i])
+            self.assertEqual(int_to_stream16(int(out[i])), add16(int_to_stream16(a), int_to_stream16(b)))
+        np.testing.assert_array_equal(out, (self.x.astype(np.uint32) + self.y) & 0xFFFF)
+
+    def test_mux16_batch_matches_gates(self):
+        sel = np.arange(len(self.x)) % 2
+        out = gates_np.mux16_batch(self.x, self.y, sel)
+        for i in range(0, len(self.x), 7):
+            expected = mux16(int_to_stream16(int(self.x[i])), int_to_stream16(int(self.y[i])), int(sel[i]))
+            self.assertEqual(int_to_stream16(int(out[i])), expected)
+        np.testing.assert_array_equal(gates_np.mux16_batch(self.x, self.y, 1), self.y)
+
+    def test_alu_batch_matches_gates_per_vector_controls(self):
+        controls = np.array([int_to_stream16(i % 64)[10:] for i in range(len(self.x))], dtype=np.uint8)
+        out, zr, ng = gates_np.ALU_batch(self.x, self.y, controls)
+        for i in range(0, len(self.x), 5):
+            expected_out, expected_zr, expected_ng = ALU(
+                int_to_stream16(int(self.x[i])), int_to_stream16(int(self.y[i])), *controls[i].tolist())
+            self.assertEqual(int_to_stream16(int(out[i])), expected_out)
+            self.assertEqual((int(zr[i]), int(ng[i])), (expected_zr, expected_ng))
+
+    def test_alu_batch_every_control_word(self):
+        for control in range(64):
+            bits = int_to_stream16(control)[10:]
+            out, zr, ng = gates_np.ALU_batch(self.x, self.y, bits)
+            for i in range(len(self.x)):
+                self.assertEqual((int(out[i]), int(zr[i]), int(ng[i])), ALU_w(int(self.x[i]), int(self.y[i]), *bits))
+
+    def test_alu_batch_rejects_bad_controls(self):
+        with self.assertRaises(ValueError):
+            gates_np.ALU_batch(self.x, self.y, np.zeros((3, 6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
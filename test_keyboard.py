@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from gates import Computer, KBD
+from keyboard import KeyboardFeed, parse_events, KEYCODES
+from test_emulator import load_program
+
+
+# Waits for a key, stores it in R0, waits for the release, stores R1=1
+WAIT_KEY = '''(WAIT)
+@KBD
+D=M
+@WAIT
+D;JEQ
+@R0
+M=D
+(RELEASE)
+@KBD
+D=M
+@RELEASE
+D;JNE
+@R1
+M=1
+(END)
+@END
+0;JMP'''
+WAIT_KEY_RELEASE = 6
+WAIT_KEY_END = 12
+
+
+class TestKeyboardFeed(unittest.TestCase):
+
+    def test_parse_events(self):
+        text = '# cycle key\n10 65\n\n20 a  # lower case a\n30 newline\n40 F1\n50 0\n'
+        self.assertEqual(parse_events(text), [(10, 65), (20, 97), (30, 128), (40, 141), (50, 0)])
+        with self.assertRaises(ValueError):
+            parse_events('10\n')
+        with self.assertRaises(ValueError):
+            parse_events('10 bogus\n')
+
+    def test_due_consumes_events_in_order(self):
+        feed = KeyboardFeed([(20, 2), (5, 1), (20, 3)])
+        self.assertEqual(feed.next_cycle(), 5)
+        self.assertIsNone(feed.due(4))
+        self.assertEqual(feed.due(25), 3)
+        self.assertIsNone(feed.next_cycle())
+        feed.rewind()
+        self.assertEqual(feed.due(5), 1)
+
+    def test_bad_event(self):
+        with self.assertRaises(ValueError):
+            KeyboardFeed([(-1, 65)])
+        with self.assertRaises(ValueError):
+            KeyboardFeed([(0, 0x10000)])
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'keys.txt')
+            with open(path, 'w') as f:
+                f.write('3 up\n')
+            self.assertEqual(KeyboardFeed.from_file(path).events, [(3, KEYCODES['up'])])
+
+
+class TestScriptedInput(unittest.TestCase):
+
+    def run_script(self, backend, engine, events, until_pc=WAIT_KEY_END, **kwargs):
+        computer = Computer(backend, engine)
+        load_program(computer, WAIT_KEY)
+        computer.keyboard = KeyboardFeed(events)
+        return computer, computer.run(until_pc=until_pc, **kwargs)
+
+    def test_event_applies_at_exact_cycle(self):
+        # D=M at cycles 101 and 105 of the wait loop: an event at 101 is seen
+        # at once, one at 102 only on the next pass
+        for engine in ('fast', 'blocks'):
+            for cycle, end in ((101, 106), (102, 110)):
+                computer, result = self.run_script('flat', engine, [(cycle, 65), (cycle + 40, 0)],
+                                                   until_pc=WAIT_KEY_RELEASE)
+                self.assertEqual(result.cycles, end)
+                self.assertEqual(computer.mem.chip.read_word(0), 65)
+                computer.run(until_pc=WAIT_KEY_END)
+                self.assertEqual(computer.mem.chip.read_word(1), 1)
+
+    def test_engines_agree(self):
+        events = [(37, KEYCODES['esc']), (90, 0)]
+        results = []
+        for backend, engine in (('gates', 'gates'), ('flat', 'gates'), ('flat', 'fast'), ('flat', 'blocks')):
+            computer, result = self.run_script(backend, engine, events)
+            results.append(result)
+            self.assertEqual(computer.mem.read([0] * 16), [0] * 8 + [1, 0, 0, 0, 1, 1, 0, 0])
+            self.assertEqual(computer.mem.read(list(map(int, format(KBD, '016b')))), [0] * 16)
+        self.assertEqual(results.count(results[0]), len(results))
+
+    def test_max_cycles_across_events(self):
+        computer, result = self.run_script('flat', 'blocks', [(10, 1), (20, 0)], max_cycles=15)
+        self.assertEqual(result.cycles, 15)
+        self.assertEqual(computer.mem.chip.read_word(KBD), 1)
+        result = computer.run(max_cycles=1000, until_pc=WAIT_KEY_END)
+        self.assertEqual(computer.state().cycles, 15 + result.cycles)
+        self.assertEqual(computer.mem.chip.read_word(KBD), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
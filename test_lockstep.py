@@ -0,0 +1,73 @@
+import unittest
+from gates import Computer
+from emulator import decode
+from keyboard import KeyboardFeed
+from lockstep import Lockstep
+from test_emulator import load_program, ADD_100
+from test_keyboard import WAIT_KEY, WAIT_KEY_END
+
+
+class TestLockstep(unittest.TestCase):
+
+    def make(self, engine='fast'):
+        computer = Computer('flat', engine)
+        load_program(computer, ADD_100)
+        return computer
+
+    def test_engines_agree_every_cycle(self):
+        for engine in ('fast', 'blocks'):
+            checker = Lockstep(self.make(engine), interval=1, window=1)
+            result = checker.run(max_cycles=5000, until_pc=18)
+            self.assertIsNone(result.divergence)
+            self.assertEqual(result.checked, result.cycles)
+            self.assertEqual(checker.computer.mem.chip.read_word(17), 5050)
+
+    def test_sampling(self):
+        fixed = Lockstep(self.make(), interval=100, window=5).run(max_cycles=1000)
+        self.assertEqual((fixed.cycles, fixed.checked, fixed.samples), (1000, 50, 10))
+        sampled = Lockstep(self.make(), interval=100, window=5, sampling='random', seed=3).run(max_cycles=3000)
+        self.assertIsNone(sampled.divergence)
+        self.assertEqual(sampled.cycles, 3000)
+        self.assertGreater(sampled.samples, 10)
+
+    def test_register_divergence(self):
+        computer = self.make()
+        computer.emulator.decode_rom()
+        # D=D-A at pc 7 computes D-A+1 instead
+        computer.emulator.program[7] = decode(0xE7D0)
+        result = Lockstep(computer, interval=1, window=1).run(max_cycles=1000)
+        self.assertEqual(result.divergence.pc, 7)
+        self.assertEqual(result.divergence.cycle, 7)
+        self.assertEqual([name for name, _, _ in result.divergence.registers], ['d'])
+        self.assertIn('d: gates', result.divergence.describe())
+
+    def test_memory_divergence(self):
+        computer = self.make()
+        computer.emulator.decode_rom()
+        # M=D+M at pc 13 writes -D instead
+        computer.emulator.program[13] = decode(0xE3C8)
+        result = Lockstep(computer, interval=50, window=50).run(max_cycles=1000)
+        divergence = result.divergence
+        self.assertEqual(divergence.pc, 13)
+        self.assertEqual(divergence.registers, [])
+        self.assertEqual(divergence.memory, [(17, 1, 0xFFFF)])
+
+    def test_keyboard_events_inside_windows(self):
+        computer = Computer('flat', 'blocks')
+        load_program(computer, WAIT_KEY)
+        computer.keyboard = KeyboardFeed([(30, 65), (61, 0)])
+        result = Lockstep(computer, interval=7, window=3).run(max_cycles=1000, until_pc=WAIT_KEY_END)
+        self.assertIsNone(result.divergence)
+        self.assertEqual(computer.mem.chip.read_word(0), 65)
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            Lockstep(Computer('flat', 'gates'))
+        with self.assertRaises(ValueError):
+            Lockstep(self.make(), interval=5, window=10)
+        with self.assertRaises(ValueError):
+            Lockstep(self.make(), sampling='sometimes')
+
+
+if __name__ == "__main__":
+    unittest.main()
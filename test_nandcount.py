@@ -0,0 +1,69 @@
+import unittest
+import gates
+from gates import Computer, int_to_stream16
+from nandcount import NandCounter
+from test_emulator import load_program, ADD_100
+
+
+class TestNandCounter(unittest.TestCase):
+
+    def test_small_chips(self):
+        with NandCounter() as counter:
+            gates.and_(1, 1)
+            gates.or_(0, 1)
+            gates.and16([1] * 16, [0] * 16)
+        self.assertEqual(counter.inclusive['and_'], 2 + 16 * 2)
+        self.assertEqual(counter.calls['and_'], 17)
+        self.assertEqual(counter.per_call('and_'), 2)
+        self.assertEqual(counter.inclusive['or_'], 3)
+        self.assertEqual(counter.inclusive['and16'], 32)
+        # and_ = not_(nand(a, b)): one NAND of its own, one in not_
+        self.assertEqual(counter.self_counts['and_'], 17)
+        self.assertEqual(counter.self_counts.get('and16', 0), 0)
+        self.assertEqual(counter.total, 37)
+
+    def test_disabled_restores_plain_functions(self):
+        nand, add16, update = gates.nand, gates.add16, gates.RAM8.update
+        counter = NandCounter()
+        counter.enable()
+        self.assertIsNot(gates.nand, nand)
+        counter.disable()
+        self.assertIs(gates.nand, nand)
+        self.assertIs(gates.add16, add16)
+        self.assertIs(gates.RAM8.update, update)
+        gates.add16(int_to_stream16(1), int_to_stream16(2))
+        self.assertEqual(counter.total, 0)
+
+    def test_results_unchanged(self):
+        x, y = int_to_stream16(12345), int_to_stream16(54321)
+        expected = gates.ALU(x, y, 0, 1, 0, 0, 1, 1)
+        with NandCounter() as counter:
+            self.assertEqual(gates.ALU(x, y, 0, 1, 0, 0, 1, 1), expected)
+        self.assertEqual(counter.calls['ALU'], 1)
+        self.assertGreater(counter.inclusive['ALU'], counter.inclusive['add16'])
+
+    def test_per_cycle(self):
+        computer = Computer('flat')
+        load_program(computer, ADD_100)
+        with NandCounter() as counter:
+            computer.run(max_cycles=20)
+        self.assertEqual(counter.calls['Computer.step'], 20)
+        self.assertEqual(counter.inclusive['Computer.step'], counter.total)
+        self.assertGreater(counter.per_cycle(), counter.per_call('ALU'))
+        report = counter.report()
+        self.assertIn('20 cycles', report)
+        self.assertIn('CPU.update', report)
+        counter.reset()
+        self.assertEqual(counter.total, 0)
+        self.assertEqual(counter.calls, {})
+
+    def test_ram_counts(self):
+        ram = gates.RAM8()
+        with NandCounter() as counter:
+            ram.update(int_to_stream16(7), [0, 1, 1], 1)
+        self.assertEqual(counter.calls['RAM8.update'], 1)
+        self.assertEqual(counter.inclusive['RAM8.update'], counter.total)
+
+
+if __name__ == "__main__":
+    unittest.main()
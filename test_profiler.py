@@ -0,0 +1,89 @@
+import random
+import unittest
+from array import array
+from gates import Computer
+from emulator import Emulator, RAM_SIZE
+from profiler import Profiler, source_map, enclosing_label
+from test_emulator import load_program, ADD_100
+from test_blocks import random_rom
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.computer = Computer('flat', 'fast')
+        load_program(self.computer, ADD_100)
+        self.profiler = Profiler()
+        self.result = self.computer.run(until_pc=18, profiler=self.profiler)
+
+    def test_profiled_run_matches_plain_run(self):
+        plain = Computer('flat', 'fast')
+        load_program(plain, ADD_100)
+        self.assertEqual(plain.run(until_pc=18), self.result)
+        self.assertEqual(plain.mem.chip.words, self.computer.mem.chip.words)
+
+    def test_matches_emulator_on_random_programs(self):
+        # Profiler.run has its own copy of the execute loop; keep it honest
+        rng = random.Random(99)
+        for _ in range(30):
+            rom = random_rom(rng)
+            ram = array('H', [rng.getrandbits(16) for _ in range(64)]) + array('H', bytes(2 * (RAM_SIZE - 64)))
+            reference = Emulator(array('H', rom), array('H', ram))
+            profiled = Emulator(array('H', rom), array('H', ram))
+            profiler = Profiler()
+            for _ in range(5):
+                budget = rng.randrange(1, 400)
+                until_pc = rng.choice([None, rng.randrange(64)])
+                self.assertEqual(profiler.run(profiled, budget, until_pc), reference.run(budget, until_pc))
+                self.assertEqual(profiled.state(), reference.state())
+                self.assertEqual(profiled.ram, reference.ram)
+            self.assertEqual(sum(profiler.counts), reference.cycles)
+
+    def test_counts(self):
+        self.assertEqual(sum(self.profiler.counts), self.result.cycles)
+        self.assertEqual(self.profiler.counts[0], 1)
+        self.assertEqual(self.profiler.counts[4], 101)  # LOOP head
+        # D;JGT at pc 9 exits once, the loop jump at pc 17 is always taken
+        self.assertEqual((self.profiler.taken[9], self.profiler.not_taken[9]), (1, 100))
+        self.assertEqual((self.profiler.taken[17], self.profiler.not_taken[17]), (100, 0))
+
+    def test_hot_spots_and_loops(self):
+        pc, count = self.profiler.hot_spots(1)[0]
+        self.assertEqual(count, 101)
+        head, jump, iterations, cycles = self.profiler.hot_loops(1)[0]
+        self.assertEqual((head, jump, iterations), (4, 17, 100))
+        self.assertEqual(cycles, sum(self.profiler.counts[4:18]))
+
+    def test_report_maps_to_source(self):
+        report = self.profiler.report(ADD_100, top=3)
+        self.assertIn('Hottest loops:', report)
+        self.assertIn('head     4 LOOP (line 7: @i)', report)
+        self.assertIn('jump    17 LOOP+13 (line 20: 0;JMP)', report)
+
+    def test_gates_engine_cannot_profile(self):
+        with self.assertRaises(ValueError):
+            Computer().run(max_cycles=1, profiler=Profiler())
+
+
+class TestSourceMap(unittest.TestCase):
+
+    def test_source_map(self):
+        lines, labels = source_map(ADD_100)
+        self.assertEqual(lines[0], (2, '@i'))
+        self.assertEqual(labels, {4: 'LOOP', 18: 'END'})
+        self.assertEqual(len(lines), 20)
+
+    def test_spaced_label(self):
+        lines, labels = source_map('@0\n( LOOP )\n@LOOP\n0;JMP // again')
+        self.assertEqual(labels, {1: 'LOOP'})
+        self.assertEqual(lines, [(1, '@0'), (3, '@LOOP'), (4, '0;JMP')])
+
+    def test_enclosing_label(self):
+        labels = {4: 'LOOP', 18: 'END'}
+        self.assertIsNone(enclosing_label(labels, 2))
+        self.assertEqual(enclosing_label(labels, 4), 'LOOP')
+        self.assertEqual(enclosing_label(labels, 6), 'LOOP+2')
+
+
+if __name__ == "__main__":
+    unittest.main()
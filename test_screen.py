@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+import zlib
+from gates import Computer, SCREEN, int_to_stream16
+from test_emulator import load_program
+
+try:
+    import numpy as np
+    from screen import (screen_words, screen_array, unpack_bitmap, frame_ppm, frame_png,
+                        dump_frame, WIDTH, HEIGHT)
+except ImportError:
+    np = None
+
+
+# Sets the leftmost pixel of row 0 and the rightmost pixel of the last row
+DRAW = '''@SCREEN
+M=1
+@32767
+D=A
+@24575
+M=D+1
+(END)
+@END
+0;JMP'''
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestScreen(unittest.TestCase):
+
+    def test_flat_view_is_zero_copy(self):
+        computer = Computer('flat', 'fast')
+        view = screen_array(computer)
+        self.assertEqual(len(view), 8192)
+        computer.mem.chip.write_word(SCREEN + 3, 0xABCD)
+        self.assertEqual(view[3], 0xABCD)
+        self.assertEqual(screen_words(computer)[3], 0xABCD)
+
+    def test_program_output_unpacks_to_pixels(self):
+        computer = Computer('flat', 'fast')
+        load_program(computer, DRAW)
+        computer.run(max_cycles=100, until_pc=6)
+        bitmap = unpack_bitmap(screen_array(computer))
+        self.assertEqual(bitmap.shape, (HEIGHT, WIDTH))
+        self.assertEqual(bitmap[0, 0], 1)
+        self.assertEqual(bitmap[HEIGHT - 1, WIDTH - 1], 1)
+        self.assertEqual(int(bitmap.sum()), 2)
+
+    def test_bit_order(self):
+        words = np.zeros(8192, dtype=np.uint16)
+        words[32 * 5 + 2] = 0b1000000000000101  # row 5, pixels 32, 34 and 47
+        bitmap = unpack_bitmap(words)
+        self.assertEqual(list(np.nonzero(bitmap[5])[0]), [32, 34, 47])
+        self.assertEqual(int(bitmap.sum()), 3)
+
+    def test_gate_backend_matches_flat(self):
+        flat, gate = Computer('flat'), Computer('gates')
+        for addr, value in ((SCREEN, 0x8001), (SCREEN + 8191, 0x1234)):
+            flat.mem.chip.write_word(addr, value)
+            gate.mem.update(int_to_stream16(value), int_to_stream16(addr), 1)
+        self.assertEqual(bytes(screen_words(gate)), bytes(screen_words(flat)))
+
+    def test_ppm_and_png(self):
+        bitmap = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+        bitmap[0, 0] = 1
+        ppm = frame_ppm(bitmap)
+        header = b'P6\n512 256\n255\n'
+        self.assertTrue(ppm.startswith(header))
+        self.assertEqual(len(ppm), len(header) + 3 * WIDTH * HEIGHT)
+        self.assertEqual(ppm[len(header):len(header) + 6], b'\x00\x00\x00\xff\xff\xff')
+
+        png = frame_png(bitmap)
+        self.assertTrue(png.startswith(b'\x89PNG\r\n\x1a\n'))
+        idat = png.index(b'IDAT')
+        length = int.from_bytes(png[idat - 4:idat], 'big')
+        raw = zlib.decompress(png[idat + 4:idat + 4 + length])
+        self.assertEqual(len(raw), HEIGHT * (1 + WIDTH // 8))
+        self.assertEqual(raw[:3], b'\x00\x7f\xff')
+
+    def test_dump_frame(self):
+        computer = Computer('flat')
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('frame.png', 'frame.ppm'):
+                path = os.path.join(tmp, name)
+                dump_frame(computer, path)
+                self.assertGreater(os.path.getsize(path), 0)
+            with self.assertRaises(ValueError):
+                dump_frame(computer, os.path.join(tmp, 'frame.bmp'))
+
+
+if __name__ == "__main__":
+    unittest.main()
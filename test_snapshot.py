@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from array import array
+from gates import Computer, fill_words
+from snapshot import Snapshot, HEADER, take, restore, save, load
+from test_emulator import load_program, ADD_100
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'machine.snap')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_and_resume(self):
+        for engine in ('fast', 'blocks'):
+            computer = Computer('flat', engine)
+            load_program(computer, ADD_100)
+            computer.run(max_cycles=300)
+            saved = save(computer, self.path)
+            self.assertEqual(os.path.getsize(self.path), HEADER.size + 2 * (16384 + 32768))
+            computer.run(until_pc=18)
+            finished = take(computer)
+
+            resumed = Computer('flat', engine)
+            self.assertEqual(load(self.path, resumed), saved)
+            self.assertEqual(resumed.state().cycles, 300)
+            resumed.run(until_pc=18)
+            self.assertEqual(take(resumed), finished)
+            self.assertEqual(resumed.mem.chip.read_word(17), 5050)
+
+    def test_gate_level_round_trip(self):
+        computer = Computer('gates')
+        load_program(computer, ADD_100)
+        computer.run(max_cycles=40)
+        snapshot = take(computer)
+        resumed = Computer('gates')
+        restore(resumed, Snapshot.from_buffer(snapshot.to_bytes()))
+        self.assertEqual(take(resumed), snapshot)
+        computer.run(max_cycles=20)
+        resumed.run(max_cycles=20)
+        self.assertEqual(take(resumed), take(computer))
+
+    def test_restore_rewinds(self):
+        computer = Computer('flat', 'fast')
+        load_program(computer, ADD_100)
+        start = take(computer)
+        first = computer.run(until_pc=18)
+        restore(computer, start)
+        self.assertEqual(take(computer), start)
+        self.assertEqual(computer.run(until_pc=18), first)
+
+    def test_diff(self):
+        computer = Computer('flat', 'fast')
+        load_program(computer, ADD_100)
+        before = take(computer)
+        computer.run(max_cycles=4)
+        after = take(computer)
+        self.assertEqual(before.diff(before), [])
+        changes = before.diff(after)
+        self.assertIn('cycles: 0 -> 4', changes)
+        self.assertIn('ram[16]: 0 -> 1', changes)
+        self.assertNotEqual(before, after)
+
+    def test_bad_files(self):
+        data = take(Computer('flat')).to_bytes()
+        with self.assertRaises(ValueError):
+            Snapshot.from_buffer(b'NOTASNAP' + data[8:])
+        with self.assertRaises(ValueError):
+            Snapshot.from_buffer(data[:100])
+        corrupt = bytearray(data)
+        corrupt[-1] ^= 1
+        with self.assertRaises(ValueError):
+            Snapshot.from_buffer(corrupt)
+        newer = bytearray(data)
+        newer[8] = 99
+        with self.assertRaises(ValueError):
+            Snapshot.from_buffer(newer)
+
+    def test_oversized_snapshot(self):
+        big = Snapshot(0, 0, 0, 0, array('H', bytes(2 * 20000)), array('H', bytes(2 * 40000)))
+        with self.assertRaises(ValueError):
+            Snapshot.from_buffer(big.to_bytes())
+        computer = Computer('flat', 'fast')
+        with self.assertRaises(ValueError):
+            restore(computer, big)
+        self.assertEqual(len(computer.rom.chip.words), 16384)
+        self.assertEqual(len(computer.mem.chip.words), 32768)
+        self.assertIsNone(computer.emulator.program)
+
+    def test_fill_words_does_not_grow(self):
+        target = array('H', [1, 2, 3])
+        with self.assertRaises(ValueError):
+            fill_words(target, array('H', [4, 5, 6, 7]))
+        self.assertEqual(target, array('H', [1, 2, 3]))
+        fill_words(target, array('H', [9]))
+        self.assertEqual(target, array('H', [9, 0, 0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
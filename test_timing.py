@@ -0,0 +1,85 @@
+import unittest
+import gates
+from netlist import trace, bus, bit, compile_netlist
+from timing import analyze, analyze_chip, rank
+
+
+class TestTiming(unittest.TestCase):
+
+    def test_adder_matches_netlist(self):
+        traced = trace(gates.add16, bus('a'), bus('b'))
+        timing = analyze(traced)
+        self.assertEqual(timing.gates, len(traced.live()))
+        self.assertEqual(timing.depth, traced.depth())
+        # Ripple carry: bit 15 (the LSB) ripples into every sum bit
+        self.assertIsNone(timing.path('a[0]', 'out[15]'))
+        self.assertGreater(timing.path('a[15]', 'out[0]'), timing.path('a[15]', 'out[14]'))
+        self.assertEqual(timing.critical.length, timing.depth)
+        self.assertEqual(len(timing.critical.wires), timing.depth + 1)
+
+    def test_critical_path_is_connected(self):
+        traced = trace(gates.add_kogge_stone, bus('a'), bus('b'))
+        path = analyze(traced).critical
+        for source, gate in zip(path.wires, path.wires[1:]):
+            self.assertIn(source, traced.nodes[gate])
+        self.assertEqual(path.length, traced.depth())
+
+    def test_tuple_outputs(self):
+        timing = analyze_chip(gates.half_adder, bit('a'), bit('b'))
+        self.assertEqual(set(timing.levels), {'out.0', 'out.1'})
+        self.assertEqual(timing.path('a', 'out.1'), 2)
+        self.assertEqual(timing.path('b', 'out.0'), timing.levels['out.0'])
+        self.assertEqual(timing.depth, max(timing.levels.values()))
+
+    def test_ram8_registers(self):
+        traced = trace(gates.RAM8().update, bus('in'), bus('address', 3), bit('load'), name='RAM8')
+        self.assertEqual(len(traced.states), 128)
+        timing = analyze(traced)
+        paths = timing.bus_paths()
+        # Write decode reaches the registers, the read tree the output
+        self.assertIn(('address', 'next'), paths)
+        self.assertIn(('q', 'out'), paths)
+        self.assertEqual(timing.path('address[0]', 'out[0]'), timing.depth)
+        # One DFF's state only feeds its own next state
+        self.assertEqual(timing.path('q[0]', 'next[0]'), 2)
+        self.assertIsNone(timing.path('q[0]', 'next[1]'))
+        with self.assertRaises(ValueError):
+            compile_netlist(traced)
+
+    def test_ram512_builds_every_bank(self):
+        ram = gates.RAM512()
+        timing = analyze_chip(ram.update, bus('in'), bus('address', 9), bit('load'), name='RAM512')
+        self.assertIsNotNone(ram.ram64_7)
+        self.assertEqual(len([label for label in timing.levels if label.startswith('next')]), 512 * 16)
+        paths = timing.bus_paths()
+        # One more layer of bank decode and read muxes than RAM64
+        ram64 = analyze_chip(gates.RAM64().update, bus('in'), bus('address', 6), bit('load'))
+        self.assertGreater(paths[('address', 'out')], ram64.bus_paths()[('address', 'out')])
+        self.assertEqual(paths[('in', 'next')], 2)
+
+    def test_fanout_hotspots(self):
+        timing = analyze_chip(gates.mux16, bus('a'), bus('b'), bit('sel'))
+        label, count = timing.fanout[0]
+        self.assertEqual(label, 'sel')
+        self.assertEqual(count, 17)
+
+    def test_wire_comparison_fails(self):
+        def compare(a):
+            return 1 if a == 1 else 0
+        with self.assertRaises(TypeError):
+            trace(compare, bit('a'))
+
+    def test_jump_logic(self):
+        timing = analyze_chip(gates.jump_logic, bit('i'), bus('j', 3), bit('zr'), bit('ng'))
+        self.assertEqual(timing.path('i', 'out'), 2)
+        self.assertEqual(timing.depth, max(timing.path(start, 'out') for start in ('zr', 'ng')))
+
+    def test_rank(self):
+        timings = [analyze_chip(adder, bus('a'), bus('b'), name=name) for name, adder in gates.ADDERS.items()]
+        lines = rank(timings).splitlines()
+        self.assertTrue(lines[1].startswith('kogge_stone'))
+        self.assertTrue(lines[-1].startswith('ripple'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+'''
+Static timing analysis of traced NAND netlists.
+
+analyze() takes a netlist from netlist.trace() and reports, counting one
+unit per NAND:
+
+  - the number of NANDs the endpoints depend on
+  - the longest path from every start point to every endpoint it reaches
+  - the critical path, the longest of them, gate by gate
+  - fan-out hotspots, the wires driving the most gates
+
+Start points are the input bits and, for chips with registers, the DFF
+state wires q[k]; endpoints are the output bits and the DFFs' next states
+next[k]. So for RAM8, address -> next is the write decode and q -> out the
+read mux tree:
+
+  timing = analyze(trace(RAM8().update, bus('in'), bus('address', 3), bit('load')))
+  print(timing.report())
+
+Every RAM up to RAM32K traces, each bank built in full, but the netlist
+grows with the memory: RAM512 is about 50K NANDs and takes a couple of
+seconds, RAM4K 400K NANDs and tens of seconds, RAM16K/RAM32K more again.
+
+rank() puts several netlists of the same chip side by side, e.g. the adders
+in gates.ADDERS, ALU against ALU_mux, or variants of gates.jump_logic.
+'''
+from typing import NamedTuple, Optional
+
+from netlist import Netlist, Wire, trace
+
+class Path(NamedTuple):
+  start: str
+  end: str
+  length: int         # NANDs along the path
+  wires: list[int]    # start wire, then each NAND up to the endpoint
+
+class Timing:
+  def __init__(self, name: str, gates: int, paths: dict, critical: Optional[Path],
+               fanout: list, levels: dict):
+    self.name = name
+    self.gates = gates
+    self.paths = paths        # (start, end) -> longest path length
+    self.critical = critical
+    self.fanout = fanout      # (label, gates driven), highest first
+    self.levels = levels      # endpoint -> longest path from any start point
+
+  @property
+  def depth(self) -> int:
+    return self.critical.length if self.critical is not None else 0
+
+  def path(self, start: str, end: str) -> Optional[int]:
+    '''
+    Longest path from start to end, None when end does not depend on start
+    '''
+    return self.paths.get((start, end))
+
+  def bus_paths(self) -> dict:
+    '''
+    Longest paths between whole buses, e.g. ('a', 'out') for add16
+    '''
+    paths = {}
+    for (start, end), length in self.paths.items():
+      key = (_bus(start), _bus(end))
+      if length > paths.get(key, -1):
+        paths[key] = length
+    return paths
+
+  def report(self, top: int = 10) -> str:
+    out = [f'{self.name}: {self.gates} NANDs, depth {self.depth}']
+    if self.critical is not None:
+      out.append(f'critical path {self.critical.start} -> {self.critical.end}, '
+                 f'{self.critical.length} NANDs: ' + ' '.join(str(wire) for wire in self.critical.wires))
+    out += ['', f"{'from':12} {'to':12} {'longest':>8}"]
+    for (start, end), length in sorted(self.bus_paths().items(), key=lambda item: -item[1]):
+      out.append(f'{start:12} {end:12} {length:8}')
+    out += ['', f"{'fan-out':20} {'gates':>6}"]
+    for label, count in self.fanout[:top]:
+      out.append(f'{label:20} {count:6}')
+    return '\n'.join(out)
+
+def _bus(label: str) -> str:
+  return label[:label.rindex('[')] if label.endswith(']') else label
+
+def _output_labels(value, name: str, labels: dict) -> None:
+  # Lists are buses and get bit indices; tuple members are named .0, .1, ...
+  if isinstance(value, list):
+    for i, item in enumerate(value):
+      if isinstance(item, Wire):
+        labels.setdefault(item.index, []).append(f'{name}[{i}]')
+      elif isinstance(item, (list, tuple)):
+        _output_labels(item, f'{name}[{i}]', labels)
+  elif isinstance(value, tuple):
+    for i, item in enumerate(value):
+      _output_labels(item, f'{name}.{i}', labels)
+  elif isinstance(value, Wire):
+    labels.setdefault(value.index, []).append(name)
+
+def analyze(netlist: Netlist) -> Timing:
+  nodes = netlist.nodes
+  starts = {}
+  for input_, indices in netlist.inputs:
+    if input_.width is None:
+      starts[indices[0]] = input_.name
+    else:
+      for i, index in enumerate(indices):
+        starts[index] = f'{input_.name}[{i}]'
+  for k, index in enumerate(netlist.states):
+    starts[index] = f'q[{k}]'
+  # Endpoint wire -> labels; one wire can feed several outputs
+  ends = {}
+  _output_labels(netlist.output, 'out', ends)
+  for k, index in enumerate(netlist.states):
+    value = netlist.registers[index]
+    if isinstance(value, Wire):
+      ends.setdefault(value.index, []).append(f'next[{k}]')
+
+  # The NANDs the endpoints depend on, and who reads each wire
+  seen = set()
+  stack = list(ends)
+  while stack:
+    index = stack.pop()
+    if index in seen:
+      continue
+    seen.add(index)
+    if nodes[index] is not None:
+      stack.extend(nodes[index])
+  used = sorted(index for index in seen if nodes[index] is not None)
+  readers = {}
+  for index in used:
+    a, b = nodes[index]
+    readers.setdefault(a, []).append(index)
+    if b != a:
+      readers.setdefault(b, []).append(index)
+
+  # Arrival times from any start point, with the predecessor on the longest path
+  arrival = dict.fromkeys(starts, 0)
+  previous = {}
+  for index in used:
+    a, b = nodes[index]
+    source = a if arrival.get(a, 0) >= arrival.get(b, 0) else b
+    arrival[index] = arrival.get(source, 0) + 1
+    previous[index] = source
+  critical = None
+  levels = {}
+  for index, labels in ends.items():
+    for label in labels:
+      levels[label] = arrival.get(index, 0)
+    if index in starts or index in previous:
+      if critical is None or arrival[index] > critical.length:
+        wires = [index]
+        while wires[-1] in previous:
+          wires.append(previous[wires[-1]])
+        critical = Path(starts.get(wires[-1], str(wires[-1])), labels[0], arrival[index], wires[::-1])
+
+  # Longest path from each start point over the gates it reaches; gate
+  # indices are topological, so one sorted sweep of the cone is enough
+  paths = {}
+  for start, start_label in starts.items():
+    cone = set()
+    stack = [start]
+    while stack:
+      for reader in readers.get(stack.pop(), ()):
+        if reader not in cone:
+          cone.add(reader)
+          stack.append(reader)
+    distance = {start: 0}
+    for index in sorted(cone):
+      a, b = nodes[index]
+      distance[index] = 1 + max(distance.get(a, -1), distance.get(b, -1))
+    for index in cone | {start}:
+      for label in ends.get(index, ()):
+        paths[(start_label, label)] = distance[index]
+
+  fanout = sorted(((starts.get(index, f'nand {index}'), len(gates)) for index, gates in readers.items()),
+                  key=lambda item: -item[1])
+  return Timing(netlist.name, len(used), paths, critical, fanout, levels)
+
+def analyze_chip(chip, *args, name=None) -> Timing:
+  '''
+  trace() and analyze() in one step
+  '''
+  return analyze(trace(chip, *args, name=name))
+
+def rank(timings: list[Timing]) -> str:
+  '''
+  A table of netlists ordered by depth, then gate count
+  '''
+  out = [f"{'chip':20} {'NANDs':>6} {'depth':>6} {'max fan-out':>12}"]
+  for timing in sorted(timings, key=lambda timing: (timing.depth, timing.gates)):
+    fanout = timing.fanout[0][1] if timing.fanout else 0
+    out.append(f'{timing.name:20} {timing.gates:6} {timing.depth:6} {fanout:12}')
+  return '\n'.join(out)